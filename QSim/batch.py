@@ -0,0 +1,186 @@
+#######################################################
+##########         Notes for later        #############
+#######################################################
+
+
+
+
+
+#######################################################
+##############         Imports        #################
+#######################################################
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from layout import *
+
+
+
+#########################################################
+##############         Constants        #################
+#########################################################
+
+# default name of the consolidated results file
+RESULTS_FILE = "results.json"
+
+# extension of the layout files collected from a directory
+LAYOUT_EXTENSION = ".json"
+
+
+
+#########################################################
+##############         Functions        #################
+#########################################################
+def collect_layout_files(paths: list) -> list:
+    '''
+    Expands a list of layout files, directories and manifests into a list of layout files.
+
+    A directory contributes all of its ``.json`` files, in sorted order. Any other file that is not a ``.json`` file is read
+    as a manifest, listing one layout file per line relative to the manifest; empty lines and lines starting with ``#`` are skipped.
+
+    :param paths: The paths of layout files, directories and manifests.
+    :type paths: list
+
+    :return: Returns a list of layout file paths.
+    :rtype: list
+    '''
+    files = []
+    for path in paths:
+
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(LAYOUT_EXTENSION))
+
+        elif path.endswith(LAYOUT_EXTENSION):
+            files.append(path)
+
+        else:
+            with open(path) as manifest:
+                lines = [line.strip() for line in manifest]
+            files.extend(os.path.join(os.path.dirname(path), line) for line in lines if line and not line.startswith("#"))
+
+    return files
+
+
+def simulate_layout_file(path: str, backend: str = "kernel") -> dict:
+    '''
+    Builds and simulates a single layout file. This function runs in the worker processes.
+
+    Layouts with loops are solved for their steady state with :meth:`Graph.calculate_steady_state`, which holds one amplitude per edge
+    instead of one per path mode. Errors are reported in the result instead of being raised, so that one broken layout does not stop a whole batch.
+
+    :param path: The path of the layout file.
+    :type path: str
+
+    :param backend: The backend of :meth:`Graph.calculate_results`, used for layouts without loops.
+    :type backend: str
+
+    :return: Returns the result of the layout: its path, the solver used (``"propagation"`` or ``"steady_state"``), the final state
+        vector as a list of (real, imaginary) pairs, the detectors with their click probabilities, and the time spent loading and
+        building, simulating and in total.
+    :rtype: dict
+    '''
+    result = {"layout": path}
+    start = time.perf_counter()
+
+    try:
+        graph = load_layout(path).build_graph()
+        built = time.perf_counter()
+
+        # layouts with loops are solved for their steady state, holding one amplitude per edge
+        acyclic = graph.is_acyclic()
+        if acyclic:
+            state_vector = graph.calculate_results(backend=backend)
+        else:
+            state_vector = graph.calculate_steady_state().get_state_vector()
+        simulated = time.perf_counter()
+
+        result["solver"] = "propagation" if acyclic else "steady_state"
+        result["state_vector"] = [[float(amplitude.real), float(amplitude.imag)] for amplitude in state_vector]
+        result["detectors"] = graph.get_detectors()
+        result["probabilities"] = graph.get_detector_probabilities(State(state_vector), edge_modes=not acyclic).tolist()
+        result["timings"] = {"build": built - start, "simulate": simulated - built}
+
+    except Exception as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+        result["timings"] = {}
+
+    result["timings"]["total"] = time.perf_counter() - start
+
+    return result
+
+
+def run_batch(paths: list, output: str = RESULTS_FILE, workers: int = None, backend: str = "kernel") -> list:
+    '''
+    Simulates a batch of layouts in a pool of processes and writes all results to one JSON file.
+
+    The per-layout timings are printed as the layouts complete.
+
+    :param paths: The paths of layout files, directories and manifests, as accepted by :func:`collect_layout_files`.
+    :type paths: list
+
+    :param output: The path of the consolidated results file.
+    :type output: str
+
+    :param workers: The number of worker processes. Defaults to the number of CPUs.
+    :type workers: int
+
+    :param backend: The backend of :meth:`Graph.calculate_results`.
+    :type backend: str
+
+    :return: Returns the list of per-layout results, in the order of the layout files.
+    :rtype: list
+    '''
+    files = collect_layout_files(paths)
+    start = time.perf_counter()
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(simulate_layout_file, files, [backend] * len(files), chunksize=max(1, len(files) // 256)):
+            status = result.get("error", "ok")
+            print(f"{result['timings']['total']:10.4f} s  {result['layout']}  {status}")
+            results.append(result)
+
+    elapsed = time.perf_counter() - start
+
+    with open(output, "w") as file:
+        json.dump({"backend": backend, "workers": workers or os.cpu_count(), "elapsed": elapsed, "results": results}, file)
+
+    failed = sum("error" in result for result in results)
+    print(f"{len(results)} layouts simulated in {elapsed:.4f} s ({failed} failed), results written to {output}")
+
+    return results
+
+
+def main(argv: list = None) -> int:
+    '''
+    Entry point of the batch simulation command line.
+
+    :param argv: The command line arguments, excluding the program name. Defaults to :data:`sys.argv`.
+    :type argv: list
+
+    :return: Returns the exit status: 0 if all layouts were simulated, otherwise 1.
+    :rtype: int
+    '''
+    parser = argparse.ArgumentParser(description="Simulate a batch of QSim layouts without the GUI.")
+    parser.add_argument("paths", nargs="+", help="layout files (.json), directories of layout files, or manifests listing layout files")
+    parser.add_argument("-o", "--output", default=RESULTS_FILE, help=f"consolidated results file (default: {RESULTS_FILE})")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("-b", "--backend", choices=("kernel", "compiled", "operation"), default="kernel", help="simulation backend")
+    args = parser.parse_args(argv)
+
+    results = run_batch(args.paths, args.output, args.workers, args.backend)
+
+    return int(any("error" in result for result in results))
+
+
+
+
+###############################################
+############         Main        ##############
+###############################################
+if __name__ == "__main__":
+
+    sys.exit(main())
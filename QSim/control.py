@@ -9,7 +9,6 @@ from PyQt6.QtWidgets import (
     )
 from viewer import *
 from model import *
-from collections import deque
 
 
 
@@ -67,6 +66,9 @@ class MainWindow(QMainWindow):
         2- Calculates the final state vector of the system.
         3- Visualizes the graph and the vector.
 
+        Both steps are incremental: only the light paths crossing cells edited since the last simulation are traced again,
+        and only the layers downstream of the first change are propagated again.
+
         :return: This method does not return anything.
         :rtype: None
         '''
@@ -74,7 +76,12 @@ class MainWindow(QMainWindow):
         self.graph = self.build_graph()
 
         # TODO: Complete this function
-        final_quantum_state = self.graph.calculate_results(visualize=True)
+        # the graph keeps the intermediate states of the last run, so re-running an edited layout only propagates the changed layers
+        # layouts with loops are solved for their steady state, holding one amplitude per edge
+        if self.graph.is_acyclic():
+            final_quantum_state = self.graph.calculate_results(visualize=True)
+        else:
+            final_quantum_state = self.graph.calculate_steady_state().get_state_vector()
         
 
         # Visualize the state vector
@@ -110,174 +117,14 @@ class MainWindow(QMainWindow):
         '''
         Builds the graph of the optical setup (elements and their relative positioning) presented on the grid.
 
+        The graph is built from the layout of the grid's element records, which caches the traced light paths until the cells they cover are edited.
+        The current graph is cleared and refilled, so that it keeps the intermediate states of the last simulation.
+
         :return: Returns the constructed graph object.
         :rtype: Graph 
         '''
-        # create a new graph
-        graph = Graph()
-
-        # get a list of all lasers
-        lasers = self.ui.get_lasers()
-
-        # create a set to keep track of visited elements
-        visited = set()
-
-        # queue of the BFS traversal algorithm
-        queue = deque()
-
-        # start from each laser to create a graph
-        for laser in lasers:
-
-
-            queue.append((laser, laser.orientation))
-            visited.add(laser)
-            
-
-            while queue:
-                
-                # get the element on the front of the queue
-                element, orient = queue.popleft()
-
-                successors = self.__get_successors(element, orient)
-
-                for next_element, next_orient in successors:
-                    
-                    # Add a wall to the graph
-                    if next_element is None:
-                        continue
-
-                    # Append an edge to the graph here
-                    graph.add_connection(element, next_element)
-
-                    # add the element to the queue, if not previously added
-                    if next_element not in visited:
-                        queue.append((next_element, next_orient))
-                        visited.add(next_element)
-
-        # HACK: Assert that the graph is acyclic
-        # HACK: If you remove this line, you must modify graph creation to allow multiple edges between the same two nodes
-        assert nx.is_directed_acyclic_graph(graph), "The graph is acyclic"
+        return self.ui.get_layout().build_graph(self.graph)
 
-        return graph
-
-                    
-
-
-    def __get_successors(self, element: GridItem, orentation: int) -> list:
-        '''
-        This is an auxiliary function and is inteded for internal use only.
-
-        Given and element and the orientation in which the light enters the element, returns the next element(s) in the light travel direction (if any).
-        For example, if a light enters a mirror in a given direction, returns the next element after reflection by the mirror.
-        For the case of a beamsplitter, two elements will be returned.
-
-        :param element: The element at which the traversal should start.
-        :type element: GridItem
-
-        :param orientation: The direction of traversal starting from the given element.
-        :type orientation: int
-
-        :return: Returns a list of successors. The list would contain two elements for a beamsplitter and one element for the test of element types.
-        :rtype: list
-        '''
-        # list of next successors
-        successors = []
-
-        # list of orientations or traversal
-        orientations = element.get_next_orient(orentation)
-
-        # append each successor element for each orientation
-        for orient in orientations:
-
-            successors.append((self.__get_next_element_in_dir(element, orient), orient))
-
-        # return a list of succesors
-        return successors
-        
-        
-    def __get_next_element_in_dir(self, element: GridItem, orientation: int) -> Union[GridItem,None]:
-        '''
-        This is an auxiliary method and is inteded for internal use only.
-
-        This method is used as part of the traversal algorithm. Given an element and a next orientation, gets the next element in that specific direction.
-
-        :param element: The element at which the traversal should start.
-        :type element: GridItem
-
-        :param orientation: The direction of traversal starting from the given element.
-        :type orientation: int
-
-        :return:
-        :rtype: GridItem | None
-        '''
-        # get the row and col of the element
-        x, y = element.row, element.col
-
-
-        # get the direction of increment/decrement based on orientation of movement
-        dx, dy = self.__get_dx_dy_from_orientation(orientation)
-
-    
-        # traverse till you find next element
-        while self.__check_valid_position(x, y) :
-            x += dx
-            y += dy
-
-            element = self.ui.get_item_at(x, y)
-
-            # if an element is found, return it
-            if element:
-                return element
-            
-        # return none if no elements are found
-        return GridWall(x, y)
-    
-
-    
-    def __get_dx_dy_from_orientation(self, orientation: int) -> tuple[int, int]:
-        '''
-        This is an method function and is inteded for internal use only.
-
-        Calculates the next increase/decrease in position to get the next step in the grid, given an orientation.
-
-        :param orientation:The direction of traversal.
-        :type orientation: int
-
-        :return: Returns a tuple of the step (dx, dy)
-        :rtype: tuple[int, int]
-        '''
-        if orientation == 0:
-            dx, dy = (0, +1)
-        elif orientation == 1:
-            dx, dy = (+1, 0)
-        elif orientation == 2:
-            dx, dy = (0, -1)
-        else:
-            dx, dy = (-1, 0)
-
-        return dx, dy
-    
-    
-    def __check_valid_position(self, x:int, y:int) -> bool:
-        '''
-        This is an auxiliary method and is inteded for internal use only.
-
-        Checks if a given position is within the grid's bounds or not.
-
-        :param x: The row number.
-        :type x: int
-
-        :param x: The column number.
-        :type y: int
-
-        :return: Returns :literal:`True` if the position is within the grid's bounds, otherwise returns :literal:`False`.
-        :rtype: bool
-        '''
-        if (x >= 0) and (x < self.grid_rows) and (y < self.grid_cols) and (y >= 0):
-            return True
-        else:
-            return False
-        
 
     def exit(self) -> None:
         '''
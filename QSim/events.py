@@ -0,0 +1,303 @@
+#######################################################
+##########         Notes for later        #############
+#######################################################
+
+
+
+
+
+#######################################################
+##############         Imports        #################
+#######################################################
+from sampling import *
+
+
+
+#########################################################
+##############         Constants        #################
+#########################################################
+
+# record of a detection event: its time tag in picoseconds and the index of the detector, ordered as Graph.get_detectors
+EVENT_DTYPE = np.dtype([("time", np.int64), ("detector", np.int16)])
+
+# number of timing jitter standard deviations an event may move, used to keep the streamed chunks in time order
+JITTER_MARGIN = 10
+
+# maximum number of time bins of an FFT correlation
+FFT_MAX_BINS = 1 << 26
+
+
+
+#########################################################
+##############         Functions        #################
+#########################################################
+def get_detector_delays(graph: Graph, cell_pitch: float = CELL_PITCH) -> np.ndarray:
+    '''
+    Returns the travel time of light from the sources to every detector of a graph, along the shortest path.
+
+    :param graph: The graph of the optical setup.
+    :type graph: Graph
+
+    :param cell_pitch: The size of a grid cell in meters.
+    :type cell_pitch: float
+
+    :return: Returns an array of delays in picoseconds, ordered as :meth:`Graph.get_detectors`.
+    :rtype: numpy.ndarray
+    '''
+    circuit = graph.get_circuit()
+    distances = circuit.get_node_distances()[circuit.node_types == DETECTOR]
+
+    return np.rint(distances * cell_pitch / SPEED_OF_LIGHT * 1e12).astype(np.int64)
+
+
+def generate_events(outcomes: np.ndarray, probabilities: np.ndarray, delays: np.ndarray, shots: int, period: int,
+                    rng: np.random.Generator, jitter: float = 0.0, chunk_shots: int = SHOTS_PER_CHUNK, **detector_model):
+    '''
+    Generates the time-tagged detection events of a pulsed source, in chunks sorted by time.
+
+    Shot ``k`` is emitted at ``k * period``. Its detector records are drawn with :func:`sample_detectors`, and every detector
+    that registers photons emits one event at the emission time plus its delay plus a Gaussian timing jitter.
+    Events close to the end of a chunk are held back until the next chunk, so that the concatenated chunks stay sorted by time.
+
+    :param outcomes: A K x D array of ideal photon counts at the D detectors.
+    :type outcomes: numpy.ndarray
+
+    :param probabilities: The probability of every outcome.
+    :type probabilities: numpy.ndarray
+
+    :param delays: The delay of every detector in picoseconds, as returned by :func:`get_detector_delays`.
+    :type delays: numpy.ndarray
+
+    :param shots: The number of pulses.
+    :type shots: int
+
+    :param period: The time between two pulses in picoseconds.
+    :type period: int
+
+    :param rng: The random generator.
+    :type rng: numpy.random.Generator
+
+    :param jitter: The standard deviation of the timing jitter in picoseconds.
+    :type jitter: float
+
+    :param chunk_shots: The number of pulses per chunk.
+    :type chunk_shots: int
+
+    :param detector_model: The ``efficiency``, ``dark_count_probability`` and ``resolving`` arguments of :func:`sample_detectors`.
+
+    :return: Yields structured arrays of :data:`EVENT_DTYPE`, sorted by time.
+    :rtype: Iterator[numpy.ndarray]
+    '''
+    delays = np.asarray(delays, dtype=np.int64)
+    margin = int(np.ceil(JITTER_MARGIN * jitter)) + int(np.max(delays, initial=0) - np.min(delays, initial=0))
+
+    pending = np.zeros(0, dtype=EVENT_DTYPE)
+    for start in range(0, shots, chunk_shots):
+        stop = min(start + chunk_shots, shots)
+
+        records = sample_detectors(outcomes, probabilities, stop - start, rng, **detector_model)
+        shot_indices, detectors = np.nonzero(records)
+
+        chunk = np.empty(len(shot_indices), dtype=EVENT_DTYPE)
+        chunk["time"] = (start + shot_indices) * period + delays[detectors]
+        if jitter > 0:
+            chunk["time"] += np.rint(rng.normal(0, jitter, len(chunk))).astype(np.int64)
+        chunk["detector"] = detectors
+
+        chunk = np.concatenate([pending, chunk])
+        chunk = chunk[np.argsort(chunk["time"], kind="stable")]
+
+        # the events of the next chunk can not come before this time
+        if stop < shots:
+            split = np.searchsorted(chunk["time"], stop * period + np.min(delays, initial=0) - margin)
+            chunk, pending = chunk[:split], chunk[split:]
+        else:
+            pending = np.zeros(0, dtype=EVENT_DTYPE)
+
+        yield chunk
+
+
+def write_events(path: str, chunks) -> int:
+    '''
+    Streams chunks of events to a binary file, so the events never have to be held in memory at once.
+
+    :param path: The path of the events file.
+    :type path: str
+
+    :param chunks: The chunks of events, e.g. from :func:`generate_events`.
+    :type chunks: Iterator[numpy.ndarray]
+
+    :return: Returns the number of events written.
+    :rtype: int
+    '''
+    count = 0
+    with open(path, "wb") as file:
+        for chunk in chunks:
+            np.asarray(chunk, dtype=EVENT_DTYPE).tofile(file)
+            count += len(chunk)
+
+    return count
+
+
+def read_events(path: str) -> np.ndarray:
+    '''
+    Maps an events file written by :func:`write_events` into memory without reading it.
+
+    :param path: The path of the events file.
+    :type path: str
+
+    :return: Returns a read-only memory-mapped structured array of :data:`EVENT_DTYPE`.
+    :rtype: numpy.ndarray
+    '''
+    return np.memmap(path, dtype=EVENT_DTYPE, mode="r")
+
+
+def get_detector_times(events: np.ndarray, detector: int) -> np.ndarray:
+    '''
+    Returns the sorted time tags of the events of one detector.
+
+    :param events: A structured array of :data:`EVENT_DTYPE`, sorted by time.
+    :type events: numpy.ndarray
+
+    :param detector: The index of the detector.
+    :type detector: int
+
+    :return: Returns an array of time tags in picoseconds.
+    :rtype: numpy.ndarray
+    '''
+    return np.asarray(events["time"][events["detector"] == detector])
+
+
+def count_coincidences(times_a: np.ndarray, times_b: np.ndarray, window: int, delay: int = 0) -> int:
+    '''
+    Counts the pairs of events of two detectors closer than a coincidence window.
+
+    Every event of the first detector is matched with a binary search in the sorted time tags of the second, in O(n log m).
+
+    :param times_a: The sorted time tags of the first detector.
+    :type times_a: numpy.ndarray
+
+    :param times_b: The sorted time tags of the second detector.
+    :type times_b: numpy.ndarray
+
+    :param window: The half width of the coincidence window in picoseconds.
+    :type window: int
+
+    :param delay: A delay added to the time tags of the first detector before matching.
+    :type delay: int
+
+    :return: Returns the number of pairs (a, b) with ``|b - (a + delay)| <= window``.
+    :rtype: int
+    '''
+    shifted = times_a + delay
+    return int(np.sum(np.searchsorted(times_b, shifted + window, side="right") - np.searchsorted(times_b, shifted - window, side="left")))
+
+
+def correlation_histogram(times_a: np.ndarray, times_b: np.ndarray, bin_width: int, max_delay: int, method: str = "searchsorted") -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Histograms the time differences ``b - a`` between the events of two detectors.
+
+    Two methods are available:
+
+    - ``"searchsorted"``: the range of events of the second detector within ``max_delay`` of every event of the first detector is
+      found with a binary search, and the exact time differences are binned one neighbour rank at a time, in O(n log m + n k)
+      for k events per range. This works on any time span.
+    - ``"fft"``: both streams are binned on a common time axis and cross-correlated with FFTs, in O(T log T) for T time bins.
+      This is faster for dense streams over a short time span. The time tags are binned before taking their differences, so
+      pairs close to a bin edge may fall in the neighbouring bin.
+
+    :param times_a: The sorted time tags of the first detector.
+    :type times_a: numpy.ndarray
+
+    :param times_b: The sorted time tags of the second detector.
+    :type times_b: numpy.ndarray
+
+    :param bin_width: The width of a histogram bin in picoseconds.
+    :type bin_width: int
+
+    :param max_delay: The histogram covers the delays from ``-max_delay`` to ``max_delay``.
+    :type max_delay: int
+
+    :param method: Either ``"searchsorted"`` or ``"fft"``.
+    :type method: str
+
+    :return: Returns a tuple of the bin centers and the number of pairs in every bin.
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    '''
+    assert method in ("searchsorted", "fft"), f"Unknown method {method}"
+
+    half_bins = int(np.ceil(max_delay / bin_width))
+    centers = np.arange(-half_bins, half_bins + 1) * bin_width
+
+    if method == "searchsorted":
+        first_edge = centers[0] - bin_width / 2
+        last_edge = centers[-1] + bin_width / 2
+
+        # range of the events of the second detector falling in the histogram of every event of the first detector
+        low = np.searchsorted(times_b, times_a + first_edge, side="left")
+        high = np.searchsorted(times_b, times_a + last_edge, side="left")
+
+        counts = np.zeros(len(centers), dtype=np.int64)
+        active = np.flatnonzero(high > low)
+        rank = 0
+        while len(active):
+            differences = times_b[low[active] + rank] - times_a[active]
+            counts += np.bincount(((differences - first_edge) // bin_width).astype(np.int64), minlength=len(centers))[:len(centers)]
+
+            rank += 1
+            active = active[high[active] > low[active] + rank]
+
+        return centers, counts
+
+    # bin both streams on a common time axis, padded so that the circular correlation does not wrap around
+    start = min(times_a[0], times_b[0]) if len(times_a) and len(times_b) else 0
+    stop = max(times_a[-1], times_b[-1]) if len(times_a) and len(times_b) else 0
+    bins_count = int((stop - start) // bin_width) + 1 + 2 * half_bins
+    assert bins_count <= FFT_MAX_BINS, f"The FFT would need {bins_count} bins, use the searchsorted method"
+
+    binned_a = np.bincount(np.rint((times_a - start) / bin_width).astype(np.int64), minlength=bins_count)[:bins_count]
+    binned_b = np.bincount(np.rint((times_b - start) / bin_width).astype(np.int64), minlength=bins_count)[:bins_count]
+
+    size = 1 << int(np.ceil(np.log2(2 * bins_count)))
+    correlation = np.fft.irfft(np.conj(np.fft.rfft(binned_a, size)) * np.fft.rfft(binned_b, size), size)
+    counts = np.rint(np.concatenate([correlation[-half_bins:] if half_bins else [], correlation[:half_bins + 1]])).astype(np.int64)
+
+    return centers, counts
+
+
+def g2_histogram(times_a: np.ndarray, times_b: np.ndarray, bin_width: int, max_delay: int, duration: int = None,
+                 method: str = "searchsorted") -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns the normalized second-order cross-correlation g2(tau) of two detectors.
+
+    The pair counts of :func:`correlation_histogram` are divided by the counts expected from uncorrelated streams with the same
+    rates, ``N_a N_b bin_width / duration``, so that uncorrelated streams give g2 = 1.
+
+    :param times_a: The sorted time tags of the first detector.
+    :type times_a: numpy.ndarray
+
+    :param times_b: The sorted time tags of the second detector.
+    :type times_b: numpy.ndarray
+
+    :param bin_width: The width of a histogram bin in picoseconds.
+    :type bin_width: int
+
+    :param max_delay: The histogram covers the delays from ``-max_delay`` to ``max_delay``.
+    :type max_delay: int
+
+    :param duration: The duration of the acquisition in picoseconds. Defaults to the span of the time tags.
+    :type duration: int
+
+    :param method: Either ``"searchsorted"`` or ``"fft"``, as in :func:`correlation_histogram`.
+    :type method: str
+
+    :return: Returns a tuple of the bin centers and g2 in every bin.
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    '''
+    centers, counts = correlation_histogram(times_a, times_b, bin_width, max_delay, method)
+
+    if duration is None:
+        duration = max(times_a[-1], times_b[-1]) - min(times_a[0], times_b[0])
+
+    expected = len(times_a) * len(times_b) * bin_width / duration
+    return centers, counts / expected if expected > 0 else np.zeros(len(counts))
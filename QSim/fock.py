@@ -0,0 +1,262 @@
+#######################################################
+##########         Notes for later        #############
+#######################################################
+
+
+
+
+
+#######################################################
+##############         Imports        #################
+#######################################################
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations_with_replacement
+from math import factorial, sqrt
+from model import *
+
+
+
+#########################################################
+##############         Constants        #################
+#########################################################
+
+# number of output patterns evaluated by one task of the process pool
+PATTERNS_PER_TASK = 256
+
+
+
+#########################################################
+##############         Functions        #################
+#########################################################
+def permanent(matrix: np.ndarray) -> complex:
+    '''
+    Computes the permanent of a square matrix with Glynn's formula.
+
+    The 2^(n-1) sign vectors of the formula are visited in Gray-code order, so that consecutive vectors differ in a single sign
+    and the column sums are updated with one row at a time. This costs O(2^(n-1) n) for an n x n matrix.
+
+    :param matrix: A square matrix.
+    :type matrix: numpy.ndarray
+
+    :return: Returns the permanent of the matrix.
+    :rtype: complex
+    '''
+    matrix = np.asarray(matrix, dtype=complex)
+    n = matrix.shape[0]
+    assert matrix.shape == (n, n), f"Expected a square matrix, got the shape {matrix.shape}"
+
+    if n == 0:
+        return 1 + 0j
+
+    # all signs start positive; the sign of the first row is never flipped
+    signs = np.ones(n)
+    sums = matrix.sum(axis=0)
+    total = np.prod(sums)
+    parity = 1
+
+    for k in range(1, 2 ** (n - 1)):
+
+        # the Gray code flips the sign of the row given by the lowest set bit of k
+        row = (k & -k).bit_length()
+        sums -= 2 * signs[row] * matrix[row]
+        signs[row] = -signs[row]
+        parity = -parity
+
+        total += parity * np.prod(sums)
+
+    return complex(total / 2 ** (n - 1))
+
+
+def occupation_patterns(modes_count: int, photons_count: int):
+    '''
+    Generates all occupation patterns of a number of photons over a number of modes.
+
+    There are binomial(modes_count + photons_count - 1, photons_count) patterns.
+
+    :param modes_count: The number of modes.
+    :type modes_count: int
+
+    :param photons_count: The number of photons.
+    :type photons_count: int
+
+    :return: Yields tuples holding the number of photons in every mode.
+    :rtype: generator
+    '''
+    for modes in combinations_with_replacement(range(modes_count), photons_count):
+        yield tuple(np.bincount(modes, minlength=modes_count).tolist())
+
+
+def occupation_to_modes(occupation: tuple) -> np.ndarray:
+    '''
+    Returns the mode of every photon of an occupation pattern, with a mode repeated once per photon it holds.
+
+    :param occupation: The number of photons in every mode.
+    :type occupation: tuple
+
+    :return: Returns a sorted array of mode indices.
+    :rtype: numpy.ndarray
+    '''
+    return np.repeat(np.arange(len(occupation)), occupation)
+
+
+def occupation_norm(occupation: tuple) -> float:
+    '''
+    Returns the square root of the product of the factorials of an occupation pattern, which normalizes its transition amplitudes.
+
+    :param occupation: The number of photons in every mode.
+    :type occupation: tuple
+
+    :return: Returns the normalization factor.
+    :rtype: float
+    '''
+    return sqrt(np.prod([factorial(count) for count in occupation], dtype=float))
+
+
+def transition_amplitude(transfer_matrix: np.ndarray, input_occupation: tuple, output_occupation: tuple) -> complex:
+    '''
+    Returns the amplitude of finding an output occupation pattern, given an input occupation pattern of the same number of photons.
+
+    The amplitude is the permanent of the submatrix of the transfer matrix selected by the modes of the output photons (rows)
+    and of the input photons (columns), normalized by the factorials of both patterns.
+
+    :param transfer_matrix: The single-photon transfer matrix of the circuit, mapping input modes (columns) to output modes (rows).
+    :type transfer_matrix: numpy.ndarray
+
+    :param input_occupation: The number of photons in every input mode.
+    :type input_occupation: tuple
+
+    :param output_occupation: The number of photons in every output mode.
+    :type output_occupation: tuple
+
+    :return: Returns the transition amplitude.
+    :rtype: complex
+    '''
+    assert sum(input_occupation) == sum(output_occupation), "The input and output patterns must hold the same number of photons"
+
+    submatrix = transfer_matrix[np.ix_(occupation_to_modes(output_occupation), occupation_to_modes(input_occupation))]
+
+    return permanent(submatrix) / (occupation_norm(input_occupation) * occupation_norm(output_occupation))
+
+
+def patterns_amplitudes(columns: np.ndarray, input_norm: float, output_occupations: list) -> list:
+    '''
+    Returns the transition amplitudes of a list of output occupation patterns. This function runs in the worker processes.
+
+    :param columns: The columns of the transfer matrix selected by the modes of the input photons.
+    :type columns: numpy.ndarray
+
+    :param input_norm: The normalization factor of the input pattern.
+    :type input_norm: float
+
+    :param output_occupations: The output occupation patterns.
+    :type output_occupations: list
+
+    :return: Returns the list of amplitudes, in the order of the patterns.
+    :rtype: list
+    '''
+    return [permanent(columns[occupation_to_modes(occupation)]) / (input_norm * occupation_norm(occupation))
+            for occupation in output_occupations]
+
+
+def multi_photon_amplitudes(transfer_matrix: np.ndarray, input_occupation: tuple, output_occupations: list = None,
+                            workers: int = 1) -> dict:
+    '''
+    Computes the output amplitudes of a multi-photon input state from the single-photon transfer matrix of a circuit.
+
+    Every output amplitude is an independent permanent, so the output patterns are split in chunks evaluated in a pool of
+    processes. Only the columns of the transfer matrix holding input photons are sent to the workers.
+
+    :param transfer_matrix: The single-photon transfer matrix of the circuit, mapping input modes (columns) to output modes (rows).
+    :type transfer_matrix: numpy.ndarray
+
+    :param input_occupation: The number of photons in every input mode.
+    :type input_occupation: tuple
+
+    :param output_occupations: The output occupation patterns to evaluate. Defaults to all patterns of the same number of photons,
+        which grows as binomial(N + n - 1, n) for n photons in N modes.
+    :type output_occupations: list
+
+    :param workers: The number of worker processes. A single worker evaluates the patterns in the calling process.
+    :type workers: int
+
+    :return: Returns a dictionary mapping every output occupation pattern to its amplitude.
+    :rtype: dict
+    '''
+    transfer_matrix = np.asarray(transfer_matrix)
+    modes_count = transfer_matrix.shape[0]
+    assert len(input_occupation) == modes_count, f"Expected an occupation of {modes_count} modes, got {len(input_occupation)}"
+
+    if output_occupations is None:
+        output_occupations = occupation_patterns(modes_count, sum(input_occupation))
+    output_occupations = [tuple(occupation) for occupation in output_occupations]
+
+    columns = transfer_matrix[:, occupation_to_modes(input_occupation)]
+    input_norm = occupation_norm(input_occupation)
+
+    if workers == 1:
+        amplitudes = patterns_amplitudes(columns, input_norm, output_occupations)
+
+    else:
+        chunks = [output_occupations[start:start + PATTERNS_PER_TASK] for start in range(0, len(output_occupations), PATTERNS_PER_TASK)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            amplitudes = [amplitude
+                          for chunk_amplitudes in executor.map(patterns_amplitudes, [columns] * len(chunks), [input_norm] * len(chunks), chunks)
+                          for amplitude in chunk_amplitudes]
+
+    return dict(zip(output_occupations, amplitudes))
+
+
+def calculate_multi_photon(graph: Graph, photons: list = None, output_occupations: list = None, workers: int = 1) -> dict:
+    '''
+    Computes the output amplitudes of a graph whose sources (lasers and SPDC sources) each emit a given number of photons.
+
+    :param graph: The graph of the optical setup.
+    :type graph: Graph
+
+    :param photons: The number of photons emitted by every source, in the order of :meth:`Circuit.get_source_modes`.
+        Defaults to one photon per source.
+    :type photons: list
+
+    :param output_occupations: The output occupation patterns to evaluate, as in :func:`multi_photon_amplitudes`.
+    :type output_occupations: list
+
+    :param workers: The number of worker processes.
+    :type workers: int
+
+    :return: Returns a dictionary mapping every output occupation pattern over the path modes of the graph to its amplitude.
+    :rtype: dict
+    '''
+    circuit = graph.get_circuit()
+    source_modes = circuit.get_source_modes()
+
+    if photons is None:
+        photons = [1] * len(source_modes)
+    assert len(photons) == len(source_modes), f"Expected a number of photons for each of the {len(source_modes)} sources"
+
+    input_occupation = np.zeros(circuit.path_modes_count, dtype=int)
+    np.add.at(input_occupation, source_modes, photons)
+
+    return multi_photon_amplitudes(graph.compile().matrix, tuple(input_occupation.tolist()), output_occupations, workers)
+
+
+def get_detector_count_probabilities(graph: Graph, amplitudes: dict) -> dict:
+    '''
+    Returns the probability of every combination of photon counts at the detectors of a graph.
+
+    :param graph: The graph of the optical setup.
+    :type graph: Graph
+
+    :param amplitudes: The output amplitudes returned by :func:`calculate_multi_photon`.
+    :type amplitudes: dict
+
+    :return: Returns a dictionary mapping tuples of photon counts, ordered as :meth:`Graph.get_detectors`, to their probabilities.
+    :rtype: dict
+    '''
+    detector_modes = graph.get_circuit().get_detector_modes()
+
+    probabilities = defaultdict(float)
+    for occupation, amplitude in amplitudes.items():
+        counts = tuple(sum(occupation[mode] for mode in modes) for modes in detector_modes)
+        probabilities[counts] += abs(amplitude) ** 2
+
+    return dict(probabilities)
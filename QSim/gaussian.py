@@ -0,0 +1,342 @@
+#######################################################
+##########         Notes for later        #############
+#######################################################
+
+
+
+
+
+#######################################################
+##############         Imports        #################
+#######################################################
+from model import *
+
+
+
+#########################################################
+##############         Constants        #################
+#########################################################
+
+# default complex amplitude of the coherent state emitted by a laser, set with the "amplitude" and "phase" parameters
+LASER_AMPLITUDE = 1.0
+
+# default squeezing parameter of the squeezed vacuum emitted by an SPDC source, set with the "squeezing" and "phase" parameters
+SPDC_SQUEEZING = 0.5
+
+
+
+#########################################################
+##############         Functions        #################
+#########################################################
+def symplectic_transform(transfer_matrix: np.ndarray) -> np.ndarray:
+    '''
+    Returns the symplectic transform of a passive linear-optical circuit, acting on quadratures ordered as (x_1..x_N, p_1..p_N).
+
+    A transfer matrix T mapping the annihilation operators as a -> T a maps the quadratures as
+    x -> Re(T) x - Im(T) p and p -> Im(T) x + Re(T) p.
+
+    :param transfer_matrix: The N x N single-photon transfer matrix of the circuit.
+    :type transfer_matrix: numpy.ndarray
+
+    :return: Returns the 2N x 2N real symplectic matrix.
+    :rtype: numpy.ndarray
+    '''
+    real, imag = transfer_matrix.real, transfer_matrix.imag
+    return np.block([[real, -imag], [imag, real]])
+
+
+def calculate_gaussian(graph: Graph, backend: str = "compiled") -> "GaussianState":
+    '''
+    Propagates the Gaussian states emitted by the sources of a graph: a coherent state from every laser and a
+    single-mode squeezed vacuum from every SPDC source. All other path modes start in the vacuum.
+
+    :param graph: The graph of the optical setup.
+    :type graph: Graph
+
+    :param backend: Either ``"compiled"`` (the state is transformed with the symplectic transform of the cached transfer matrix)
+        or ``"kernel"`` (every element kernel is applied locally on the quadratures of the modes it touches).
+    :type backend: str
+
+    :return: Returns the final Gaussian state.
+    :rtype: GaussianState
+    '''
+    assert backend in ("kernel", "compiled"), f"Unknown backend {backend}"
+
+    circuit = graph.get_circuit()
+    assert circuit.acyclic, "The graph must be acyclic"
+
+    state = GaussianState.vacuum(circuit.path_modes_count)
+    for node in circuit.get_source_nodes():
+        element = graph.node_elements[node]
+        for mode in circuit.edge_labels[circuit.get_out_edges(node)]:
+
+            if circuit.node_types[node] == LASER:
+                amplitude = element.params.get("amplitude", LASER_AMPLITUDE) * np.exp(1j * element.params.get("phase", 0.0))
+                state.displace(mode, amplitude)
+            else:
+                state.squeeze(mode, element.params.get("squeezing", SPDC_SQUEEZING), element.params.get("phase", 0.0))
+
+    if backend == "kernel":
+        for kernel, modes in circuit.get_kernels():
+            state.apply_kernel(kernel, modes)
+    else:
+        state.apply_transfer_matrix(graph.compile().matrix)
+
+    return state
+
+
+def get_detector_mean_photons(graph: Graph, state: "GaussianState") -> np.ndarray:
+    '''
+    Returns the mean number of photons arriving at every detector of a graph.
+
+    :param graph: The graph of the optical setup.
+    :type graph: Graph
+
+    :param state: The final Gaussian state of the graph.
+    :type state: GaussianState
+
+    :return: Returns an array of mean photon numbers, ordered as :meth:`Graph.get_detectors`.
+    :rtype: numpy.ndarray
+    '''
+    mean_photons = state.get_mean_photon_numbers()
+    return np.array([np.sum(mean_photons[modes]) for modes in graph.get_circuit().get_detector_modes()])
+
+
+def get_detector_click_probabilities(graph: Graph, state: "GaussianState") -> np.ndarray:
+    '''
+    Returns the probability of a click at every threshold (on/off) detector of a graph.
+
+    :param graph: The graph of the optical setup.
+    :type graph: Graph
+
+    :param state: The final Gaussian state of the graph.
+    :type state: GaussianState
+
+    :return: Returns an array of click probabilities, ordered as :meth:`Graph.get_detectors`.
+    :rtype: numpy.ndarray
+    '''
+    return np.array([1 - state.get_vacuum_probability(modes) for modes in graph.get_circuit().get_detector_modes()])
+
+
+
+
+#########################################################
+################         Classes        #################
+#########################################################
+
+class GaussianState():
+    '''
+    A Gaussian state of N path modes, given by the mean vector and the covariance matrix of its quadratures.
+
+    The quadratures are ordered as (x_1..x_N, p_1..p_N), with x = a + a^dagger and p = -i(a - a^dagger), so that the vacuum has an
+    identity covariance matrix. Linear optics maps Gaussian states to Gaussian states, so coherent and squeezed light is propagated
+    exactly in polynomial time, without truncating a Fock space.
+
+    :ivar mean: The mean vector of the quadratures, of length 2N.
+    :vartype mean: numpy.ndarray
+
+    :ivar covariance: The 2N x 2N covariance matrix of the quadratures.
+    :vartype covariance: numpy.ndarray
+    '''
+
+    def __init__(self, mean: np.ndarray, covariance: np.ndarray) -> None:
+        '''
+        Initializes a :class:`GaussianState` instance.
+
+        :param mean: The mean vector of the quadratures.
+        :type mean: numpy.ndarray
+
+        :param covariance: The covariance matrix of the quadratures.
+        :type covariance: numpy.ndarray
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        assert covariance.shape == (len(mean), len(mean)), "The covariance matrix must match the mean vector"
+        assert len(mean) % 2 == 0, "Expected an x and a p quadrature for every mode"
+
+        self.mean = np.array(mean, dtype=float)
+        self.covariance = np.array(covariance, dtype=float)
+
+
+    def __str__(self):
+        return f"GaussianState(mean={self.mean}, covariance={self.covariance})"
+
+
+    @classmethod
+    def vacuum(cls, modes_count: int) -> "GaussianState":
+        '''
+        Creates the vacuum state of a number of modes.
+
+        :param modes_count: The number of modes.
+        :type modes_count: int
+
+        :return: Returns the vacuum state.
+        :rtype: GaussianState
+        '''
+        return cls(np.zeros(2 * modes_count), np.eye(2 * modes_count))
+
+
+    def get_modes_count(self) -> int:
+
+        return len(self.mean) // 2
+
+
+    def get_quadratures(self, modes: list) -> np.ndarray:
+        '''
+        Returns the indices of the x and p quadratures of the given modes.
+
+        :param modes: The modes.
+        :type modes: list
+
+        :return: Returns the indices of the x quadratures followed by those of the p quadratures.
+        :rtype: numpy.ndarray
+        '''
+        modes = np.asarray(modes)
+        return np.concatenate([modes, modes + self.get_modes_count()])
+
+
+    def displace(self, mode: int, amplitude: complex) -> None:
+        '''
+        Displaces a mode by a complex amplitude, turning the vacuum into a coherent state.
+
+        :param mode: The displaced mode.
+        :type mode: int
+
+        :param amplitude: The complex amplitude of the displacement.
+        :type amplitude: complex
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.mean[mode] += 2 * np.real(amplitude)
+        self.mean[mode + self.get_modes_count()] += 2 * np.imag(amplitude)
+
+
+    def squeeze(self, mode: int, squeezing: float, phase: float = 0.0) -> None:
+        '''
+        Applies single-mode squeezing to a mode, turning the vacuum into a squeezed vacuum.
+
+        :param mode: The squeezed mode.
+        :type mode: int
+
+        :param squeezing: The squeezing parameter r.
+        :type squeezing: float
+
+        :param phase: The squeezing angle.
+        :type phase: float
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        cos, sin = np.cos(phase / 2), np.sin(phase / 2)
+        rotation = np.array([[cos, -sin], [sin, cos]])
+        local = rotation @ np.diag([np.exp(-squeezing), np.exp(squeezing)]) @ rotation.T
+
+        self.__apply_local(local, self.get_quadratures([mode]))
+
+
+    def apply_symplectic(self, symplectic: np.ndarray) -> None:
+        '''
+        Transforms the state with a symplectic matrix acting on all quadratures.
+
+        :param symplectic: A 2N x 2N symplectic matrix.
+        :type symplectic: numpy.ndarray
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.mean = symplectic @ self.mean
+        self.covariance = symplectic @ self.covariance @ symplectic.T
+
+
+    def apply_transfer_matrix(self, transfer_matrix: np.ndarray) -> None:
+        '''
+        Transforms the state with the transfer matrix of a passive linear-optical circuit, which may be lossy.
+
+        A lossy transfer matrix T is not unitary, and the vacuum noise entering through the losses is added as
+        ``I - S S^T`` for the transform S of :func:`symplectic_transform`, which vanishes for a lossless circuit.
+
+        :param transfer_matrix: The N x N single-photon transfer matrix of the circuit.
+        :type transfer_matrix: numpy.ndarray
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        transform = symplectic_transform(transfer_matrix)
+
+        self.apply_symplectic(transform)
+        self.covariance += np.eye(len(transform)) - transform @ transform.T
+
+
+    def apply_kernel(self, kernel: np.ndarray, modes: list) -> None:
+        '''
+        Applies a small passive kernel in place on the quadratures of the given modes.
+
+        Only the rows and columns of the touched quadratures are updated, at a cost of O(N) per kernel. The vacuum noise entering
+        through the losses of a lossy kernel is added to the touched quadratures, as in :meth:`apply_transfer_matrix`.
+
+        :param kernel: A square matrix of size ``len(modes)`` acting on the annihilation operators of the touched modes.
+        :type kernel: numpy.ndarray
+
+        :param modes: The labels of the path modes touched by the kernel, in the same order as the kernel's rows and columns.
+        :type modes: list
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        transform = symplectic_transform(np.asarray(kernel))
+        quadratures = self.get_quadratures(modes)
+
+        self.__apply_local(transform, quadratures)
+        self.covariance[np.ix_(quadratures, quadratures)] += np.eye(len(quadratures)) - transform @ transform.T
+
+
+    def get_mean_photon_numbers(self) -> np.ndarray:
+        '''
+        Returns the mean number of photons in every mode.
+
+        :return: Returns an array of mean photon numbers.
+        :rtype: numpy.ndarray
+        '''
+        n = self.get_modes_count()
+        variances = np.diag(self.covariance)
+
+        return (variances[:n] + variances[n:] + self.mean[:n]**2 + self.mean[n:]**2 - 2) / 4
+
+
+    def get_vacuum_probability(self, modes: list) -> float:
+        '''
+        Returns the probability of finding no photon in any of the given modes.
+
+        :param modes: The modes.
+        :type modes: list
+
+        :return: Returns the vacuum probability of the reduced state of the modes.
+        :rtype: float
+        '''
+        quadratures = self.get_quadratures(modes)
+        mean = self.mean[quadratures]
+        shifted = self.covariance[np.ix_(quadratures, quadratures)] + np.eye(len(quadratures))
+
+        return float(2**len(modes) / np.sqrt(np.linalg.det(shifted)) * np.exp(-mean @ np.linalg.solve(shifted, mean) / 2))
+
+
+    def __apply_local(self, local: np.ndarray, quadratures: np.ndarray) -> None:
+        '''
+        This is an auxiliary method and is inteded for internal use only.
+
+        Applies a matrix acting on a subset of the quadratures to the mean vector and covariance matrix.
+
+        :param local: A square matrix acting on the given quadratures.
+        :type local: numpy.ndarray
+
+        :param quadratures: The indices of the quadratures.
+        :type quadratures: numpy.ndarray
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.mean[quadratures] = local @ self.mean[quadratures]
+        self.covariance[quadratures, :] = local @ self.covariance[quadratures, :]
+        self.covariance[:, quadratures] = self.covariance[:, quadratures] @ local.T
@@ -0,0 +1,677 @@
+#######################################################
+##########         Notes for later        #############
+#######################################################
+
+
+
+
+
+#######################################################
+##############         Imports        #################
+#######################################################
+import hashlib
+import json
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from typing import Union
+from model import *
+
+
+
+#########################################################
+##############         Constants        #################
+#########################################################
+
+# (row, column) step of a cell in every direction of travel (0: right, 1: down, 2: left, 3: up)
+ORIENTATION_STEPS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+
+
+
+#########################################################
+##############         Functions        #################
+#########################################################
+def load_layout(path: str) -> "Layout":
+    '''
+    Reads a layout from a JSON file.
+
+    The file holds the size of the grid and a list of elements, e.g.::
+
+        {"rows": 20, "cols": 50,
+         "elements": [{"type": "Laser", "row": 1, "col": 0, "orientation": 0},
+                      {"type": "Detector", "row": 1, "col": 5, "params": {}}]}
+
+    ``orientation`` and ``params`` are optional and default to 0 and no parameters. A layout placing sub-circuit blocks also holds their
+    definitions under ``"blocks"``, keyed by the block names given in the ``"block"`` parameter of the ``Block`` elements (see :class:`Block`).
+
+    :param path: The path of the layout file.
+    :type path: str
+
+    :return: Returns the layout described by the file.
+    :rtype: Layout
+    '''
+    with open(path) as file:
+        return Layout.from_dict(json.load(file))
+
+
+def save_layout(layout: "Layout", path: str) -> None:
+    '''
+    Writes a layout to a JSON file, in the format read by :func:`load_layout`.
+
+    :param layout: The layout to be written.
+    :type layout: Layout
+
+    :param path: The path of the layout file.
+    :type path: str
+
+    :return: This function does not return anything.
+    :rtype: None
+    '''
+    with open(path, "w") as file:
+        json.dump(layout.to_dict(), file, indent=1)
+
+
+
+
+#########################################################
+################         Classes        #################
+#########################################################
+
+class Layout():
+    '''
+    A grid of optical elements, independent of any GUI.
+
+    The layout keeps a spatial index of its elements (the sorted occupied columns of every row and rows of every column)
+    and a registry of its elements by type. Light paths are traced with a binary search in the spatial index, and are
+    cached until an element is added to or removed from a cell they cover.
+
+    :ivar rows: The total number of rows of the grid.
+    :vartype rows: int
+
+    :ivar cols: The total number of columns of the grid.
+    :vartype cols: int
+
+    :ivar elements: The elements of the layout, keyed by their (row, column) position.
+    :vartype elements: dict
+
+    :ivar row_occupancy: For every row, the sorted list of columns holding an element.
+    :vartype row_occupancy: list
+
+    :ivar col_occupancy: For every column, the sorted list of rows holding an element.
+    :vartype col_occupancy: list
+
+    :ivar elements_by_type: Registry of the elements, keyed by their type, then by their (row, column) position.
+    :vartype elements_by_type: dict
+
+    :ivar rays: The traced light paths, mapping an element and a direction of travel to the next element in that direction and the cells the path covers.
+    :vartype rays: dict
+    '''
+
+    def __init__(self, rows: int, cols: int) -> None:
+        '''
+        Initializes an empty :class:`Layout` instance.
+
+        :param rows: The total number of rows of the grid.
+        :type rows: int
+
+        :param cols: The total number of columns of the grid.
+        :type cols: int
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.rows = rows
+        self.cols = cols
+
+        # spatial index of the elements
+        self.elements = {}
+        self.row_occupancy = [[] for _ in range(rows)]
+        self.col_occupancy = [[] for _ in range(cols)]
+
+        # registry of the elements by type
+        self.elements_by_type = {}
+
+        # start with no traced light paths
+        self.rays = {}
+
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Layout":
+        '''
+        Creates a layout from its dictionary form, as described in :func:`load_layout`.
+
+        :param data: The size of the grid and the list of elements.
+        :type data: dict
+
+        :return: Returns the new layout.
+        :rtype: Layout
+        '''
+        blocks = {name: Block.from_dict(name, block) for name, block in data.get("blocks", {}).items()}
+
+        layout = cls(data["rows"], data["cols"])
+        for element in data["elements"]:
+            params = element.get("params")
+            if params and "block" in params:
+                params = {**params, "block": blocks[params["block"]]}
+
+            layout.add_element(Element(element["type"], element["row"], element["col"], element.get("orientation", 0), params))
+
+        return layout
+
+
+    def to_dict(self) -> dict:
+        '''
+        Returns the dictionary form of the layout, as described in :func:`load_layout`.
+
+        :return: Returns the size of the grid and the list of elements, in the row-by-row order of a grid traversal, followed by the
+            definitions of the blocks placed in the layout, if any.
+        :rtype: dict
+        '''
+        elements = []
+        blocks = {}
+        for _, element in sorted(self.elements.items()):
+            params = element.params
+
+            # blocks are written once and referenced by name
+            if isinstance(params.get("block"), Block):
+                block = params["block"]
+                assert blocks.setdefault(block.name, block).get_digest() == block.get_digest(), f"Two different blocks are named {block.name}"
+                params = {**params, "block": block.name}
+
+            elements.append({"type": element.type,
+                             "row": element.row,
+                             "col": element.col,
+                             "orientation": element.orientation,
+                             "params": params})
+
+        data = {"rows": self.rows, "cols": self.cols, "elements": elements}
+        if blocks:
+            data["blocks"] = {name: block.to_dict() for name, block in blocks.items()}
+
+        return data
+
+
+    def add_element(self, element: Element) -> None:
+        '''
+        Places an element on the empty cell given by its row and column.
+
+        :param element: The element to be placed.
+        :type element: Element
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        position = (element.row, element.col)
+
+        assert 0 <= element.row < self.rows and 0 <= element.col < self.cols, f"Position {position} is out of the grid"
+        assert position not in self.elements, f"Position {position} is already occupied"
+
+        self.elements[position] = element
+        self.elements_by_type.setdefault(element.type, {})[position] = element
+        insort(self.row_occupancy[element.row], element.col)
+        insort(self.col_occupancy[element.col], element.row)
+
+        self.invalidate_cell(*position)
+
+
+    def remove_element(self, element: Element) -> None:
+        '''
+        Removes an element from the cell given by its row and column. Does nothing if the element is not placed there.
+
+        :param element: The element to be removed.
+        :type element: Element
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        position = (element.row, element.col)
+
+        if self.elements.get(position) is not element:
+            return
+
+        del self.elements[position]
+        del self.elements_by_type[element.type][position]
+        self.row_occupancy[element.row].remove(element.col)
+        self.col_occupancy[element.col].remove(element.row)
+
+        self.invalidate_cell(*position)
+
+
+    def get_element_at(self, row: int, col: int) -> Union[Element, None]:
+        '''
+        Returns the element at a given position.
+
+        :param row: The row number of the cell.
+        :type row: int
+
+        :param col: The column number of the cell.
+        :type col: int
+
+        :return: Returns the element at the given position, or ``None`` if the cell is empty or out of the grid.
+        :rtype: Element | None
+        '''
+        return self.elements.get((row, col))
+
+
+    def get_next_element_in_dir(self, row: int, col: int, orientation: int) -> tuple[Union[Element, None], tuple[int, int]]:
+        '''
+        Returns the first element met when travelling from a cell in a given direction.
+
+        :param row: The row number of the starting cell.
+        :type row: int
+
+        :param col: The column number of the starting cell.
+        :type col: int
+
+        :param orientation: The direction of travel (0: right, 1: down, 2: left, 3: up).
+        :type orientation: int
+
+        :return: Returns a tuple of the element found (or None) and its position in the form (row, column). If no element is found,
+            the position is that of the first cell outside the grid.
+        :rtype: tuple[Element | None, tuple[int, int]]
+        '''
+        if orientation == 0:
+            cols = self.row_occupancy[row]
+            index = bisect_right(cols, col)
+            position = (row, cols[index]) if index < len(cols) else (row, self.cols)
+        elif orientation == 1:
+            rows = self.col_occupancy[col]
+            index = bisect_right(rows, row)
+            position = (rows[index], col) if index < len(rows) else (self.rows, col)
+        elif orientation == 2:
+            cols = self.row_occupancy[row]
+            index = bisect_left(cols, col) - 1
+            position = (row, cols[index]) if index >= 0 else (row, -1)
+        else:
+            rows = self.col_occupancy[col]
+            index = bisect_left(rows, row) - 1
+            position = (rows[index], col) if index >= 0 else (-1, col)
+
+        return self.elements.get(position), position
+
+
+    def get_elements_by_type(self, *types: str) -> list:
+        '''
+        Returns all elements of the given types, in the row-by-row order of a grid traversal.
+
+        :param types: The names of the element types (e.g. ``"Laser"``, ``"Mirror"``).
+        :type types: str
+
+        :return: Returns a list of elements. If no elements of such types exist, returns an empty list.
+        :rtype: list
+        '''
+        elements = {}
+        for type in types:
+            elements.update(self.elements_by_type.get(type, {}))
+
+        return [elements[position] for position in sorted(elements)]
+
+
+    def get_elements_count(self, *types: str) -> int:
+        '''
+        Returns the number of elements of the given types.
+
+        :param types: The names of the element types (e.g. ``"Laser"``, ``"Mirror"``).
+        :type types: str
+
+        :return: Returns the number of elements of the given types.
+        :rtype: int
+        '''
+        return sum(len(self.elements_by_type.get(type, {})) for type in types)
+
+
+    def get_lasers(self) -> list:
+        '''
+        Returns all lasers of the layout.
+
+        :return: Returns a list of laser elements. In case no lasers exist, returns an empty list.
+        :rtype: list
+        '''
+        return self.get_elements_by_type("Laser")
+
+
+    def get_sources(self) -> list:
+        '''
+        Returns all elements emitting light (lasers and SPDC sources) of the layout.
+
+        :return: Returns a list of source elements. In case no sources exist, returns an empty list.
+        :rtype: list
+        '''
+        return self.get_elements_by_type("Laser", "SPDC")
+
+
+    def invalidate_cell(self, row: int, col: int) -> None:
+        '''
+        Discards the traced light paths that start at, end at or cross a given cell.
+
+        Rotating an element does not invalidate any light path, since the paths leaving a cell in a given direction do not depend on the element's orientation.
+
+        :param row: The row number of the edited cell.
+        :type row: int
+
+        :param col: The column number of the edited cell.
+        :type col: int
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.rays = {key: ray for key, ray in self.rays.items() if not self.__ray_covers(ray, row, col)}
+
+
+    def build_graph(self, graph: Graph = None) -> Graph:
+        '''
+        Builds the graph of the layout by tracing the light paths from every source.
+
+        Light paths may close loops (e.g. a Sagnac interferometer or a ring cavity), which give a cyclic graph to be simulated with
+        :meth:`Graph.calculate_steady_state` or :meth:`Graph.calculate_round_trips`.
+
+        :param graph: A graph to be cleared and refilled, so that it keeps the intermediate states of its last simulation.
+            A new graph is created if none is given.
+        :type graph: Graph
+
+        :return: Returns the constructed graph object.
+        :rtype: Graph
+        '''
+        if graph is None:
+            graph = Graph()
+        else:
+            graph.clear()
+
+        # keep track of the visited elements, with the directions in which light leaves them, since light may enter an
+        # element again from another side within a loop
+        visited = set()
+
+        # queue of the BFS traversal algorithm
+        queue = deque()
+
+        # start from each source to create a graph
+        for source in self.get_sources():
+
+            queue.append((source, source.orientation))
+            visited.add((source, tuple(sorted(source.get_next_orient(source.orientation)))))
+
+            while queue:
+
+                # get the element on the front of the queue
+                element, orient = queue.popleft()
+
+                for next_element, next_orient in self.__get_successors(element, orient):
+
+                    # Append an edge to the graph here
+                    graph.add_connection(element, next_element)
+
+                    # add the element to the queue, if light does not already leave it in the same directions
+                    key = (next_element, tuple(sorted(next_element.get_next_orient(next_orient))))
+                    if key not in visited:
+                        queue.append((next_element, next_orient))
+                        visited.add(key)
+
+        return graph
+
+
+    def __ray_covers(self, ray: tuple, row: int, col: int) -> bool:
+        '''
+        This is an auxiliary method and is inteded for internal use only.
+
+        Checks if a traced light path covers a given cell, including the cells at both of its ends.
+
+        :param ray: A traced light path, in the form (next element, starting cell, ending cell).
+        :type ray: tuple
+
+        :param row: The row number of the cell.
+        :type row: int
+
+        :param col: The column number of the cell.
+        :type col: int
+
+        :return: Returns :literal:`True` if the cell lies on the light path, otherwise returns :literal:`False`.
+        :rtype: bool
+        '''
+        _, (start_row, start_col), (end_row, end_col) = ray
+
+        return (min(start_row, end_row) <= row <= max(start_row, end_row)) and \
+               (min(start_col, end_col) <= col <= max(start_col, end_col))
+
+
+    def __get_successors(self, element: Element, orientation: int) -> list:
+        '''
+        This is an auxiliary method and is inteded for internal use only.
+
+        Given an element and the orientation in which the light enters the element, returns the next element(s) in the light travel direction.
+        Light leaving the grid ends at a ``GridWall`` element placed just outside the grid.
+
+        :param element: The element at which the traversal should start.
+        :type element: Element
+
+        :param orientation: The direction of travel of the light entering the element.
+        :type orientation: int
+
+        :return: Returns a list of (successor, direction of travel) tuples. The list would contain two successors for a beamsplitter.
+        :rtype: list
+        '''
+        successors = []
+
+        for orient in element.get_next_orient(orientation):
+
+            # trace the light path only if it is not cached
+            if (element, orient) not in self.rays:
+                next_element, (row, col) = self.get_next_element_in_dir(element.row, element.col, orient)
+                if next_element is None:
+                    next_element = Element("GridWall", row, col)
+
+                self.rays[(element, orient)] = (next_element,
+                                                (element.row, element.col),
+                                                (next_element.row, next_element.col))
+
+            successors.append((self.rays[(element, orient)][0], orient))
+
+        return successors
+
+
+
+
+class Block():
+    '''
+    A reusable sub-circuit: a rectangular layout of elements with named input and output ports on its boundary.
+
+    An instance of a block is placed in a layout as a single ``Block`` element holding the block in its ``"block"`` parameter.
+    Light travelling in the direction of an input port enters the block through that port and leaves it through the output ports,
+    each in its own direction, with the amplitudes of the port-to-port transfer matrix. The ports turn with the orientation of the
+    instance. The transfer matrix is computed once from the layout of the block and cached by the digest of the block's contents,
+    so that every instance is simulated as a single fused kernel instead of element by element. Blocks may place other blocks.
+
+    The layout of a block must not be changed once the block is created.
+
+    :ivar name: The name of the block, which refers to it in a layout file.
+    :vartype name: str
+
+    :ivar layout: The elements of the block.
+    :vartype layout: Layout
+
+    :ivar inputs: The input ports, mapping their names to the (row, column, direction of travel) of the light entering the block
+        at a boundary cell. The directions of travel of the inputs are all different.
+    :vartype inputs: dict
+
+    :ivar outputs: The output ports, mapping their names to the (row, column, direction of travel) of the light leaving the block
+        from a boundary cell. The directions of travel of the outputs are all different.
+    :vartype outputs: dict
+    '''
+
+    def __init__(self, name: str, layout: Layout, inputs: dict, outputs: dict) -> None:
+        '''
+        Initializes a :class:`Block` instance.
+
+        :param name: The name of the block.
+        :type name: str
+
+        :param layout: The elements of the block.
+        :type layout: Layout
+
+        :param inputs: The input ports, as (row, column, direction of travel) tuples keyed by their names.
+        :type inputs: dict
+
+        :param outputs: The output ports, as (row, column, direction of travel) tuples keyed by their names.
+        :type outputs: dict
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.name = name
+        self.layout = layout
+        self.inputs = {port: tuple(position) for port, position in inputs.items()}
+        self.outputs = {port: tuple(position) for port, position in outputs.items()}
+
+        for ports in (self.inputs, self.outputs):
+            orientations = [orientation for _, _, orientation in ports.values()]
+            assert len(set(orientations)) == len(orientations), "The ports of a block must have different directions of travel"
+
+        # digest of the contents of the block, keying its transfer matrix
+        self.digest = None
+
+
+    def __repr__(self) -> str:
+        return f"Block({self.name},{self.get_digest()})"
+
+
+    @classmethod
+    def from_dict(cls, name: str, data: dict) -> "Block":
+        '''
+        Creates a block from its dictionary form: the dictionary form of its layout with its ``"inputs"`` and ``"outputs"``.
+
+        :param name: The name of the block.
+        :type name: str
+
+        :param data: The dictionary form of the block.
+        :type data: dict
+
+        :return: Returns the new block.
+        :rtype: Block
+        '''
+        return cls(name, Layout.from_dict(data), data["inputs"], data["outputs"])
+
+
+    def to_dict(self) -> dict:
+        '''
+        Returns the dictionary form of the block, as read by :meth:`from_dict`.
+
+        :return: Returns the dictionary form of the layout of the block, with its input and output ports.
+        :rtype: dict
+        '''
+        return {**self.layout.to_dict(),
+                "inputs": {port: list(position) for port, position in self.inputs.items()},
+                "outputs": {port: list(position) for port, position in self.outputs.items()}}
+
+
+    def get_digest(self) -> str:
+        '''
+        Returns a digest of the contents of the block: its elements, with their parameters, and its ports.
+
+        Two blocks with the same contents have the same digest, whatever their names, and share their transfer matrix.
+
+        :return: Returns a hexadecimal digest.
+        :rtype: str
+        '''
+        if self.digest is None:
+            self.digest = hashlib.sha1(json.dumps(self.to_dict(), sort_keys=True).encode()).hexdigest()
+
+        return self.digest
+
+
+    def get_transfer_matrix(self) -> np.ndarray:
+        '''
+        Returns the port-to-port transfer matrix of the block.
+
+        The matrix is computed by surrounding the block with a laser in front of every input port and a detector behind every
+        output port, and applying the kernels of its elements to an identity operation. It is cached in :data:`block_matrices`
+        by the digest of the block, and is read-only.
+
+        :return: Returns the matrix mapping the amplitudes entering the input ports (columns) to those leaving the output ports (rows),
+            in the order of the ports.
+        :rtype: numpy.ndarray
+        '''
+        digest = self.get_digest()
+        matrix = block_matrices.get(digest)
+        if matrix is not None:
+            return matrix
+
+        # place the block in a grid with a free cell on every side, for the lasers and the detectors
+        layout = Layout(self.layout.rows + 2, self.layout.cols + 2)
+        for element in self.layout.elements.values():
+            layout.add_element(Element(element.type, element.row + 1, element.col + 1, element.orientation, element.params))
+
+        lasers, detectors = [], []
+        for ports, elements, sign, type in ((self.inputs, lasers, -1, "Laser"), (self.outputs, detectors, 1, "Detector")):
+            for row, col, orientation in ports.values():
+                step_row, step_col = ORIENTATION_STEPS[orientation]
+                elements.append(Element(type, row + 1 + sign * step_row, col + 1 + sign * step_col, orientation))
+                layout.add_element(elements[-1])
+
+        graph = layout.build_graph()
+        circuit = graph.get_circuit()
+        assert circuit.acyclic, f"The block {self.name} must be acyclic"
+
+        operation = Operation(circuit.path_modes_count)
+        for kernel, modes in circuit.get_kernels():
+            operation.apply_kernel(kernel, modes)
+
+        matrix = np.zeros((len(detectors), len(lasers)), dtype=complex)
+        for row, detector in enumerate(detectors):
+
+            # the output port only collects the light arriving in its own direction of travel
+            node = graph.node_ids.get(repr(detector))
+            edges = circuit.get_in_edges(node) if node is not None else np.zeros(0, dtype=np.int64)
+            edges = edges[circuit.edge_orientations[edges] == detector.orientation]
+            if not len(edges):
+                continue
+
+            for col, laser in enumerate(lasers):
+                label = circuit.edge_labels[circuit.get_out_edges(graph.node_ids[repr(laser)])][0]
+                matrix[row, col] = operation.matrix[circuit.edge_labels[edges[0]], label]
+
+        matrix.flags.writeable = False
+        block_matrices.put(digest, matrix)
+
+        return matrix
+
+
+    def get_next_orient(self, orientation: int, instance_orientation: int = 0) -> list:
+        '''
+        Returns the directions in which light leaves an instance of the block, given the direction in which it enters.
+
+        :param orientation: The direction of travel of the incoming light.
+        :type orientation: int
+
+        :param instance_orientation: The orientation of the instance.
+        :type instance_orientation: int
+
+        :return: Returns the directions of the output ports reached from the input port of the incoming light, if any.
+        :rtype: list
+        '''
+        return [out_orientation for out_orientation in range(ORIENTATIONS)
+                if self.get_coefficient(orientation, out_orientation, instance_orientation) != 0]
+
+
+    def get_coefficient(self, in_orientation: int, out_orientation: int, instance_orientation: int = 0) -> complex:
+        '''
+        Returns the amplitude with which light entering an instance of the block in one direction of travel leaves it in another.
+
+        :param in_orientation: The direction of travel of the incoming light.
+        :type in_orientation: int
+
+        :param out_orientation: The direction of travel of the outgoing light.
+        :type out_orientation: int
+
+        :param instance_orientation: The orientation of the instance, which turns its ports.
+        :type instance_orientation: int
+
+        :return: Returns the entry of the transfer matrix between the two ports, or 0 if there is no such port.
+        :rtype: complex
+        '''
+        in_orientation = (in_orientation - instance_orientation) % ORIENTATIONS
+        out_orientation = (out_orientation - instance_orientation) % ORIENTATIONS
+
+        in_ports = [orientation for _, _, orientation in self.inputs.values()]
+        out_ports = [orientation for _, _, orientation in self.outputs.values()]
+        if in_orientation not in in_ports or out_orientation not in out_ports:
+            return 0
+
+        return self.get_transfer_matrix()[out_ports.index(out_orientation), in_ports.index(in_orientation)]
@@ -0,0 +1,254 @@
+#######################################################
+##########         Notes for later        #############
+#######################################################
+
+
+
+
+
+#######################################################
+##############         Imports        #################
+#######################################################
+from layout import *
+
+
+
+#########################################################
+##############         Constants        #################
+#########################################################
+
+# tolerance on the unitarity of a target matrix, and below which a reflection amplitude or a phase is dropped
+MESH_TOLERANCE = 1e-9
+
+# number of grid columns of one layer of the mesh: the phase delay, the beam splitter and the column of the return path
+MESH_LAYER_WIDTH = 3
+
+# decomposition schemes: Clements (rectangular mesh, depth N) and Reck (triangular mesh, depth 2N - 3)
+MESH_METHODS = ("clements", "reck")
+
+
+
+#########################################################
+##############         Functions        #################
+#########################################################
+def nulling_rotation(a: complex, b: complex, lower: bool = False) -> np.ndarray:
+    '''
+    Returns a 2x2 unitary mixing two entries of a matrix so that one of them vanishes.
+
+    :param a: The entry of the first column (or row).
+    :type a: complex
+
+    :param b: The entry of the second column (or row).
+    :type b: complex
+
+    :param lower: :literal:`False` to null ``a`` when multiplying the two columns from the right, or :literal:`True` to null ``b``
+        when multiplying the two rows from the left.
+    :type lower: bool
+
+    :return: Returns the 2x2 unitary.
+    :rtype: numpy.ndarray
+    '''
+    norm = np.sqrt(abs(a)**2 + abs(b)**2)
+    if norm == 0:
+        return np.eye(2, dtype=complex)
+
+    if lower:
+        return np.array([[np.conj(a), np.conj(b)],
+                         [-b,         a         ]], dtype=complex) / norm
+
+    return np.array([[b,  np.conj(a)],
+                     [-a, np.conj(b)]], dtype=complex) / norm
+
+
+def beam_splitter_cell(unitary: np.ndarray) -> tuple[float, float, np.ndarray]:
+    '''
+    Writes a 2x2 unitary as a phase delay on its first mode, followed by a beam splitter and by a phase on both modes.
+
+    Every 2x2 unitary can be written as ``diag(d) @ beam_splitter_kernel(reflectivity) @ diag(exp(1j * phase), 1)``.
+
+    :param unitary: The 2x2 unitary.
+    :type unitary: numpy.ndarray
+
+    :return: Returns a tuple of the reflectivity of the beam splitter, the phase of the phase delay and the output phases ``d``.
+    :rtype: tuple[float, float, numpy.ndarray]
+    '''
+    transmission, reflection = abs(unitary[0, 0]), abs(unitary[0, 1])
+    reflectivity = min(1.0, reflection**2 / (transmission**2 + reflection**2))
+
+    # a beam splitter without reflection only leaves phases
+    if reflection < MESH_TOLERANCE:
+        return 0.0, 0.0, np.angle(np.diag(unitary))
+
+    first = unitary[0, 1] / (1j * reflection)
+    phase = np.angle(unitary[0, 0] / first) if transmission >= MESH_TOLERANCE else 0.0
+    second = unitary[1, 0] / (1j * reflection * np.exp(1j * phase)) if reflection >= transmission else unitary[1, 1] / transmission
+
+    return reflectivity, phase, np.angle([first, second])
+
+
+def decompose_unitary(unitary: np.ndarray, method: str = "clements") -> tuple[list, np.ndarray]:
+    '''
+    Decomposes a unitary into beam splitter cells between neighbouring modes, followed by a phase on every mode.
+
+    The entries below the diagonal are nulled one at a time with 2x2 rotations of neighbouring columns (and, for the Clements scheme,
+    of neighbouring rows), which leaves a diagonal matrix of phases. Every rotation is written as a cell of a phase delay on its upper
+    mode and a beam splitter with :func:`beam_splitter_cell`, and the phases left on both modes are carried forward into the next cells.
+    The Clements scheme gives a rectangular mesh of depth N, and the Reck scheme a triangular mesh of depth 2N - 3, both with
+    N(N - 1) / 2 cells.
+
+    :param unitary: The N x N target transfer matrix, mapping input modes (columns) to output modes (rows).
+    :type unitary: numpy.ndarray
+
+    :param method: Either ``"clements"`` or ``"reck"``.
+    :type method: str
+
+    :return: Returns a tuple of the cells in the order light goes through them, as (upper mode, reflectivity, phase) tuples, and the
+        N output phases.
+    :rtype: tuple[list, numpy.ndarray]
+    '''
+    assert method in MESH_METHODS, f"Unknown method {method}"
+
+    matrix = np.array(unitary, dtype=complex)
+    n = len(matrix)
+    assert matrix.shape == (n, n), f"Expected a square matrix, got the shape {matrix.shape}"
+    assert np.allclose(matrix.conj().T @ matrix, np.eye(n), atol=MESH_TOLERANCE), "The matrix must be unitary"
+
+    # rotations applied from the right (on columns) and from the left (on rows), as (upper mode, rotation) tuples
+    right, left = [], []
+
+    if method == "clements":
+        for i in range(1, n):
+            if i % 2:
+                for j in range(i):
+                    k = i - j - 1
+                    rotation = nulling_rotation(matrix[n - 1 - j, k], matrix[n - 1 - j, k + 1])
+                    matrix[:, k:k + 2] = matrix[:, k:k + 2] @ rotation
+                    right.append((k, rotation))
+            else:
+                for j in range(1, i + 1):
+                    k = n + j - i - 2
+                    rotation = nulling_rotation(matrix[k, j - 1], matrix[k + 1, j - 1], lower=True)
+                    matrix[k:k + 2, :] = rotation @ matrix[k:k + 2, :]
+                    left.append((k, rotation))
+    else:
+        for i in range(n - 1, 0, -1):
+            for j in range(i):
+                rotation = nulling_rotation(matrix[i, j], matrix[i, j + 1])
+                matrix[:, j:j + 2] = matrix[:, j:j + 2] @ rotation
+                right.append((j, rotation))
+
+    # the unitary is L_1^H ... L_p^H D R_q^H ... R_1^H, so light goes through the inverse right rotations first
+    operations = [(k, rotation.conj().T) for k, rotation in right]
+    operations.append((None, np.diag(matrix)))
+    operations.extend((k, rotation.conj().T) for k, rotation in reversed(left))
+
+    cells = []
+    phases = np.zeros(n)
+    for k, operation in operations:
+        if k is None:
+            phases += np.angle(operation)
+            continue
+
+        # the phases carried so far enter the cell before its rotation
+        reflectivity, phase, output_phases = beam_splitter_cell(operation @ np.diag(np.exp(1j * phases[k:k + 2])))
+        phases[k:k + 2] = output_phases
+        if reflectivity > 0:
+            cells.append((k, reflectivity, phase))
+
+    return cells, phases
+
+
+def get_mesh_layers(cells: list, modes_count: int) -> list:
+    '''
+    Schedules the cells of a mesh into layers, placing every cell in the first layer after the last cell on either of its modes.
+
+    :param cells: The cells in the order light goes through them, as returned by :func:`decompose_unitary`.
+    :type cells: list
+
+    :param modes_count: The number of modes.
+    :type modes_count: int
+
+    :return: Returns the layer of every cell.
+    :rtype: list
+    '''
+    next_layers = np.zeros(modes_count, dtype=np.int64)
+
+    layers = []
+    for k, _, _ in cells:
+        layer = int(max(next_layers[k], next_layers[k + 1]))
+        next_layers[k:k + 2] = layer + 1
+        layers.append(layer)
+
+    return layers
+
+
+def mesh_to_layout(cells: list, phases: np.ndarray) -> Layout:
+    '''
+    Places a mesh of beam splitter cells on a grid.
+
+    Mode ``i`` runs to the right along row ``2i + 1``, from a laser in the first column to a detector in the last column, so that the
+    lasers and the detectors are the input and output ports of the mesh, in the order of the modes. A cell between modes ``k`` and
+    ``k + 1`` takes three columns: a phase delay on mode ``k``, then a mirror turning mode ``k + 1`` up into a beam splitter on mode ``k``,
+    whose upper output is routed back to mode ``k + 1`` by mirrors over row ``2k``, crossing mode ``k`` through an empty cell.
+    Every path keeps the label of its mode, so the transfer matrix of the compiled graph is the matrix of the mesh. The return path
+    is four cells longer than the straight path, which only matters to :meth:`Graph.calculate_sweep` and to time bins.
+
+    :param cells: The cells in the order light goes through them, as returned by :func:`decompose_unitary`.
+    :type cells: list
+
+    :param phases: The output phase of every mode.
+    :type phases: numpy.ndarray
+
+    :return: Returns the layout of the mesh.
+    :rtype: Layout
+    '''
+    modes_count = len(phases)
+    layers = get_mesh_layers(cells, modes_count)
+    depth = max(layers, default=-1) + 1
+
+    rows = 2 * modes_count
+    cols = 1 + MESH_LAYER_WIDTH * depth + 2
+    layout = Layout(rows, cols)
+
+    for k in range(modes_count):
+        layout.add_element(Element("Laser", 2 * k + 1, 0, 0))
+        layout.add_element(Element("Detector", 2 * k + 1, cols - 1, 0))
+
+    for (k, reflectivity, phase), layer in zip(cells, layers):
+        col = 1 + MESH_LAYER_WIDTH * layer
+        upper, lower = 2 * k + 1, 2 * k + 3
+
+        if abs(phase) > MESH_TOLERANCE:
+            layout.add_element(Element("PhaseDelay", upper, col, 0, {"phase": float(phase)}))
+
+        layout.add_element(Element("Mirror", lower, col + 1, 1))
+        layout.add_element(Element("BeamSplitter", upper, col + 1, 1, {"reflectivity": float(reflectivity)}))
+        layout.add_element(Element("Mirror", upper - 1, col + 1, 1))
+        layout.add_element(Element("Mirror", upper - 1, col + 2, 0))
+        layout.add_element(Element("Mirror", lower, col + 2, 0))
+
+    for k, phase in enumerate(np.angle(np.exp(1j * np.asarray(phases)))):
+        if abs(phase) > MESH_TOLERANCE:
+            layout.add_element(Element("PhaseDelay", 2 * k + 1, cols - 2, 0, {"phase": float(phase)}))
+
+    return layout
+
+
+def compile_unitary(unitary: np.ndarray, method: str = "clements") -> Layout:
+    '''
+    Compiles a target unitary into a layout of lasers, beam splitters, mirrors, phase delays and detectors.
+
+    The compiled graph of the layout has the target as its transfer matrix (see :meth:`Graph.compile`), with mode ``i`` starting at the
+    ``i``-th laser and ending at the ``i``-th detector from the top. The layout can be written with :func:`save_layout`.
+
+    :param unitary: The N x N target transfer matrix, mapping input modes (columns) to output modes (rows).
+    :type unitary: numpy.ndarray
+
+    :param method: Either ``"clements"`` or ``"reck"``, as in :func:`decompose_unitary`.
+    :type method: str
+
+    :return: Returns the layout of the mesh.
+    :rtype: Layout
+    '''
+    cells, phases = decompose_unitary(unitary, method)
+    return mesh_to_layout(cells, phases)
@@ -9,13 +9,126 @@
 #######################################################
 ##############         Imports        #################
 #######################################################
-import networkx as nx
 import numpy as np
-from collections import defaultdict, deque
-import matplotlib
-matplotlib.use('Qt5Agg')
-from matplotlib import pyplot as plt
-from viewer import *
+import hashlib
+import heapq
+from collections import defaultdict, deque, OrderedDict
+from math import factorial, sqrt
+
+
+
+#########################################################
+##############         Constants        #################
+#########################################################
+
+# element type codes, keyed by the names of the element classes
+GRID_WALL           = 0
+LASER               = 1
+DETECTOR            = 2
+BEAM_SPLITTER       = 3
+POLAR_BEAM_SPLITTER = 4
+MIRROR              = 5
+SPDC_SOURCE         = 6
+HALF_WAVE_PLATE     = 7
+QUARTER_WAVE_PLATE  = 8
+POLARIZER           = 9
+ROTATOR             = 10
+TIME_DELAY          = 11
+PHASE_DELAY         = 12
+DEPHASER            = 13
+DEPOLARIZER         = 14
+NEUTRAL_DENSITY     = 15
+BEAM_BLOCKER        = 16
+PHASE_RETARDER      = 17
+BLOCK               = 18
+
+ELEMENT_TYPES = {
+    "GridWall":          GRID_WALL,
+    "Laser":             LASER,
+    "Detector":          DETECTOR,
+    "BeamSplitter":      BEAM_SPLITTER,
+    "PolarBeamSplitter": POLAR_BEAM_SPLITTER,
+    "Mirror":            MIRROR,
+    "SPDC":              SPDC_SOURCE,
+    "HWP":               HALF_WAVE_PLATE,
+    "QWP":               QUARTER_WAVE_PLATE,
+    "Polarizer":         POLARIZER,
+    "Rotator":           ROTATOR,
+    "TimeDelay":         TIME_DELAY,
+    "PhaseDelay":        PHASE_DELAY,
+    "Dephaser":          DEPHASER,
+    "Depolarizer":       DEPOLARIZER,
+    "NDF":               NEUTRAL_DENSITY,
+    "BeamBlocker":       BEAM_BLOCKER,
+    "PhaseRetarder":     PHASE_RETARDER,
+    "Block":             BLOCK,
+}
+
+# type codes of the elements emitting light
+SOURCE_TYPES = (LASER, SPDC_SOURCE)
+
+# type codes of the elements acting only on the polarization of the light passing through them
+POLARIZATION_TYPES = (HALF_WAVE_PLATE, QUARTER_WAVE_PLATE, POLARIZER, ROTATOR, PHASE_RETARDER)
+
+# default angles, in radians, of the polarizing elements, set with the "angle" parameter
+POLARIZATION_ANGLES = {
+    HALF_WAVE_PLATE:    np.pi / 8,
+    QUARTER_WAVE_PLATE: np.pi / 4,
+    POLARIZER:          0.0,
+    ROTATOR:            np.pi / 4,
+    PHASE_RETARDER:     0.0,
+}
+
+# default retardance, in radians, of a phase retarder, set with the "retardance" parameter
+RETARDER_RETARDANCE = np.pi / 2
+
+# default power reflectivity of a beam splitter, set with the "reflectivity" parameter
+BEAM_SPLITTER_REFLECTIVITY = 0.5
+
+# default length of a time delay line, in grid cells, set with the "delay" parameter
+TIME_DELAY_LENGTH = 8
+
+# default phase, in radians, of a phase delay, set with the "phase" parameter
+PHASE_DELAY_PHASE = np.pi / 2
+
+# type codes of the elements acting as noisy channels, which only act on a density matrix
+CHANNEL_TYPES = (DEPHASER, DEPOLARIZER)
+
+# default strength of the noisy channels, between 0 (no effect) and 1 (full decoherence), set with the "strength" parameter
+CHANNEL_STRENGTHS = {
+    DEPHASER:    1.0,
+    DEPOLARIZER: 1.0,
+}
+
+# default power transmission of a neutral density filter, set with the "transmission" parameter
+NDF_TRANSMISSION = 0.5
+
+# default power reflectivity of a mirror, set with the "reflectivity" parameter
+MIRROR_REFLECTIVITY = 1.0
+
+# lost probabilities below this value are left out of a loss ledger
+LOSS_THRESHOLD = 1e-12
+
+# number of orientations an element can take (0: right, 1: down, 2: left, 3: up)
+ORIENTATIONS = 4
+
+# physical size of a grid cell in meters, turning the grid distances of the edges into path lengths
+CELL_PITCH = 1e-3
+
+# speed of light in vacuum, in meters per second
+SPEED_OF_LIGHT = 299792458.0
+
+# amplitudes of a sparse state below this magnitude are discarded after every kernel
+SPARSE_TRUNCATION_THRESHOLD = 1e-12
+
+# maximum number of compiled transfer matrices kept in memory
+TRANSFER_MATRIX_CACHE_SIZE = 32
+
+# maximum number of port-to-port transfer matrices of sub-circuit blocks kept in memory
+BLOCK_MATRIX_CACHE_SIZE = 128
+
+# maximum number of intermediate states kept for incremental re-simulation
+INCREMENTAL_CHECKPOINTS = 64
 
 
 
@@ -36,6 +149,150 @@ def is_power_of_two(n: int) -> bool:
     return n > 0 and (n & (n - 1)) == 0
 
 
+def beam_splitter_kernel(reflectivity: float = BEAM_SPLITTER_REFLECTIVITY) -> np.ndarray:
+    '''
+    Returns the local 2x2 kernel of a beam splitter, which is a 50:50 beam splitter by default.
+
+    The kernel acts on the amplitudes of the two path modes touched by the beam splitter.
+    The diagonal entries hold the transmission amplitudes and the off-diagonal entries hold the reflection amplitudes,
+    matching the entries written by :meth:`Operation.modify_to_beam_splitter`.
+    An array of reflectivities gives a stack of kernels along leading axes, one per reflectivity.
+
+    :param reflectivity: The power reflectivity between 0 and 1.
+    :type reflectivity: float | numpy.ndarray
+
+    :return: Returns a complex 2x2 unitary matrix, or a stack of them.
+    :rtype: numpy.ndarray
+    '''
+    reflectivity = np.asarray(reflectivity, dtype=float)[..., None, None]
+    return np.sqrt(1 - reflectivity) * np.array([[1,  0 ],
+                                                 [0,  1 ]], dtype=complex) + \
+           np.sqrt(reflectivity)     * np.array([[0,  1j],
+                                                 [1j, 0 ]], dtype=complex)
+
+
+def polarizing_beam_splitter_kernel() -> np.ndarray:
+    '''
+    Returns the local kernels of a polarizing beam splitter, one 2x2 path kernel for every polarization.
+
+    The horizontal polarization is transmitted and the vertical polarization is reflected, with the same reflection phase
+    as :func:`beam_splitter_kernel`.
+
+    :return: Returns a complex 2x2x2 array, holding the path kernel of the horizontal and then of the vertical polarization.
+    :rtype: numpy.ndarray
+    '''
+    return np.array([[[1,  0 ],
+                      [0,  1 ]],
+                     [[0,  1j],
+                      [1j, 0 ]]], dtype=complex)
+
+
+def phase_kernel(phase: float) -> np.ndarray:
+    '''
+    Returns the local 1x1 kernel of an element delaying the phase of the path mode passing through it.
+
+    :param phase: The phase in radians, or an array of phases giving a stack of kernels.
+    :type phase: float | numpy.ndarray
+
+    :return: Returns a complex 1x1 unitary matrix, or a stack of them.
+    :rtype: numpy.ndarray
+    '''
+    return np.exp(1j * np.asarray(phase, dtype=float))[..., None, None]
+
+
+def attenuation_kernel(transmission: float, modes_count: int = 1) -> np.ndarray:
+    '''
+    Returns the local kernel of a lossy element, scaling the amplitudes of the path modes passing through it.
+
+    The kernel is not unitary: the probability ``1 - transmission`` of every mode is lost.
+
+    :param transmission: The power transmission between 0 (blocked) and 1 (lossless), or an array of them giving a stack of kernels.
+    :type transmission: float | numpy.ndarray
+
+    :param modes_count: The number of path modes passing through the element.
+    :type modes_count: int
+
+    :return: Returns a diagonal complex matrix, or a stack of them.
+    :rtype: numpy.ndarray
+    '''
+    return np.sqrt(np.asarray(transmission, dtype=float))[..., None, None] * np.eye(modes_count, dtype=complex)
+
+
+def jones_matrix(type: int, angle: float = None, retardance: float = None) -> np.ndarray:
+    '''
+    Returns the Jones matrix of a polarizing element, acting on the (horizontal, vertical) amplitudes of a path mode.
+
+    Wave plates, phase retarders and polarizers are oriented by the angle of their fast or transmission axis to the horizontal,
+    and a rotator rotates the polarization by its angle. Arrays of angles or retardances give a stack of matrices along leading axes.
+
+    :param type: The type code of the element, one of :data:`POLARIZATION_TYPES`.
+    :type type: int
+
+    :param angle: The angle of the element in radians. Defaults to the angle given in :data:`POLARIZATION_ANGLES`.
+    :type angle: float | numpy.ndarray
+
+    :param retardance: The retardance of a phase retarder in radians. Defaults to :data:`RETARDER_RETARDANCE`.
+    :type retardance: float | numpy.ndarray
+
+    :return: Returns a complex 2x2 matrix, or a stack of them.
+    :rtype: numpy.ndarray
+    '''
+    assert type in POLARIZATION_TYPES, f"Not a polarizing element type {type}"
+
+    if angle is None:
+        angle = POLARIZATION_ANGLES[type]
+    if retardance is None:
+        retardance = RETARDER_RETARDANCE
+
+    cos, sin = np.cos(angle), np.sin(angle)
+    rotation = np.stack([np.stack([cos, -sin], axis=-1), np.stack([sin, cos], axis=-1)], axis=-2).astype(complex)
+
+    if type == ROTATOR:
+        return rotation
+
+    if type == HALF_WAVE_PLATE:
+        local = np.diag([1, -1]).astype(complex)
+    elif type == QUARTER_WAVE_PLATE:
+        local = np.diag([1, 1j])
+    elif type == PHASE_RETARDER:
+        local = np.exp(1j * np.asarray(retardance, dtype=float))[..., None, None] * np.diag([0, 1]) + np.diag([1, 0])
+    else:
+        local = np.diag([1, 0]).astype(complex)
+
+    return rotation @ local @ np.swapaxes(rotation, -1, -2)
+
+
+def channel_operators(type: int, strength: float = None) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns the Kraus operators of a noisy channel acting on the photon passing through a path mode, as a mixture of unitaries.
+
+    The Kraus operators are ``sqrt(p_k) U_k`` on the (horizontal, vertical) amplitudes of the path mode and ``sqrt(p_k)`` times
+    the identity on all other modes. A dephaser flips the phase of the path mode, scaling its coherences with the other
+    modes by ``1 - strength``. A depolarizer applies the Pauli matrices to the polarization, shrinking its Bloch vector by
+    ``1 - strength``.
+
+    :param type: The type code of the element, one of :data:`CHANNEL_TYPES`.
+    :type type: int
+
+    :param strength: The strength of the channel between 0 and 1. Defaults to the strength given in :data:`CHANNEL_STRENGTHS`.
+    :type strength: float
+
+    :return: Returns a tuple of a K x 2 x 2 array of unitaries and the probability of every unitary.
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    '''
+    assert type in CHANNEL_TYPES, f"Not a channel element type {type}"
+
+    if strength is None:
+        strength = CHANNEL_STRENGTHS[type]
+
+    identity = np.eye(2, dtype=complex)
+    if type == DEPHASER:
+        return np.array([identity, -identity]), np.array([1 - strength / 2, strength / 2])
+
+    paulis = np.array([identity, [[0, 1], [1, 0]], [[0, -1j], [1j, 0]], [[1, 0], [0, -1]]], dtype=complex)
+    return paulis, np.array([1 - 3 * strength / 4, strength / 4, strength / 4, strength / 4])
+
+
 
 
 
@@ -43,6 +300,102 @@ def is_power_of_two(n: int) -> bool:
 ################         Classes        #################
 #########################################################
 
+class Element():
+    '''
+    A plain record of an optical element placed on a grid.
+
+    Elements carry no behavior beyond the directions in which they send light, so layouts can be built and simulated
+    without any GUI. The widgets of the viewer each hold one element and keep it in sync with their position and orientation.
+
+    :ivar type: The type of the element, one of the keys of :data:`ELEMENT_TYPES` (e.g. ``"Laser"``, ``"Mirror"``).
+    :vartype type: str
+
+    :ivar row: The row number of the element within the grid.
+    :vartype row: int
+
+    :ivar col: The column number of the element within the grid.
+    :vartype col: int
+
+    :ivar orientation: The orientation index of the element (0: right, 1: down, 2: left, 3: up).
+    :vartype orientation: int
+
+    :ivar params: The parameters of the element.
+    :vartype params: dict
+    '''
+
+    def __init__(self, type: str, row: int = 0, col: int = 0, orientation: int = 0, params: dict = None) -> None:
+        '''
+        Initializes an :class:`Element` instance.
+
+        :param type: The type of the element, one of the keys of :data:`ELEMENT_TYPES`.
+        :type type: str
+
+        :param row: The row number of the element within the grid.
+        :type row: int
+
+        :param col: The column number of the element within the grid.
+        :type col: int
+
+        :param orientation: The orientation index of the element.
+        :type orientation: int
+
+        :param params: The parameters of the element, if any.
+        :type params: dict
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        assert type in ELEMENT_TYPES, f"Unknown element type {type}"
+
+        self.type = type
+        self.row = row
+        self.col = col
+        self.orientation = orientation % ORIENTATIONS
+        self.params = dict(params) if params else {}
+
+
+    def __repr__(self) -> str:
+        return f"{self.type}({self.row},{self.col})"
+
+
+    def rotate(self) -> None:
+        '''
+        Rotates the element to its next orientation.
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.orientation = (self.orientation + 1) % ORIENTATIONS
+
+
+    def get_next_orient(self, orientation: int) -> list:
+        '''
+        Returns the directions in which light leaves the element, given the direction in which it travels when it enters.
+
+        :param orientation: The direction of travel of the incoming light.
+        :type orientation: int
+
+        :return: Returns a list of outgoing directions. Beam splitters return the transmitted direction first.
+        :rtype: list
+        '''
+        reflected_orientation = (orientation + pow(-1, (self.orientation&1)+(orientation&1)) + 4) % 4
+
+        if self.type in ("Laser", "SPDC"):
+            return [orientation] if self.orientation == orientation else []
+        elif self.type in ("BeamSplitter", "PolarBeamSplitter"):
+            return [orientation, reflected_orientation]
+        elif self.type in ("HWP", "QWP", "Polarizer", "Rotator", "TimeDelay", "PhaseDelay", "Dephaser", "Depolarizer", "NDF", "PhaseRetarder"):
+            return [orientation]
+        elif self.type == "Mirror":
+            return [reflected_orientation]
+        elif self.type == "Block":
+            return self.params["block"].get_next_orient(orientation, self.orientation)
+        else:
+            return []
+
+
+
+
 class State():
     '''
     
@@ -71,244 +424,2463 @@ class State():
         return cls(state_vector)
 
 
+    def apply_kernel(self, kernel: np.ndarray, modes: list) -> None:
+        '''
+        Applies a small local kernel in place on the amplitudes of the given path modes.
+
+        Only the entries of the state vector listed in ``modes`` are read and written, so the cost
+        of applying an element depends on the number of modes it touches rather than on the dimension of the state.
+
+        :param kernel: A square matrix of size ``len(modes)`` acting on the touched modes.
+        :type kernel: numpy.ndarray
+
+        :param modes: The labels of the path modes touched by the kernel, in the same order as the kernel's rows and columns.
+        :type modes: list
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.state_vector[modes] = np.dot(kernel, self.state_vector[modes])
+
+
+    def get_probabilities(self) -> np.ndarray:
+        '''
+        Returns the probability of finding the photon in each path mode.
+
+        :return: Returns the squared magnitudes of the amplitudes, with the same shape as the state vector.
+        :rtype: numpy.ndarray
+        '''
+        return np.abs(self.state_vector)**2
+
+
     @classmethod
     def from_path_modes(cls, dimension):
         
-        state_vector = np.zeros(dimension)
+        state_vector = np.zeros(dimension, dtype=complex)
         state_vector[0] = 1
         return cls(state_vector, dimension=dimension)
         
 
 
-class Operation():
+class StateBatch(State):
+    '''
+    A batch of K quantum states over the same N path modes, stored as the rows of a K x N array.
 
-    def __init__(self, dimension):
+    Every element kernel is applied to all K states at once, so propagating the batch costs a single pass through the circuit.
+
+    Inherits from :class:`State`.
+    '''
+    def get_dimension(self) -> int:
+
+        return self.state_vector.shape[1]
+
+
+    def get_batch_size(self) -> int:
+
+        return self.state_vector.shape[0]
+
+
+    def __len__(self) -> int:
+        return self.get_batch_size()
+
+
+    def __getitem__(self, index: int) -> State:
+        return State.from_state_vector(self.state_vector[index])
+
+
+    def __str__(self):
+        return f"StateBatch({self.state_vector})"
+
+
+    def apply_kernel(self, kernel: np.ndarray, modes: list) -> None:
+        '''
+        Applies a small local kernel in place on the amplitudes of the given path modes, for every state of the batch.
+
+        :param kernel: A square matrix of size ``len(modes)`` acting on the touched modes of all states, or a K x k x k stack
+            holding a separate kernel for every state (e.g. for a parameter sweep).
+        :type kernel: numpy.ndarray
+
+        :param modes: The labels of the path modes touched by the kernel, in the same order as the kernel's rows and columns.
+        :type modes: list
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        if kernel.ndim == 2:
+            self.state_vector[:, modes] = np.dot(self.state_vector[:, modes], kernel.T)
+        else:
+            self.state_vector[:, modes] = np.einsum('bij,bj->bi', kernel, self.state_vector[:, modes])
+
+
+    @classmethod
+    def from_path_modes(cls, dimension: int, modes: list) -> "StateBatch":
+        '''
+        Creates a batch holding one single-photon state for each of the given path modes.
+
+        :param dimension: The number of path modes.
+        :type dimension: int
+
+        :param modes: The path mode of the photon in each state of the batch.
+        :type modes: list
+
+        :return: Returns a batch of ``len(modes)`` states.
+        :rtype: StateBatch
+        '''
+        state_vectors = np.zeros((len(modes), dimension), dtype=complex)
+        state_vectors[np.arange(len(modes)), modes] = 1
+        return cls(state_vectors)
         
-        self.matrix = np.identity(dimension, dtype=complex)
-        self.dimension = dimension
 
 
-    def apply_operation_on_state(self, in_state: State) -> State:
+class PolarizedState(State):
+    '''
+    A single-photon state carrying a horizontal and a vertical polarization amplitude for every path mode, stored as an N x 2 array.
 
-        in_state_vector = in_state.get_state_vector()
+    Path kernels act on the first axis and polarization kernels on the second, so the full 2N x 2N Kronecker product of the
+    path and polarization operations is never formed.
+
+    Inherits from :class:`State`.
+    '''
+    def get_dimension(self) -> int:
 
-        out_state_vector = np.dot(self.matrix, in_state_vector)
+        return self.state_vector.shape[0]
 
-        return State.from_state_vector(out_state_vector)
 
-    def cascade_operation(self, other_operation) -> None:
+    def apply_kernel(self, kernel: np.ndarray, modes: list) -> None:
+        '''
+        Applies a path kernel in place on the given path modes.
 
-        self.matrix = np.dot(self.matrix, other_operation.matrix)
+        A k x k kernel acts the same way on both polarizations, while a 2 x k x k array holds a separate kernel for the horizontal
+        and the vertical polarization (e.g. :func:`polarizing_beam_splitter_kernel`).
 
+        :param kernel: The path kernel, of shape (k, k) or (2, k, k) for k touched modes.
+        :type kernel: numpy.ndarray
 
-    def modify_to_beam_splitter(self, in1, in2, out1, out2) -> None:
+        :param modes: The labels of the touched path modes, in the same order as the kernel's rows and columns.
+        :type modes: list
 
-        assert (in1 < self.dimension) and (in2 < self.dimension) and \
-            (out1 < self.dimension) and (out2 < self.dimension), "locations must be within the dimension limits"
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        if kernel.ndim == 2:
+            self.state_vector[modes] = np.dot(kernel, self.state_vector[modes])
+        else:
+            self.state_vector[modes] = np.einsum('pij,jp->ip', kernel, self.state_vector[modes])
 
-        # replace target columns with zero column
-        self.matrix[:, in1] = 0
-        self.matrix[:, in2] = 0
 
-        # enter the values of beam splitter operation
-        self.matrix[out1, in1] = 1/np.sqrt(2)
-        self.matrix[out1, in2] = 1j/np.sqrt(2)
-        self.matrix[out2, in1] = 1j/np.sqrt(2)
-        self.matrix[out2, in2] = 1/np.sqrt(2)
+    def apply_jones(self, jones: np.ndarray, modes: list) -> None:
+        '''
+        Applies a Jones matrix in place on the polarization of every given path mode.
+
+        :param jones: A 2x2 matrix acting on the (horizontal, vertical) amplitudes.
+        :type jones: numpy.ndarray
+
+        :param modes: The labels of the path modes passing through the polarizing element.
+        :type modes: list
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.state_vector[modes] = np.dot(self.state_vector[modes], jones.T)
+
+
+    @classmethod
+    def from_path_modes(cls, dimension: int, polarization: tuple = (1, 0)) -> "PolarizedState":
+        '''
+        Creates the state of a single photon in the path mode 0 with a given polarization.
+
+        :param dimension: The number of path modes.
+        :type dimension: int
+
+        :param polarization: The normalized (horizontal, vertical) amplitudes of the photon.
+        :type polarization: tuple
+
+        :return: Returns the new state.
+        :rtype: PolarizedState
+        '''
+        state_vector = np.zeros((dimension, 2), dtype=complex)
+        state_vector[0] = polarization
+        return cls(state_vector)
+
+
+
+class PolarizedStateBatch(PolarizedState):
+    '''
+    A batch of K polarized single-photon states over the same N path modes, stored as a K x N x 2 array.
+
+    Every kernel is applied to all K states at once, either the same kernel for all states or a stack holding one kernel per state.
+
+    Inherits from :class:`PolarizedState`.
+    '''
+    def get_dimension(self) -> int:
+
+        return self.state_vector.shape[1]
+
+
+    def get_batch_size(self) -> int:
+
+        return self.state_vector.shape[0]
+
+
+    def __len__(self) -> int:
+        return self.get_batch_size()
+
+
+    def __getitem__(self, index: int) -> PolarizedState:
+        return PolarizedState.from_state_vector(self.state_vector[index])
+
+
+    def apply_kernel(self, kernel: np.ndarray, modes: list) -> None:
+        '''
+        Applies a path kernel in place on the given path modes, for every state of the batch.
+
+        :param kernel: The path kernel, of shape (k, k) or (2, k, k) as in :meth:`PolarizedState.apply_kernel`, or a K x 2 x k x k
+            stack holding a separate kernel for every state and polarization.
+        :type kernel: numpy.ndarray
+
+        :param modes: The labels of the touched path modes, in the same order as the kernel's rows and columns.
+        :type modes: list
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        if kernel.ndim == 2:
+            self.state_vector[:, modes] = np.einsum('ij,bjp->bip', kernel, self.state_vector[:, modes])
+        elif kernel.ndim == 3:
+            self.state_vector[:, modes] = np.einsum('pij,bjp->bip', kernel, self.state_vector[:, modes])
+        else:
+            self.state_vector[:, modes] = np.einsum('bpij,bjp->bip', kernel, self.state_vector[:, modes])
+
+
+    def apply_jones(self, jones: np.ndarray, modes: list) -> None:
+        '''
+        Applies a Jones matrix in place on the polarization of every given path mode, for every state of the batch.
+
+        :param jones: A 2x2 matrix acting on the (horizontal, vertical) amplitudes of all states, or a K x 2 x 2 stack holding a
+            separate matrix for every state.
+        :type jones: numpy.ndarray
+
+        :param modes: The labels of the path modes passing through the polarizing element.
+        :type modes: list
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        if jones.ndim == 2:
+            self.state_vector[:, modes] = np.dot(self.state_vector[:, modes], jones.T)
+        else:
+            self.state_vector[:, modes] = np.einsum('bpq,bmq->bmp', jones, self.state_vector[:, modes])
+
+
+    @classmethod
+    def from_path_modes(cls, dimension: int, batch_size: int, polarization: tuple = (1, 0)) -> "PolarizedStateBatch":
+        '''
+        Creates a batch of identical states of a single photon in the path mode 0 with a given polarization.
+
+        :param dimension: The number of path modes.
+        :type dimension: int
+
+        :param batch_size: The number of states.
+        :type batch_size: int
+
+        :param polarization: The normalized (horizontal, vertical) amplitudes of the photon.
+        :type polarization: tuple
+
+        :return: Returns the new batch.
+        :rtype: PolarizedStateBatch
+        '''
+        state_vector = np.zeros((batch_size, dimension, 2), dtype=complex)
+        state_vector[:, 0] = polarization
+        return cls(state_vector)
+
+
+
+class DensityMatrix():
+    '''
+    A mixed single-photon state over path and polarization, stored as a 2N x 2N density matrix.
+
+    The amplitude of the path mode ``m`` with the polarization ``p`` (0: horizontal, 1: vertical) has the index ``2m + p``.
+    Elements are applied in place on the rows and columns of the modes they touch, as ``U rho U^dagger`` for a local kernel U,
+    at a cost of O(N) per element, so that no N^2 x N^2 superoperator is ever formed and the memory stays O(N^2).
+
+    :ivar density_matrix: The 2N x 2N density matrix.
+    :vartype density_matrix: numpy.ndarray
+    '''
+
+    def __init__(self, density_matrix: np.ndarray) -> None:
+        '''
+        Initializes a :class:`DensityMatrix` instance.
+
+        :param density_matrix: The 2N x 2N density matrix.
+        :type density_matrix: numpy.ndarray
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        assert density_matrix.shape[0] == density_matrix.shape[1] and density_matrix.shape[0] % 2 == 0, \
+            "Expected a square matrix with a horizontal and a vertical polarization for every path mode"
+
+        self.density_matrix = np.array(density_matrix, dtype=complex)
 
 
     def __str__(self):
-        return f"Operation(\n{self.matrix}\n)"
+        return f"DensityMatrix(\n{self.density_matrix}\n)"
 
-        
 
+    @classmethod
+    def from_path_modes(cls, dimension: int, polarization: tuple = (1, 0)) -> "DensityMatrix":
+        '''
+        Creates the pure state of a single photon in the path mode 0 with a given polarization.
 
-class Graph(nx.MultiDiGraph):
+        :param dimension: The number of path modes.
+        :type dimension: int
 
-    def __init__(self,):
-        super().__init__()
+        :param polarization: The normalized (horizontal, vertical) amplitudes of the photon.
+        :type polarization: tuple
 
-        # default dictionary for counting elements for each type
-        self.counts = defaultdict(int)
+        :return: Returns the new state.
+        :rtype: DensityMatrix
+        '''
+        density_matrix = np.zeros((2 * dimension, 2 * dimension), dtype=complex)
+        density_matrix[:2, :2] = np.outer(polarization, np.conj(polarization))
+        return cls(density_matrix)
 
-        # default dictionary to store elements of each type
-        self.elements = defaultdict(list)
 
-        # initialize variables
-        self.path_modes_count = 0
+    def get_dimension(self) -> int:
 
+        return self.density_matrix.shape[0] // 2
 
 
-    def add_element(self, element: GridItem) -> str:
+    def get_density_matrix(self) -> np.ndarray:
 
-        # assign an ID to the element
-        id = element.__class__.__name__ + f"({element.row},{element.col})"
-        
-        # increase the counts of elements of this class
-        self.counts[element.__class__] += 1
+        return self.density_matrix
 
-        # append the element to the list
-        self.elements[element.__class__].append({
-            'element':element,
-            'id': id
-        })
 
-        # add node with the id of the element
-        self.add_node(id,
-                      pos=(element.col, element.row),
-                      element=element)
+    def get_trace(self) -> float:
 
-        # return the element's id
-        return id
+        return float(np.real(np.trace(self.density_matrix)))
 
 
+    def get_purity(self) -> float:
+        '''
+        Returns the purity ``tr(rho^2)`` of the state, which is 1 for a pure state.
 
-    def add_connection(self, from_element: GridItem, to_element: GridItem) -> None:
+        :return: Returns the purity.
+        :rtype: float
+        '''
+        return float(np.real(np.vdot(self.density_matrix.conj().T, self.density_matrix)))
 
-        # add the two elements to the graph and get their ids
-        from_id = self.add_element(from_element)
-        to_id   = self.add_element(to_element)
 
-        # Calculate the distance between both elements
-        weight = abs(from_element.row - to_element.row) + abs(from_element.col - to_element.col)
+    def get_probabilities(self) -> np.ndarray:
+        '''
+        Returns the probability of finding the photon in every path mode with every polarization.
 
-        # add an edge between the two ids
-        self.add_edge(from_id, to_id,
-                      weight=weight,
-                      label="",
-                      state = None)
+        :return: Returns an N x 2 array of probabilities.
+        :rtype: numpy.ndarray
+        '''
+        return np.real(np.diag(self.density_matrix)).reshape(-1, 2)
 
 
+    def get_indices(self, modes: list) -> np.ndarray:
+        '''
+        Returns the indices of the horizontal and vertical amplitudes of the given path modes.
 
-    def __visualize_graph(self) -> None:
+        :param modes: The path modes.
+        :type modes: list
 
-        # extract positioning of nodes
-        pos = {
-            node:self.nodes[node]['pos'] for node in self.nodes
-        }
+        :return: Returns the indices, ordered by path mode and then by polarization.
+        :rtype: numpy.ndarray
+        '''
+        return (2 * np.asarray(modes)[:, None] + np.arange(2)).ravel()
 
-        # labeling edges
-        edge_labels = {(u, v): f'{data["weight"]}, |{data["label"]}>' for u, v, data in self.edges(data=True)}
 
-        # draw the graph
-        nx.draw(self, pos, with_labels=True, arrows=True)
-        nx.draw_networkx_edge_labels(self, pos, edge_labels=edge_labels, font_color='red', font_size=12)
-        plt.show()
+    def apply_unitary(self, unitary: np.ndarray, indices: np.ndarray) -> None:
+        '''
+        Applies a local operator U in place as ``U rho U^dagger``, reading and writing only the touched rows and columns.
 
+        :param unitary: A square matrix acting on the touched indices.
+        :type unitary: numpy.ndarray
 
-    def __label_paths_temp(self):
+        :param indices: The indices of the touched amplitudes, in the same order as the matrix's rows and columns.
+        :type indices: numpy.ndarray
 
-        # HACK: Assuming a single laser device
-        start_id = self.elements[Laser][0]['id']
-        
-        # get a list of edges using bfs
-        bfs_edges = list(nx.edge_bfs(self, source=start_id))
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.density_matrix[indices, :] = np.dot(unitary, self.density_matrix[indices, :])
+        self.density_matrix[:, indices] = np.dot(self.density_matrix[:, indices], unitary.conj().T)
 
-        # dictionary to hold the in_labels of all nodes
-        in_labels = {start_id:[0]}
 
+    def apply_kernel(self, kernel: np.ndarray, modes: list) -> None:
+        '''
+        Applies a path kernel in place on the given path modes.
 
-        last_id = start_id
-        for i in range(len(bfs_edges)):
+        A k x k kernel acts the same way on both polarizations, while a 2 x k x k array holds a separate kernel for the horizontal
+        and the vertical polarization, as in :meth:`PolarizedState.apply_kernel`.
 
-            # terminal nodes of the current edge
-            start_id = bfs_edges[i][0]
-            end_id   = bfs_edges[i][1]
+        :param kernel: The path kernel, of shape (k, k) or (2, k, k) for k touched modes.
+        :type kernel: numpy.ndarray
 
-            # case 1: a node with two labeled inputs
-            
+        :param modes: The labels of the touched path modes, in the same order as the kernel's rows and columns.
+        :type modes: list
 
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        if kernel.ndim == 2:
+            unitary = np.kron(kernel, np.eye(2))
+        else:
+            unitary = np.kron(kernel[0], np.diag([1, 0])) + np.kron(kernel[1], np.diag([0, 1]))
 
+        self.apply_unitary(unitary, self.get_indices(modes))
 
 
+    def apply_jones(self, jones: np.ndarray, modes: list) -> None:
+        '''
+        Applies a Jones matrix in place on the polarization of every given path mode.
 
-    def __label_paths(self):
+        :param jones: A 2x2 matrix acting on the (horizontal, vertical) amplitudes.
+        :type jones: numpy.ndarray
 
-        # HACK: Assumming single laser device
-        start_id = self.elements[Laser][0]['id']
+        :param modes: The labels of the path modes passing through the polarizing element.
+        :type modes: list
 
-        # get the DFS edges
-        # HACK: Loops are not completely labeled
-        # TODO: change the way you get the edges
-        dfs_edges = list(nx.dfs_edges(self, source=start_id))
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.apply_unitary(np.kron(np.eye(len(modes)), jones), self.get_indices(modes))
 
-        # assign a label to every DFS edge
-        label = 0
-        for i in range(len(dfs_edges)):
-            
-            if (i == 0) or (dfs_edges[i-1][1] == dfs_edges[i][0]):
-                pass
-            else:
-                label+=1
-            self[dfs_edges[i][0]][dfs_edges[i][1]][0]['label'] = label
-        
-        # store the number of path modes
-        self.path_modes_count = label + 1
 
-    
+    def apply_channel(self, unitaries: np.ndarray, probabilities: np.ndarray, modes: list) -> None:
+        '''
+        Applies a channel in place, given as a mixture of local unitaries on the polarization of the given path modes.
 
-    def calculate_results(self, visualize=False) -> np.array:
+        The Kraus operators ``sqrt(p_k) (U_k + identity elsewhere)`` map the block of the touched modes to the mixture
+        ``sum p_k U_k rho U_k^dagger`` and their coherences with the other modes to ``(sum p_k U_k) rho``, so only the touched rows
+        and columns are read and written.
 
-        # set labels for paths before starting
-        self.__label_paths()
+        :param unitaries: A K x 2 x 2 array of unitaries acting on the polarization of every touched mode, as returned by :func:`channel_operators`.
+        :type unitaries: numpy.ndarray
 
-        # HACK: start with an initial state for the path qubit only
-        state = State.from_path_modes(self.path_modes_count)
+        :param probabilities: The probability of every unitary.
+        :type probabilities: numpy.ndarray
 
-        # Optional: Visualize Graph
-        if visualize:
-            self.__visualize_graph()
+        :param modes: The labels of the path modes passing through the channel.
+        :type modes: list
 
-        # start with a node group of all lasers
-        node_group = []
-        for laser in self.elements[Laser]:
-            node_group.append(laser['id'])
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        for mode in modes:
+            indices = self.get_indices([mode])
+            block = self.density_matrix[np.ix_(indices, indices)]
 
+            # coherences with all other modes, then the block of the mode itself
+            average = np.einsum('k,kij->ij', probabilities, unitaries)
+            self.density_matrix[indices, :] = np.dot(average, self.density_matrix[indices, :])
+            self.density_matrix[:, indices] = np.dot(self.density_matrix[:, indices], average.conj().T)
+            self.density_matrix[np.ix_(indices, indices)] = np.einsum('k,kij,jl,kml->im', probabilities, unitaries, block, unitaries.conj())
 
-        while node_group:
 
-            # start an empty new node group
-            next_node_group = []
 
-            # operation
-            operation = Operation(self.path_modes_count)
+class SparseState():
+    '''
+    A state of a fixed number of photons over many path modes, stored as a hash map from occupation patterns to amplitudes.
 
-            # iterate over each node
-            for node in node_group:
-                
-                # HACK: only considering the beam splitter for now
-                if self.nodes[node]['element'].__class__ == BeamSplitter:
+    Only the occupation patterns with a non-negligible amplitude are stored, instead of the binomial(N + n - 1, n) entries of a
+    dense Fock vector. Every pattern is encoded as a single integer key, holding the photon count of mode m as the m-th digit in
+    base n + 1. Applying a kernel rewrites only the entries holding photons in the kernel's modes, and discards the amplitudes
+    that fall below the truncation threshold.
 
-                    # get the input labels
-                    in_edges = self.in_edges(node, data=True)
-                    in_labels = [data['label'] for source, target, data in in_edges]
+    :ivar modes_count: The number of path modes N.
+    :vartype modes_count: int
 
-                    # get the output labels
-                    out_edges = self.out_edges(node, data=True)
-                    out_labels = [data['label'] for source, target, data in out_edges]
+    :ivar photons_count: The number of photons n.
+    :vartype photons_count: int
 
-                    # apply the operation of the beam splitter
-                    # HACK: Working on a special case were the input labels are the same as the output labels
-                    beam_splitter_operation = Operation(self.path_modes_count)
-                    beam_splitter_operation.modify_to_beam_splitter(
-                            in1=out_labels[0], 
-                            in2=out_labels[1], 
-                            out1=out_labels[0], 
-                            out2=out_labels[1], 
-                            )
-                    operation.cascade_operation(beam_splitter_operation)
+    :ivar amplitudes: The amplitudes of the stored patterns, keyed by their encoded occupation.
+    :vartype amplitudes: dict
 
-                # create the next node group
-                for _, next_node, edge_data in self.out_edges(node, data=True):
-                    next_node_group.append(next_node)
+    :ivar threshold: Amplitudes with a smaller magnitude are discarded after every kernel.
+    :vartype threshold: float
 
-            state = operation.apply_operation_on_state(state)
+    :ivar truncated_probability: The total probability discarded by truncation so far.
+    :vartype truncated_probability: float
+    '''
 
+    def __init__(self, modes_count: int, photons_count: int, amplitudes: dict = None, threshold: float = SPARSE_TRUNCATION_THRESHOLD) -> None:
+        '''
+        Initializes a :class:`SparseState` instance.
 
-            node_group = next_node_group
-        
-        
-        return state.get_state_vector()
-        
-        
-        
\ No newline at end of file
+        :param modes_count: The number of path modes.
+        :type modes_count: int
+
+        :param photons_count: The number of photons.
+        :type photons_count: int
+
+        :param amplitudes: The initial amplitudes, keyed by occupation tuples of length ``modes_count``.
+        :type amplitudes: dict
+
+        :param threshold: Amplitudes with a smaller magnitude are discarded after every kernel.
+        :type threshold: float
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.modes_count = modes_count
+        self.photons_count = photons_count
+        self.threshold = threshold
+        self.truncated_probability = 0.0
+
+        # place value of every mode in the integer keys
+        self.base = photons_count + 1
+        self.place_values = [self.base ** mode for mode in range(modes_count)]
+
+        self.amplitudes = {}
+        for occupation, amplitude in (amplitudes or {}).items():
+            assert len(occupation) == modes_count, f"Expected an occupation of {modes_count} modes, got {len(occupation)}"
+            assert sum(occupation) == photons_count, f"Expected {photons_count} photons, got {sum(occupation)}"
+            self.amplitudes[self.encode(occupation)] = complex(amplitude)
+
+
+    def __str__(self):
+        return f"SparseState({self.get_amplitudes()})"
+
+
+    def __len__(self) -> int:
+
+        return len(self.amplitudes)
+
+
+    @classmethod
+    def from_occupation(cls, occupation: tuple, threshold: float = SPARSE_TRUNCATION_THRESHOLD) -> "SparseState":
+        '''
+        Creates the state holding a single occupation pattern.
+
+        :param occupation: The number of photons in every path mode.
+        :type occupation: tuple
+
+        :param threshold: Amplitudes with a smaller magnitude are discarded after every kernel.
+        :type threshold: float
+
+        :return: Returns the new state.
+        :rtype: SparseState
+        '''
+        occupation = tuple(int(count) for count in occupation)
+        return cls(len(occupation), sum(occupation), {occupation: 1}, threshold)
+
+
+    def encode(self, occupation: tuple) -> int:
+        '''
+        Encodes an occupation pattern as an integer key.
+
+        :param occupation: The number of photons in every path mode.
+        :type occupation: tuple
+
+        :return: Returns the key of the pattern.
+        :rtype: int
+        '''
+        return sum(count * place_value for count, place_value in zip(occupation, self.place_values))
+
+
+    def decode(self, key: int) -> tuple:
+        '''
+        Decodes an integer key into its occupation pattern.
+
+        :param key: The key of the pattern.
+        :type key: int
+
+        :return: Returns the number of photons in every path mode.
+        :rtype: tuple
+        '''
+        occupation = []
+        for _ in range(self.modes_count):
+            key, count = divmod(key, self.base)
+            occupation.append(count)
+
+        return tuple(occupation)
+
+
+    def get_amplitudes(self) -> dict:
+        '''
+        Returns the stored amplitudes, keyed by their occupation patterns.
+
+        :return: Returns a dictionary mapping occupation tuples to amplitudes.
+        :rtype: dict
+        '''
+        return {self.decode(key): amplitude for key, amplitude in self.amplitudes.items()}
+
+
+    def get_norm(self) -> float:
+        '''
+        Returns the total probability held by the stored amplitudes.
+
+        :return: Returns the sum of the squared magnitudes of the amplitudes.
+        :rtype: float
+        '''
+        return sum(abs(amplitude) ** 2 for amplitude in self.amplitudes.values())
+
+
+    def apply_kernel(self, kernel: np.ndarray, modes: list) -> None:
+        '''
+        Applies a small local kernel in place on the photons in the given path modes.
+
+        The kernel maps the creation operator of every touched mode to a superposition of the creation operators of the touched modes,
+        as it maps single-photon amplitudes in :meth:`State.apply_kernel`. Entries holding no photons in the touched modes are left as they are,
+        and the transform of every local occupation of the touched modes is computed once per call.
+
+        :param kernel: A square matrix of size ``len(modes)`` acting on the touched modes.
+        :type kernel: numpy.ndarray
+
+        :param modes: The labels of the path modes touched by the kernel, in the same order as the kernel's rows and columns.
+        :type modes: list
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        place_values = [self.place_values[mode] for mode in modes]
+        transforms = {}
+
+        amplitudes = defaultdict(complex)
+        for key, amplitude in self.amplitudes.items():
+
+            # photon counts of the touched modes
+            local = tuple((key // place_value) % self.base for place_value in place_values)
+            if not any(local):
+                amplitudes[key] += amplitude
+                continue
+
+            if local not in transforms:
+                transforms[local] = self.__local_transform(kernel, local)
+
+            # remove the touched modes from the key, then add every transformed local occupation
+            rest = key - sum(count * place_value for count, place_value in zip(local, place_values))
+            for local_out, coefficient in transforms[local]:
+                amplitudes[rest + sum(count * place_value for count, place_value in zip(local_out, place_values))] += coefficient * amplitude
+
+        # discard the negligible amplitudes
+        self.amplitudes = {}
+        for key, amplitude in amplitudes.items():
+            if abs(amplitude) >= self.threshold:
+                self.amplitudes[key] = amplitude
+            else:
+                self.truncated_probability += abs(amplitude) ** 2
+
+
+    def __local_transform(self, kernel: np.ndarray, local: tuple) -> list:
+        '''
+        This is an auxiliary method and is inteded for internal use only.
+
+        Expands the product of the transformed creation operators of a local occupation of the touched modes.
+
+        :param kernel: A square matrix acting on the touched modes.
+        :type kernel: numpy.ndarray
+
+        :param local: The number of photons in every touched mode.
+        :type local: tuple
+
+        :return: Returns a list of (local output occupation, amplitude) tuples.
+        :rtype: list
+        '''
+        size = len(local)
+
+        # polynomial in the output creation operators, keyed by the exponent of every operator
+        polynomial = {(0,) * size: 1 + 0j}
+        for mode, count in enumerate(local):
+            for _ in range(count):
+                product = defaultdict(complex)
+                for exponents, coefficient in polynomial.items():
+                    for out_mode in range(size):
+                        if kernel[out_mode, mode] != 0:
+                            raised = exponents[:out_mode] + (exponents[out_mode] + 1,) + exponents[out_mode + 1:]
+                            product[raised] += coefficient * kernel[out_mode, mode]
+                polynomial = product
+
+        # normalize the input and output Fock states
+        input_norm = sqrt(np.prod([factorial(count) for count in local], dtype=float))
+        return [(exponents, coefficient * sqrt(np.prod([factorial(count) for count in exponents], dtype=float)) / input_norm)
+                for exponents, coefficient in polynomial.items()]
+
+
+
+class TimeBinState():
+    '''
+    A single-photon state resolved in time, holding the amplitude of every path mode in every time bin in which it arrives.
+
+    Time is counted in grid cells of travel, so a time bin is the time light takes to cross one cell. Amplitudes in different
+    time bins of the same path mode are kept apart and never interfere, and only the (mode, time) pairs actually reached are stored.
+
+    :ivar modes_count: The number of path modes.
+    :vartype modes_count: int
+
+    :ivar amplitudes: The amplitudes, keyed by (path mode, time bin).
+    :vartype amplitudes: dict
+
+    :ivar truncated_probability: The probability discarded with negligible amplitudes or left after the last simulated time bin.
+    :vartype truncated_probability: float
+    '''
+
+    def __init__(self, modes_count: int, amplitudes: dict = None) -> None:
+        '''
+        Initializes a :class:`TimeBinState` instance.
+
+        :param modes_count: The number of path modes.
+        :type modes_count: int
+
+        :param amplitudes: The amplitudes, keyed by (path mode, time bin). Defaults to no amplitudes.
+        :type amplitudes: dict
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.modes_count = modes_count
+        self.amplitudes = dict(amplitudes) if amplitudes else {}
+        self.truncated_probability = 0.0
+
+
+    def __str__(self):
+        return f"TimeBinState({self.amplitudes})"
+
+
+    def __len__(self) -> int:
+
+        return len(self.amplitudes)
+
+
+    def get_amplitudes(self) -> dict:
+        '''
+        Returns the amplitudes of the state.
+
+        :return: Returns a dictionary mapping (path mode, time bin) pairs to their amplitudes.
+        :rtype: dict
+        '''
+        return dict(self.amplitudes)
+
+
+    def get_times(self) -> np.ndarray:
+        '''
+        Returns the time bins holding any amplitude.
+
+        :return: Returns a sorted array of time bins.
+        :rtype: numpy.ndarray
+        '''
+        return np.unique(np.array([time for _, time in self.amplitudes], dtype=np.int64))
+
+
+    def get_norm(self) -> float:
+
+        return sqrt(sum(abs(amplitude) ** 2 for amplitude in self.amplitudes.values()))
+
+
+    def get_probabilities(self) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Returns the probability of finding the photon in every path mode and time bin.
+
+        :return: Returns a tuple of the time bins, as returned by :meth:`get_times`, and an N x T array of probabilities.
+        :rtype: tuple[numpy.ndarray, numpy.ndarray]
+        '''
+        times = self.get_times()
+        probabilities = np.zeros((self.modes_count, len(times)))
+        for (mode, time), amplitude in self.amplitudes.items():
+            probabilities[mode, np.searchsorted(times, time)] += abs(amplitude) ** 2
+
+        return times, probabilities
+
+
+
+class Operation():
+
+    def __init__(self, dimension):
+        
+        self.matrix = np.identity(dimension, dtype=complex)
+        self.dimension = dimension
+
+
+    def apply_operation_on_state(self, in_state: State) -> State:
+
+        in_state_vector = in_state.get_state_vector()
+
+        # the rows of a batch are transformed independently
+        out_state_vector = np.dot(self.matrix, in_state_vector.T).T
+
+        return in_state.__class__.from_state_vector(out_state_vector)
+
+    def cascade_operation(self, other_operation) -> None:
+
+        self.matrix = np.dot(self.matrix, other_operation.matrix)
+
+
+    def apply_kernel(self, kernel: np.ndarray, modes: list) -> None:
+        '''
+        Applies a small local kernel after the operation, in place.
+
+        Only the rows of the matrix listed in ``modes`` are read and written, so the cost is O(N) per kernel
+        instead of the O(N^3) of cascading a dense operation.
+
+        :param kernel: A square matrix of size ``len(modes)`` acting on the touched modes.
+        :type kernel: numpy.ndarray
+
+        :param modes: The labels of the path modes touched by the kernel, in the same order as the kernel's rows and columns.
+        :type modes: list
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.matrix[modes, :] = np.dot(kernel, self.matrix[modes, :])
+
+
+    def modify_to_beam_splitter(self, in1, in2, out1, out2, reflectivity=BEAM_SPLITTER_REFLECTIVITY) -> None:
+
+        assert (in1 < self.dimension) and (in2 < self.dimension) and \
+            (out1 < self.dimension) and (out2 < self.dimension), "locations must be within the dimension limits"
+
+        # replace target columns with zero column
+        self.matrix[:, in1] = 0
+        self.matrix[:, in2] = 0
+
+        # enter the values of beam splitter operation
+        kernel = beam_splitter_kernel(reflectivity)
+        self.matrix[out1, in1] = kernel[0, 0]
+        self.matrix[out1, in2] = kernel[0, 1]
+        self.matrix[out2, in1] = kernel[1, 0]
+        self.matrix[out2, in2] = kernel[1, 1]
+
+
+    def __str__(self):
+        return f"Operation(\n{self.matrix}\n)"
+
+        
+
+
+class LRUCache():
+    '''
+    A bounded cache that discards the least recently used entry once it is full.
+
+    :ivar max_size: The maximum number of entries kept in the cache.
+    :vartype max_size: int
+    '''
+    def __init__(self, max_size: int) -> None:
+
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+
+    def get(self, key):
+        '''
+        Returns the value stored for a given key and marks it as recently used.
+
+        :param key: The key of the entry.
+        :type key: Hashable
+
+        :return: Returns the stored value, or :literal:`None` if the key is not cached.
+        :rtype: Any
+        '''
+        if key not in self.entries:
+            return None
+
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+
+    def put(self, key, value) -> None:
+        '''
+        Stores a value for a given key, discarding the least recently used entry if the cache is full.
+
+        :param key: The key of the entry.
+        :type key: Hashable
+
+        :param value: The value to be stored.
+        :type value: Any
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+    def clear(self) -> None:
+
+        self.entries.clear()
+
+
+    def __contains__(self, key) -> bool:
+        return key in self.entries
+
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+        
+
+
+class Circuit():
+    '''
+    A compiled, integer-indexed representation of a :class:`Graph`.
+
+    Nodes are numbered from 0 to V-1 in the order they were added to the graph and edges from 0 to E-1 in the order they were connected.
+    The adjacency is stored in compressed sparse row (CSR) form: the outgoing edges of node ``v`` are
+    ``out_index[out_ptr[v]:out_ptr[v+1]]`` and its incoming edges are ``in_index[in_ptr[v]:in_ptr[v+1]]``.
+    The simulation engine reads only these arrays.
+
+    :ivar node_types: The element type code of every node (see :data:`ELEMENT_TYPES`).
+    :vartype node_types: numpy.ndarray
+
+    :ivar node_positions: The (column, row) position of every node.
+    :vartype node_positions: numpy.ndarray
+
+    :ivar node_params: The parameters of every node.
+    :vartype node_params: list
+
+    :ivar node_orientations: The orientation index of every node.
+    :vartype node_orientations: numpy.ndarray
+
+    :ivar edge_sources: The source node of every edge.
+    :vartype edge_sources: numpy.ndarray
+
+    :ivar edge_targets: The target node of every edge.
+    :vartype edge_targets: numpy.ndarray
+
+    :ivar edge_weights: The grid distance covered by every edge.
+    :vartype edge_weights: numpy.ndarray
+
+    :ivar edge_orientations: The orientation of travel along every edge.
+    :vartype edge_orientations: numpy.ndarray
+
+    :ivar edge_labels: The path mode label carried by every edge.
+    :vartype edge_labels: numpy.ndarray
+
+    :ivar order: All nodes in topological order, layer after layer.
+    :vartype order: numpy.ndarray
+
+    :ivar layer_ptr: The layer ``i`` is ``order[layer_ptr[i]:layer_ptr[i+1]]``.
+    :vartype layer_ptr: numpy.ndarray
+
+    :ivar acyclic: :literal:`True` if every node could be scheduled in a topological layer.
+    :vartype acyclic: bool
+
+    :ivar path_modes_count: The number of path modes of the circuit.
+    :vartype path_modes_count: int
+    '''
+    def __init__(self, node_types: np.ndarray, node_positions: np.ndarray,
+                 edge_sources: np.ndarray, edge_targets: np.ndarray, edge_weights: np.ndarray, node_params: list = None,
+                 node_orientations: np.ndarray = None) -> None:
+        '''
+        Initializes a :class:`Circuit` instance, building its adjacency arrays, topological layers and path mode labels.
+
+        :param node_types: The element type code of every node.
+        :type node_types: numpy.ndarray
+
+        :param node_positions: The (column, row) position of every node.
+        :type node_positions: numpy.ndarray
+
+        :param edge_sources: The source node of every edge.
+        :type edge_sources: numpy.ndarray
+
+        :param edge_targets: The target node of every edge.
+        :type edge_targets: numpy.ndarray
+
+        :param edge_weights: The grid distance covered by every edge.
+        :type edge_weights: numpy.ndarray
+
+        :param node_params: The parameters of every node. Defaults to no parameters.
+        :type node_params: list
+
+        :param node_orientations: The orientation index of every node. Defaults to 0 for every node.
+        :type node_orientations: numpy.ndarray
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.node_types = np.asarray(node_types, dtype=np.int8)
+        self.node_params = list(node_params) if node_params is not None else [{} for _ in range(len(self.node_types))]
+        self.node_orientations = np.asarray(node_orientations if node_orientations is not None else np.zeros(len(self.node_types)), dtype=np.int8)
+        self.node_positions = np.asarray(node_positions, dtype=np.int64).reshape(-1, 2)
+        self.edge_sources = np.asarray(edge_sources, dtype=np.int64)
+        self.edge_targets = np.asarray(edge_targets, dtype=np.int64)
+        self.edge_weights = np.asarray(edge_weights, dtype=np.int64)
+
+        # orientation of travel along every edge
+        delta = self.node_positions[self.edge_targets] - self.node_positions[self.edge_sources]
+        self.edge_orientations = np.select([delta[:, 0] > 0, delta[:, 1] > 0, delta[:, 0] < 0],
+                                           [0, 1, 2], default=3).astype(np.int8)
+
+        # CSR adjacency (a stable sort keeps the connection order within every node)
+        self.out_ptr, self.out_index = self.__build_csr(self.edge_sources)
+        self.in_ptr, self.in_index = self.__build_csr(self.edge_targets)
+
+        self.__build_layers()
+        self.__label_paths()
+
+        # computed lazily by get_fingerprint
+        self.fingerprint = None
+
+
+    def get_nodes_count(self) -> int:
+
+        return len(self.node_types)
+
+
+    def get_edges_count(self) -> int:
+
+        return len(self.edge_sources)
+
+
+    def get_out_edges(self, node: int) -> np.ndarray:
+
+        return self.out_index[self.out_ptr[node]:self.out_ptr[node+1]]
+
+
+    def get_in_edges(self, node: int) -> np.ndarray:
+
+        return self.in_index[self.in_ptr[node]:self.in_ptr[node+1]]
+
+
+    def get_layers(self) -> list:
+        '''
+        Returns the topological layers of the circuit.
+
+        :return: Returns a list of layers, each being an array of node ids.
+        :rtype: list
+        '''
+        return [self.order[self.layer_ptr[i]:self.layer_ptr[i+1]] for i in range(len(self.layer_ptr) - 1)]
+
+
+    def get_source_modes(self) -> np.ndarray:
+        '''
+        Returns the path modes emitted by the sources (lasers and SPDC sources) of the circuit, in the order the sources were added.
+
+        :return: Returns an array of path mode labels.
+        :rtype: numpy.ndarray
+        '''
+        sources = self.get_source_nodes()
+        return np.concatenate([self.edge_labels[self.get_out_edges(node)] for node in sources] + [np.zeros(0, dtype=np.int64)])
+
+
+    def get_source_nodes(self) -> np.ndarray:
+        '''
+        Returns the nodes of the sources (lasers and SPDC sources) of the circuit, in the order they were added.
+
+        :return: Returns an array of node ids.
+        :rtype: numpy.ndarray
+        '''
+        return np.flatnonzero(np.isin(self.node_types, SOURCE_TYPES))
+
+
+    def get_first_source(self) -> int:
+        '''
+        Returns the first source of the circuit in topological order, whose output carries the path mode 0.
+
+        Every single-photon view of the graph emits its photon from this source, so that the states seeded in the path mode 0
+        (see :meth:`State.from_path_modes`) and the amplitudes seeded on the edges of the source describe the same photon.
+        In a cyclic circuit where light returns into every source (e.g. a Sagnac loop), no source is scheduled, and the first source
+        in the order the sources were added is returned instead.
+
+        :return: Returns the node id of the source.
+        :rtype: int
+        '''
+        sources = self.get_source_nodes()
+        assert len(sources), "The graph has no source"
+
+        scheduled = self.order[np.isin(self.node_types[self.order], SOURCE_TYPES)]
+        return int(scheduled[0] if len(scheduled) else sources[0])
+
+
+    def get_detector_modes(self) -> list:
+        '''
+        Returns the path modes arriving at every detector of the circuit, in the order the detectors were added.
+
+        :return: Returns a list holding an array of path mode labels for every detector.
+        :rtype: list
+        '''
+        detectors = np.flatnonzero(self.node_types == DETECTOR)
+        return [np.unique(self.edge_labels[self.get_in_edges(node)]) for node in detectors]
+
+
+    def get_detector_edges(self) -> list:
+        '''
+        Returns the edges arriving at every detector of the circuit, in the order the detectors were added.
+
+        :return: Returns a list holding an array of edge ids for every detector.
+        :rtype: list
+        '''
+        detectors = np.flatnonzero(self.node_types == DETECTOR)
+        return [self.get_in_edges(node) for node in detectors]
+
+
+    def get_node_distances(self) -> np.ndarray:
+        '''
+        Returns the shortest grid distance travelled by light from any source to every node.
+
+        The distances are relaxed along the edges in topological order, in O(V+E).
+
+        :return: Returns an array of distances, in grid cells, holding infinity for the nodes no light reaches.
+        :rtype: numpy.ndarray
+        '''
+        distances = np.full(self.get_nodes_count(), np.inf)
+        distances[self.get_source_nodes()] = 0
+
+        for node in self.order:
+            in_edges = self.get_in_edges(node)
+            if len(in_edges):
+                distances[node] = min(distances[node], np.min(distances[self.edge_sources[in_edges]] + self.edge_weights[in_edges]))
+
+        return distances
+
+
+    def get_edge_phases(self, wavelengths: np.ndarray, cell_pitch: float = CELL_PITCH) -> np.ndarray:
+        '''
+        Returns the propagation phase factor of every edge at every wavelength.
+
+        An edge of grid distance w has a path length of ``w * cell_pitch`` and a phase factor of ``exp(2 pi i w cell_pitch / wavelength)``.
+
+        :param wavelengths: The W wavelengths in meters.
+        :type wavelengths: numpy.ndarray
+
+        :param cell_pitch: The size of a grid cell in meters.
+        :type cell_pitch: float
+
+        :return: Returns a W x E array of phase factors.
+        :rtype: numpy.ndarray
+        '''
+        wavelengths = np.atleast_1d(np.asarray(wavelengths, dtype=float))
+        return np.exp(2j * np.pi * np.outer(1 / wavelengths, self.edge_weights * cell_pitch))
+
+
+    def get_node_delays(self) -> np.ndarray:
+        '''
+        Returns the time every node holds back the light passing through it, which is only non-zero for time delay lines.
+
+        :return: Returns an array of delays, in grid cells.
+        :rtype: numpy.ndarray
+        '''
+        delays = np.zeros(self.get_nodes_count(), dtype=np.int64)
+        for node in np.flatnonzero(self.node_types == TIME_DELAY):
+            delays[node] = self.node_params[node].get("delay", TIME_DELAY_LENGTH)
+
+        return delays
+
+
+    def get_kernels(self, nodes: np.ndarray = None, params: dict = None):
+        '''
+        Yields the local kernel of every element in topological order, along with the path modes it acts on.
+
+        :param nodes: The nodes whose kernels are yielded, in the order they should be applied. Defaults to all nodes in topological order.
+        :type nodes: numpy.ndarray
+
+        :param params: Parameters overriding those of the nodes, keyed by node id. Arrays of values give stacks of kernels.
+        :type params: dict
+
+        :return: Yields tuples of the form (kernel, modes).
+        :rtype: Iterator[tuple[numpy.ndarray, numpy.ndarray]]
+        '''
+        if nodes is None:
+            nodes = self.order
+
+        for node in nodes:
+            node_params = self.__get_params(node, params)
+
+            if self.node_types[node] == BEAM_SPLITTER:
+
+                # the transmitted output continues the label of its input, so the input labels are the same as the output labels
+                yield beam_splitter_kernel(node_params.get("reflectivity", BEAM_SPLITTER_REFLECTIVITY)), self.edge_labels[self.get_out_edges(node)]
+
+            elif self.node_types[node] == PHASE_DELAY:
+                yield phase_kernel(node_params.get("phase", PHASE_DELAY_PHASE)), self.edge_labels[self.get_out_edges(node)]
+
+            elif self.node_types[node] in (MIRROR, NEUTRAL_DENSITY, BEAM_BLOCKER):
+                loss = self.__get_loss_kernel(node, node_params)
+                if loss is not None:
+                    yield loss
+
+            elif self.node_types[node] == BLOCK:
+                yield self.__get_block_kernel(node, node_params)
+
+
+    def get_polarization_kernels(self, nodes: np.ndarray = None, params: dict = None):
+        '''
+        Yields the local kernel of every element acting on a polarized state in topological order, along with the path modes it acts on.
+
+        Beam splitters and polarizing beam splitters yield path kernels (see :meth:`PolarizedState.apply_kernel`), and
+        polarizing elements yield the Jones matrix applied to the path mode passing through them (see :meth:`PolarizedState.apply_jones`).
+
+        :param nodes: The nodes whose kernels are yielded, in the order they should be applied. Defaults to all nodes in topological order.
+        :type nodes: numpy.ndarray
+
+        :param params: Parameters overriding those of the nodes, keyed by node id. Arrays of values give stacks of kernels.
+        :type params: dict
+
+        :return: Yields tuples of the form (kernel, modes, is_jones).
+        :rtype: Iterator[tuple[numpy.ndarray, numpy.ndarray, bool]]
+        '''
+        if nodes is None:
+            nodes = self.order
+
+        for node in nodes:
+            node_type = self.node_types[node]
+            node_params = self.__get_params(node, params)
+
+            if node_type == BEAM_SPLITTER:
+                yield beam_splitter_kernel(node_params.get("reflectivity", BEAM_SPLITTER_REFLECTIVITY)), self.edge_labels[self.get_out_edges(node)], False
+
+            elif node_type == POLAR_BEAM_SPLITTER:
+                yield polarizing_beam_splitter_kernel(), self.edge_labels[self.get_out_edges(node)], False
+
+            elif node_type == PHASE_DELAY:
+                yield phase_kernel(node_params.get("phase", PHASE_DELAY_PHASE)), self.edge_labels[self.get_out_edges(node)], False
+
+            elif node_type in (MIRROR, NEUTRAL_DENSITY, BEAM_BLOCKER):
+                loss = self.__get_loss_kernel(node, node_params)
+                if loss is not None:
+                    yield loss + (False,)
+
+            elif node_type == BLOCK:
+                yield self.__get_block_kernel(node, node_params) + (False,)
+
+            elif node_type in POLARIZATION_TYPES:
+                yield jones_matrix(node_type, node_params.get("angle"), node_params.get("retardance")), self.edge_labels[self.get_out_edges(node)], True
+
+
+    def get_scattering_matrix(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Returns the scattering matrix of the circuit, mapping the amplitude arriving on every incoming edge of an element to the
+        amplitudes leaving on its outgoing edges.
+
+        Every edge is a mode of its own, so unlike the path modes the scattering matrix is also defined for cyclic circuits.
+        The coefficients are those of the kernels of :meth:`get_kernels`: a beam splitter transmits and reflects with the entries of
+        :func:`beam_splitter_kernel`, a mirror reflects, a phase delay shifts the phase, a neutral density filter attenuates,
+        detectors, walls and beam blockers absorb, a sub-circuit block maps its input ports to its output ports, and all other elements transmit.
+
+        :return: Returns the E x E matrix in coordinate form, as arrays of rows (outgoing edges), columns (incoming edges) and values.
+        :rtype: tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+        '''
+        rows, cols, values = [], [], []
+        for node in range(self.get_nodes_count()):
+            for in_edge in self.get_in_edges(node):
+                for out_edge in self.get_out_edges(node):
+
+                    coefficient = self.__get_scattering_coefficient(node, self.edge_orientations[in_edge], self.edge_orientations[out_edge])
+                    if coefficient != 0:
+                        rows.append(out_edge)
+                        cols.append(in_edge)
+                        values.append(coefficient)
+
+        return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64), np.array(values, dtype=complex)
+
+
+    def get_channels(self, nodes: np.ndarray = None):
+        '''
+        Yields the noisy channel of every dephaser and depolarizer in topological order, along with the path modes it acts on.
+
+        :param nodes: The nodes whose channels are yielded, in the order they should be applied. Defaults to all nodes in topological order.
+        :type nodes: numpy.ndarray
+
+        :return: Yields tuples of the form (unitaries, probabilities, modes), as applied by :meth:`DensityMatrix.apply_channel`.
+        :rtype: Iterator[tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]]
+        '''
+        if nodes is None:
+            nodes = self.order
+
+        for node in nodes:
+            if self.node_types[node] in CHANNEL_TYPES:
+                unitaries, probabilities = channel_operators(self.node_types[node], self.node_params[node].get("strength"))
+                yield unitaries, probabilities, self.edge_labels[self.get_out_edges(node)]
+
+
+    def get_layer_signatures(self) -> list:
+        '''
+        Returns a signature of every topological layer.
+
+        The signature of a layer covers the type, position, orientation and parameters of its nodes and the labels, lengths and
+        directions of their edges.
+        If the first k layers of two circuits have the same signatures, the states after these layers are the same.
+
+        :return: Returns a list of digests, one for each layer.
+        :rtype: list
+        '''
+        signatures = []
+        for layer in self.get_layers():
+
+            digest = hashlib.sha1()
+            digest.update(self.node_types[layer].tobytes())
+            digest.update(self.node_positions[layer].tobytes())
+            digest.update(self.node_orientations[layer].tobytes())
+            for node in layer:
+                digest.update(repr(sorted(self.node_params[node].items())).encode())
+                for edges in (self.get_in_edges(node), self.get_out_edges(node)):
+                    digest.update(b"|")
+                    digest.update(self.edge_labels[edges].tobytes())
+                    digest.update(self.edge_weights[edges].tobytes())
+                    digest.update(self.edge_orientations[edges].tobytes())
+
+            signatures.append(digest.digest())
+
+        return signatures
+
+
+    def get_fingerprint(self) -> str:
+        '''
+        Returns a fingerprint of the layout of the circuit.
+
+        Two circuits with the same elements at the same positions and orientations, with the same parameters and the same connections have the same fingerprint,
+        and therefore the same transfer matrix.
+
+        :return: Returns a hexadecimal digest.
+        :rtype: str
+        '''
+        if self.fingerprint is None:
+
+            digest = hashlib.sha1()
+            for array in (self.node_types, self.node_positions, self.node_orientations, self.edge_sources, self.edge_targets, self.edge_weights):
+                digest.update(np.ascontiguousarray(array).tobytes())
+                digest.update(b"|")
+            for params in self.node_params:
+                digest.update(repr(sorted(params.items())).encode())
+
+            self.fingerprint = digest.hexdigest()
+
+        return self.fingerprint
+
+
+    def __get_params(self, node: int, params: dict = None) -> dict:
+        '''
+        This is an auxiliary method and is inteded for internal use only.
+
+        Returns the parameters of a node, updated with the overriding parameters given for it.
+
+        :param node: The node.
+        :type node: int
+
+        :param params: Parameters overriding those of the nodes, keyed by node id.
+        :type params: dict
+
+        :return: Returns the parameters of the node.
+        :rtype: dict
+        '''
+        if not params or node not in params:
+            return self.node_params[node]
+
+        return {**self.node_params[node], **params[node]}
+
+
+    def __get_loss_kernel(self, node: int, node_params: dict) -> tuple:
+        '''
+        This is an auxiliary method and is inteded for internal use only.
+
+        Returns the attenuation kernel of a lossy element: a mirror with a reflectivity below 1, a neutral density filter,
+        or a beam blocker, which absorbs the path modes ending at it.
+
+        :param node: The node of the element.
+        :type node: int
+
+        :param node_params: The parameters of the node.
+        :type node_params: dict
+
+        :return: Returns a (kernel, modes) tuple, or :literal:`None` for a lossless mirror.
+        :rtype: tuple
+        '''
+        node_type = self.node_types[node]
+
+        if node_type == BEAM_BLOCKER:
+            modes = np.unique(self.edge_labels[self.get_in_edges(node)])
+            return attenuation_kernel(0.0, len(modes)), modes
+
+        transmission = node_params.get("reflectivity", MIRROR_REFLECTIVITY) if node_type == MIRROR else \
+                       node_params.get("transmission", NDF_TRANSMISSION)
+        if np.all(np.asarray(transmission) == 1):
+            return None
+
+        modes = self.edge_labels[self.get_out_edges(node)]
+        return attenuation_kernel(transmission, len(modes)), modes
+
+
+    def __get_block_kernel(self, node: int, node_params: dict) -> tuple:
+        '''
+        This is an auxiliary method and is inteded for internal use only.
+
+        Returns the fused kernel of an instance of a sub-circuit block, mapping the path modes entering it to the path modes leaving it
+        with the port-to-port transfer matrix of the block. Path modes entering the block without leaving it are absorbed.
+
+        :param node: The node of the instance.
+        :type node: int
+
+        :param node_params: The parameters of the node, holding the block under ``"block"``.
+        :type node_params: dict
+
+        :return: Returns a (kernel, modes) tuple.
+        :rtype: tuple
+        '''
+        block = node_params["block"]
+        in_edges, out_edges = self.get_in_edges(node), self.get_out_edges(node)
+
+        modes = np.unique(np.concatenate([self.edge_labels[in_edges], self.edge_labels[out_edges]]))
+        kernel = np.zeros((len(modes), len(modes)), dtype=complex)
+        for out_edge in out_edges:
+            for in_edge in in_edges:
+                kernel[np.searchsorted(modes, self.edge_labels[out_edge]), np.searchsorted(modes, self.edge_labels[in_edge])] = \
+                    block.get_coefficient(self.edge_orientations[in_edge], self.edge_orientations[out_edge], self.node_orientations[node])
+
+        return kernel, modes
+
+
+    def __get_scattering_coefficient(self, node: int, in_orientation: int, out_orientation: int) -> complex:
+        '''
+        This is an auxiliary method and is inteded for internal use only.
+
+        Returns the amplitude with which light entering a node in one direction of travel leaves it in another.
+
+        :param node: The node.
+        :type node: int
+
+        :param in_orientation: The direction of travel of the incoming light.
+        :type in_orientation: int
+
+        :param out_orientation: The direction of travel of the outgoing light.
+        :type out_orientation: int
+
+        :return: Returns the scattering coefficient.
+        :rtype: complex
+        '''
+        node_type = self.node_types[node]
+        reflected_orientation = (in_orientation + pow(-1, (self.node_orientations[node]&1)+(in_orientation&1)) + 4) % 4
+
+        if node_type == BEAM_SPLITTER:
+            kernel = beam_splitter_kernel(self.node_params[node].get("reflectivity", BEAM_SPLITTER_REFLECTIVITY))
+            return kernel[0, 0] if out_orientation == in_orientation else kernel[1, 0] if out_orientation == reflected_orientation else 0
+        elif node_type == MIRROR:
+            return np.sqrt(self.node_params[node].get("reflectivity", MIRROR_REFLECTIVITY)) if out_orientation == reflected_orientation else 0
+        elif node_type == NEUTRAL_DENSITY:
+            return np.sqrt(self.node_params[node].get("transmission", NDF_TRANSMISSION)) if out_orientation == in_orientation else 0
+        elif node_type == PHASE_DELAY:
+            return phase_kernel(self.node_params[node].get("phase", PHASE_DELAY_PHASE))[0, 0] if out_orientation == in_orientation else 0
+        elif node_type == BLOCK:
+            return self.node_params[node]["block"].get_coefficient(in_orientation, out_orientation, self.node_orientations[node])
+        elif node_type in (DETECTOR, GRID_WALL, BEAM_BLOCKER):
+            return 0
+        else:
+            return 1 if out_orientation == in_orientation else 0
+
+
+    def __build_csr(self, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+
+        index = np.argsort(keys, kind='stable')
+        ptr = np.zeros(self.get_nodes_count() + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=self.get_nodes_count()), out=ptr[1:])
+
+        return ptr, index
+
+
+    def __build_layers(self) -> None:
+        '''
+        Computes the topological layers in O(V+E) by counting in-degrees.
+
+        The first layer holds all nodes without incoming edges (the lasers), and every following layer holds the nodes whose
+        incoming edges all start in previous layers. Nodes on a cycle are never scheduled, which marks the circuit as cyclic.
+        The nodes of every layer are sorted by their position, so that the layers and path labels of a layout do not depend
+        on the order in which its elements were added.
+        '''
+        in_degrees = np.diff(self.in_ptr)
+
+        # start with all nodes that have no incoming edges
+        layer = np.flatnonzero(in_degrees == 0)
+
+        layers = []
+        while layer.size:
+
+            # sort the layer by row, then by column
+            layer = layer[np.lexsort((self.node_positions[layer, 0], self.node_positions[layer, 1]))]
+            layers.append(layer)
+
+            # a node joins the next layer once all of its incoming edges were visited
+            edges = np.concatenate([self.get_out_edges(node) for node in layer])
+            targets = self.edge_targets[edges]
+            np.subtract.at(in_degrees, targets, 1)
+
+            targets = np.unique(targets)
+            layer = targets[in_degrees[targets] == 0]
+
+        self.order = np.concatenate(layers) if layers else np.zeros(0, dtype=np.int64)
+        self.layer_ptr = np.zeros(len(layers) + 1, dtype=np.int64)
+        np.cumsum([len(layer) for layer in layers], out=self.layer_ptr[1:])
+        self.acyclic = len(self.order) == self.get_nodes_count()
+
+
+    def __label_paths(self) -> None:
+        '''
+        Assigns a path mode label to every edge reachable in topological order.
+
+        An outgoing edge continues the label of the incoming edge travelling in the same direction (transmission), otherwise
+        it takes over any label not yet continued (reflection by a mirror), otherwise it starts a new path mode
+        (e.g. the output of a laser or the reflected output of a beam splitter).
+        '''
+        self.edge_labels = np.full(self.get_edges_count(), -1, dtype=np.int64)
+
+        label = 0
+        for node in self.order:
+
+            # labels of the incoming edges, keyed by their direction of travel
+            in_labels = {}
+            for edge in self.get_in_edges(node):
+                in_labels.setdefault(self.edge_orientations[edge], self.edge_labels[edge])
+
+            # first, continue the labels of transmitted paths
+            unlabeled = []
+            for edge in self.get_out_edges(node):
+                if self.edge_orientations[edge] in in_labels:
+                    self.edge_labels[edge] = in_labels.pop(self.edge_orientations[edge])
+                else:
+                    unlabeled.append(edge)
+
+            # then, continue the remaining labels or start new paths
+            remaining = list(in_labels.values())
+            for edge in unlabeled:
+                if remaining:
+                    self.edge_labels[edge] = remaining.pop(0)
+                else:
+                    self.edge_labels[edge] = label
+                    label += 1
+
+        # store the number of path modes
+        self.path_modes_count = label
+
+        
+
+
+class Graph():
+    '''
+    The graph of an optical setup, holding its elements as nodes and the light paths between them as directed edges.
+
+    Nodes are given integer ids in the order they are added. The graph is compiled lazily into a :class:`Circuit`
+    that holds the arrays read by the simulation engine.
+    '''
+
+    def __init__(self,):
+
+        # default dictionary for counting elements for each type
+        self.counts = defaultdict(int)
+
+        # default dictionary to store elements of each type
+        self.elements = defaultdict(list)
+
+        # integer ids of the nodes, keyed by the node names
+        self.node_ids = {}
+
+        # node attributes, indexed by the integer ids
+        self.node_names = []
+        self.node_elements = []
+        self.node_types = []
+        self.node_positions = []
+
+        # edge attributes, indexed by the edge ids
+        self.edge_sources = []
+        self.edge_targets = []
+        self.edge_weights = []
+
+        # initialize variables
+        self.path_modes_count = 0
+
+        # compiled circuit of the graph, built lazily by get_circuit
+        self.circuit = None
+
+        # intermediate states of the last simulation, kept across clear() for incremental re-simulation
+        self.checkpoints = {}
+        self.checkpoint_signatures = []
+
+
+
+    def clear(self) -> None:
+        '''
+        Removes all elements and connections from the graph.
+
+        The intermediate states of the last simulation are kept, so that simulating the graph after it is refilled with
+        a slightly changed layout only recomputes the layers downstream of the first change.
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        checkpoints = self.checkpoints
+        checkpoint_signatures = self.checkpoint_signatures
+
+        self.__init__()
+
+        self.checkpoints = checkpoints
+        self.checkpoint_signatures = checkpoint_signatures
+
+
+
+    def add_element(self, element: Element) -> str:
+
+        # assign an ID to the element
+        id = element.type + f"({element.row},{element.col})"
+
+        # each element is registered only once
+        if id in self.node_ids:
+            return id
+
+        # check the type of the element
+        assert element.type in ELEMENT_TYPES, f"Unknown element type {element.type}"
+
+        # the structure of the graph changed
+        self.circuit = None
+        
+        # increase the counts of elements of this type
+        self.counts[element.type] += 1
+
+        # append the element to the list
+        self.elements[element.type].append({
+            'element':element,
+            'id': id
+        })
+
+        # add node with the id of the element
+        self.node_ids[id] = len(self.node_names)
+        self.node_names.append(id)
+        self.node_elements.append(element)
+        self.node_types.append(ELEMENT_TYPES[element.type])
+        self.node_positions.append((element.col, element.row))
+
+        # return the element's id
+        return id
+
+
+
+    def add_connection(self, from_element: Element, to_element: Element) -> None:
+
+        # add the two elements to the graph and get their ids
+        from_id = self.add_element(from_element)
+        to_id   = self.add_element(to_element)
+
+        # Calculate the distance between both elements
+        weight = abs(from_element.row - to_element.row) + abs(from_element.col - to_element.col)
+
+        # the structure of the graph changed
+        self.circuit = None
+
+        # add an edge between the two ids
+        self.edge_sources.append(self.node_ids[from_id])
+        self.edge_targets.append(self.node_ids[to_id])
+        self.edge_weights.append(weight)
+
+
+
+    def set_params(self, name: str, **params) -> None:
+        '''
+        Updates the parameters of an element of the graph.
+
+        The parameters are written to the :class:`Element` record of the node, which is shared with the layout the graph was
+        built from. The circuit is rebuilt on next use, so that its fingerprint and layer signatures cover the new values.
+
+        :param name: The name of the node.
+        :type name: str
+
+        :param params: The parameters to set, e.g. ``reflectivity=0.3``.
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        assert name in self.node_ids, f"Unknown element {name}"
+
+        self.node_elements[self.node_ids[name]].params.update(params)
+        self.circuit = None
+
+
+
+    def get_circuit(self) -> Circuit:
+        '''
+        Returns the compiled circuit of the graph.
+
+        The circuit is built once and cached until the graph is modified.
+
+        :return: Returns the compiled circuit.
+        :rtype: Circuit
+        '''
+        if self.circuit is None:
+            self.circuit = Circuit(self.node_types, self.node_positions,
+                                   self.edge_sources, self.edge_targets, self.edge_weights,
+                                   [element.params for element in self.node_elements],
+                                   [element.orientation for element in self.node_elements])
+            self.path_modes_count = self.circuit.path_modes_count
+
+        return self.circuit
+
+
+
+    def compile(self) -> Operation:
+        '''
+        Returns the transfer matrix of the whole circuit as an :class:`Operation`.
+
+        The matrix is built by applying the kernel of every element to an identity operation, at a cost of O(N) per element.
+        It is cached by the fingerprint of the layout, so compiling a graph rebuilt from the same layout costs nothing,
+        and any number of input states can then be propagated with a single matrix product.
+        The matrix of the returned operation is shared with the cache and is read-only.
+
+        :return: Returns the compiled operation, mapping input state vectors to output state vectors.
+        :rtype: Operation
+        '''
+        circuit = self.get_circuit()
+        assert circuit.acyclic, "The graph must be acyclic"
+
+        # reuse the operation of an identical layout
+        fingerprint = circuit.get_fingerprint()
+        operation = transfer_matrices.get(fingerprint)
+        if operation is not None:
+            return operation
+
+        operation = Operation(circuit.path_modes_count)
+        for kernel, modes in circuit.get_kernels():
+            operation.apply_kernel(kernel, modes)
+
+        operation.matrix.flags.writeable = False
+        transfer_matrices.put(fingerprint, operation)
+
+        return operation
+
+
+
+    def get_detectors(self) -> list:
+        '''
+        Returns the names of all detectors of the graph, in the order they were added.
+
+        :return: Returns a list of node names.
+        :rtype: list
+        '''
+        return [self.node_names[node] for node in np.flatnonzero(self.get_circuit().node_types == DETECTOR)]
+
+
+
+    def get_detector_probabilities(self, state: State, edge_modes: bool = False) -> np.ndarray:
+        '''
+        Returns the probability of a click at every detector of the graph.
+
+        :param state: A final state, or a batch of final states, of the graph.
+        :type state: State | StateBatch | PolarizedState | DensityMatrix
+
+        :param edge_modes: :literal:`True` if the state holds one amplitude per edge, as returned by :meth:`calculate_steady_state`,
+            instead of one per path mode.
+        :type edge_modes: bool
+
+        :return: Returns an array of probabilities ordered as :meth:`get_detectors`, with a leading batch axis for a :class:`StateBatch`.
+            The detectors of a :class:`PolarizedState` or :class:`DensityMatrix` are not polarization resolving.
+        :rtype: numpy.ndarray
+        '''
+        probabilities = state.get_probabilities()
+        if isinstance(state, (PolarizedState, DensityMatrix)):
+            probabilities = np.sum(probabilities, axis=-1)
+
+        circuit = self.get_circuit()
+        detector_modes = circuit.get_detector_edges() if edge_modes else circuit.get_detector_modes()
+        detector_probabilities = np.zeros(probabilities.shape[:-1] + (len(detector_modes),))
+        for detector, modes in enumerate(detector_modes):
+            detector_probabilities[..., detector] = np.sum(probabilities[..., modes], axis=-1)
+
+        return detector_probabilities
+
+
+
+    def get_detector_time_bins(self, state: TimeBinState, edge_modes: bool = False) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Returns the probability of a click at every detector of the graph in every time bin.
+
+        :param state: A final time-resolved state of the graph, as returned by :meth:`calculate_time_bins`.
+        :type state: TimeBinState
+
+        :param edge_modes: :literal:`True` if the state is keyed by edges, as returned by :meth:`calculate_round_trips`,
+            instead of by path modes.
+        :type edge_modes: bool
+
+        :return: Returns a tuple of the time bins and a D x T array of probabilities, with the detectors ordered as :meth:`get_detectors`.
+        :rtype: tuple[numpy.ndarray, numpy.ndarray]
+        '''
+        times, probabilities = state.get_probabilities()
+
+        circuit = self.get_circuit()
+        detector_modes = circuit.get_detector_edges() if edge_modes else circuit.get_detector_modes()
+        detector_probabilities = np.zeros((len(detector_modes), len(times)))
+        for detector, modes in enumerate(detector_modes):
+            detector_probabilities[detector] = np.sum(probabilities[modes], axis=0)
+
+        return times, detector_probabilities
+
+
+
+    def get_layers(self) -> list:
+        '''
+        Returns the topological layers of the graph.
+
+        The first layer holds all nodes without incoming edges (the lasers), and every following layer holds the nodes whose
+        incoming edges all start in previous layers. Every node appears in exactly one layer.
+        The layers are computed once in O(V+E) by counting in-degrees and are cached until the graph is modified.
+
+        :return: Returns a list of layers, each being a list of node names.
+        :rtype: list
+        '''
+        return [[self.node_names[node] for node in layer] for layer in self.get_circuit().get_layers()]
+
+
+
+    def is_acyclic(self) -> bool:
+        '''
+        Checks if the graph has no cycles.
+
+        :return: Returns :literal:`True` if the graph is acyclic, otherwise returns :literal:`False`.
+        :rtype: bool
+        '''
+        return self.get_circuit().acyclic
+
+
+
+    def to_networkx(self):
+        '''
+        Exports the graph as a ``networkx.MultiDiGraph``.
+
+        networkx is only needed for this export and is imported when the method is called.
+
+        :return: Returns a multi-digraph with the node names as nodes, carrying the ``pos`` and ``element`` node attributes and
+            the ``weight`` and ``label`` edge attributes.
+        :rtype: networkx.MultiDiGraph
+        '''
+        import networkx as nx
+
+        circuit = self.get_circuit()
+
+        graph = nx.MultiDiGraph()
+        for node, name in enumerate(self.node_names):
+            graph.add_node(name,
+                           pos=self.node_positions[node],
+                           element=self.node_elements[node])
+
+        for edge in range(circuit.get_edges_count()):
+            graph.add_edge(self.node_names[circuit.edge_sources[edge]], self.node_names[circuit.edge_targets[edge]],
+                           weight=int(circuit.edge_weights[edge]),
+                           label=int(circuit.edge_labels[edge]))
+
+        return graph
+
+
+
+    def __visualize_graph(self) -> None:
+
+        # plotting is only needed when visualizing, so headless runs never import matplotlib
+        import matplotlib
+        matplotlib.use('Qt5Agg')
+        from matplotlib import pyplot as plt
+        import networkx as nx
+
+        graph = self.to_networkx()
+
+        # extract positioning of nodes
+        pos = {
+            node:graph.nodes[node]['pos'] for node in graph.nodes
+        }
+
+        # labeling edges
+        edge_labels = {(u, v): f'{data["weight"]}, |{data["label"]}>' for u, v, data in graph.edges(data=True)}
+
+        # draw the graph
+        nx.draw(graph, pos, with_labels=True, arrows=True)
+        nx.draw_networkx_edge_labels(graph, pos, edge_labels=edge_labels, font_color='red', font_size=12)
+        plt.show()
+
+    
+
+    def calculate_results(self, visualize=False, backend="kernel") -> np.array:
+        '''
+        Propagates the initial state through all elements of the graph and returns the final state vector.
+
+        The engine reads only the arrays of the compiled :class:`Circuit`. Three backends are available:
+
+        - ``"kernel"``: every element is applied as a small local kernel directly on the amplitudes of the modes it touches.
+          This costs O(1) per beam splitter regardless of the number of path modes. The intermediate states are checkpointed,
+          and the next simulation of this graph resumes from the last checkpoint before the first changed layer.
+        - ``"compiled"``: the state is multiplied with the cached transfer matrix returned by :meth:`compile`.
+          This costs a single matrix-vector product once the layout has been compiled.
+        - ``"operation"``: every layer is built as a dense :class:`Operation` matrix, embedding the same element kernels as the other
+          backends, and multiplied with the state. This costs O(N^3) per layer and is kept as a reference backend.
+
+        :param visualize: If :literal:`True`, draws the graph before propagating.
+        :type visualize: bool
+
+        :param backend: The propagation backend, either ``"kernel"``, ``"compiled"`` or ``"operation"``.
+        :type backend: str
+
+        :return: Returns the final state vector.
+        :rtype: numpy.ndarray
+        '''
+        assert backend in ("kernel", "compiled", "operation"), f"Unknown backend {backend}"
+
+        # compile the graph, labelling the paths before starting
+        circuit = self.get_circuit()
+        assert circuit.acyclic, "The graph must be acyclic"
+
+        # HACK: start with an initial state for the path qubit only
+        state = State.from_path_modes(circuit.path_modes_count)
+
+        # Optional: Visualize Graph
+        if visualize:
+            self.__visualize_graph()
+
+        # apply every element exactly once, in topological order
+        if backend == "kernel":
+            state = self.__propagate_incrementally(circuit, state)
+
+        elif backend == "compiled":
+            state = self.compile().apply_operation_on_state(state)
+
+        # reference backend: build a dense operation for every layer
+        else:
+            for layer in circuit.get_layers():
+
+                operation = Operation(circuit.path_modes_count)
+
+                # embed the kernel of every element of the layer in a dense operation, applied after the previous ones
+                for kernel, modes in circuit.get_kernels(layer):
+                    element_operation = Operation(circuit.path_modes_count)
+                    element_operation.matrix[np.ix_(modes, modes)] = kernel
+                    element_operation.cascade_operation(operation)
+                    operation = element_operation
+
+                state = operation.apply_operation_on_state(state)
+        
+        
+        return state.get_state_vector()
+
+
+
+    def __propagate_incrementally(self, circuit: Circuit, state: State) -> State:
+        '''
+        Propagates the initial state through the circuit layer by layer, reusing the checkpoints of the last simulation.
+
+        The layers are compared with those of the last simulation by their signatures. Propagation resumes from the last
+        checkpoint taken before the first changed layer, and new checkpoints are taken every few layers so that at most
+        :data:`INCREMENTAL_CHECKPOINTS` states are kept.
+        '''
+        layers = circuit.get_layers()
+        signatures = circuit.get_layer_signatures()
+
+        # count the leading layers that did not change since the last simulation
+        unchanged = 0
+        while unchanged < min(len(signatures), len(self.checkpoint_signatures)) and \
+                signatures[unchanged] == self.checkpoint_signatures[unchanged]:
+            unchanged += 1
+
+        # keep the checkpoints taken after unchanged layers, and resume from the last of them
+        checkpoints = {layer: vector for layer, vector in self.checkpoints.items() if layer < unchanged}
+        start = 0
+        if checkpoints:
+            last = max(checkpoints)
+            start = last + 1
+
+            # the labels of unchanged layers are the same, only the number of path modes may differ
+            dimension = min(len(checkpoints[last]), state.get_dimension())
+            state.state_vector[:] = 0
+            state.state_vector[:dimension] = checkpoints[last][:dimension]
+
+        interval = max(1, -(-len(layers) // INCREMENTAL_CHECKPOINTS))
+        for index in range(start, len(layers)):
+
+            for kernel, modes in circuit.get_kernels(layers[index]):
+                state.apply_kernel(kernel, modes)
+
+            # the state after the last layer is always kept, so an unchanged graph is not propagated again
+            if (index + 1) % interval == 0 or index == len(layers) - 1:
+                checkpoints[index] = state.get_state_vector().copy()
+
+        self.checkpoints = checkpoints
+        self.checkpoint_signatures = signatures
+
+        return state
+
+
+
+    def calculate_batch(self, input_states: np.ndarray, backend="kernel") -> StateBatch:
+        '''
+        Propagates a batch of K input states through the graph in a single vectorized pass.
+
+        :param input_states: A K x N array holding one input state vector per row, or a :class:`StateBatch`.
+        :type input_states: numpy.ndarray | StateBatch
+
+        :param backend: The propagation backend, either ``"kernel"`` (every element kernel is applied to all K states at once)
+            or ``"compiled"`` (the batch is multiplied with the cached transfer matrix returned by :meth:`compile`).
+        :type backend: str
+
+        :return: Returns the batch of the K final states.
+        :rtype: StateBatch
+        '''
+        assert backend in ("kernel", "compiled"), f"Unknown backend {backend}"
+
+        circuit = self.get_circuit()
+        assert circuit.acyclic, "The graph must be acyclic"
+
+        if isinstance(input_states, State):
+            input_states = input_states.get_state_vector()
+
+        # copy the input, since kernels are applied in place
+        batch = StateBatch(np.array(input_states, dtype=complex, ndmin=2))
+        assert batch.get_dimension() == circuit.path_modes_count, "The input states must have one amplitude per path mode"
+
+        if backend == "kernel":
+            for kernel, modes in circuit.get_kernels():
+                batch.apply_kernel(kernel, modes)
+        else:
+            batch = self.compile().apply_operation_on_state(batch)
+
+        return batch
+
+
+
+    def calculate_sweep(self, wavelengths: np.ndarray, cell_pitch: float = CELL_PITCH) -> StateBatch:
+        '''
+        Propagates the initial state through the graph at many wavelengths at once, including the propagation phase of every edge.
+
+        The state at every wavelength is one row of a :class:`StateBatch`. Before every element, the phase factors of its incoming
+        edges are broadcast over the wavelength axis and multiplied into the amplitudes of their path modes, and the element's
+        kernel is then applied to all wavelengths at once. Path imbalances thus show up as interference fringes over the sweep.
+
+        :param wavelengths: The W wavelengths in meters.
+        :type wavelengths: numpy.ndarray
+
+        :param cell_pitch: The size of a grid cell in meters.
+        :type cell_pitch: float
+
+        :return: Returns a batch holding the final state at every wavelength.
+        :rtype: StateBatch
+        '''
+        circuit = self.get_circuit()
+        assert circuit.acyclic, "The graph must be acyclic"
+
+        phases = circuit.get_edge_phases(wavelengths, cell_pitch)
+        batch = StateBatch.from_path_modes(circuit.path_modes_count, [0] * len(phases))
+
+        for node in circuit.order:
+
+            # propagate along the incoming edges, then apply the element
+            in_edges = circuit.get_in_edges(node)
+            batch.state_vector[:, circuit.edge_labels[in_edges]] *= phases[:, in_edges]
+
+            for kernel, modes in circuit.get_kernels([node]):
+                batch.apply_kernel(kernel, modes)
+
+        return batch
+
+
+
+    def calculate_parameter_sweep(self, sweeps: dict, polarization: tuple = None) -> StateBatch:
+        '''
+        Propagates a photon emitted by the first source through the graph for many settings of its element parameters in one pass.
+
+        Every swept parameter (e.g. the "reflectivity" of a beam splitter, the "phase" of a phase delay or the "angle" and
+        "retardance" of a phase retarder) is given as an array of values, and all arrays are broadcast to a common shape whose
+        entries are the K settings of the sweep. The kernels of the swept elements are built as K stacked kernels and applied with
+        ``einsum`` along the batch axis, and all other elements apply a single kernel to the whole batch, so the sweep costs one
+        pass through the circuit. Use :func:`numpy.meshgrid` to sweep several parameters over a grid.
+
+        :param sweeps: The swept parameters, mapping node names (e.g. ``"BeamSplitter(1,3)"``) to dictionaries mapping parameter
+            names to arrays of values.
+        :type sweeps: dict
+
+        :param polarization: The normalized (horizontal, vertical) amplitudes of the photon. If given, the photon is propagated as in
+            :meth:`calculate_polarized`, otherwise as in :meth:`calculate_results`.
+        :type polarization: tuple
+
+        :return: Returns a batch holding the final state of every setting, flattened in the order of the broadcast shape.
+        :rtype: StateBatch | PolarizedStateBatch
+        '''
+        circuit = self.get_circuit()
+        assert circuit.acyclic, "The graph must be acyclic"
+
+        values = [np.asarray(value, dtype=float) for node_sweeps in sweeps.values() for value in node_sweeps.values()]
+        shape = np.broadcast_shapes(*(value.shape for value in values))
+        batch_size = int(np.prod(shape))
+
+        params = {self.node_ids[name]: {param: np.broadcast_to(np.asarray(value, dtype=float), shape).ravel() for param, value in node_sweeps.items()}
+                  for name, node_sweeps in sweeps.items()}
+
+        if polarization is None:
+            batch = StateBatch.from_path_modes(circuit.path_modes_count, [0] * batch_size)
+            for kernel, modes in circuit.get_kernels(params=params):
+                batch.apply_kernel(kernel, modes)
+
+            return batch
+
+        batch = PolarizedStateBatch.from_path_modes(circuit.path_modes_count, batch_size, polarization)
+        for node in circuit.order:
+            for kernel, modes, is_jones in circuit.get_polarization_kernels([node], params):
+                if is_jones:
+                    batch.apply_jones(kernel, modes)
+
+                # a stack of path kernels acts the same way on both polarizations
+                elif kernel.ndim == 3 and circuit.node_types[node] != POLAR_BEAM_SPLITTER:
+                    batch.apply_kernel(np.broadcast_to(kernel[:, None], (batch_size, 2) + kernel.shape[1:]), modes)
+                else:
+                    batch.apply_kernel(kernel, modes)
+
+        return batch
+
+
+
+    def calculate_time_bins(self, max_time: int = None, threshold: float = SPARSE_TRUNCATION_THRESHOLD) -> TimeBinState:
+        '''
+        Propagates a photon emitted by the first source at time 0 through the graph, keeping its amplitudes in separate time bins.
+
+        The propagation is event driven: every edge takes as many time bins as its grid length, and a time delay line holds the
+        light back for its "delay" parameter. The arrival times waiting to be processed are kept in a heap. All amplitudes
+        arriving at the same time are merged by node and processed together, so that the amplitudes arriving at a beam splitter
+        in the same time bin interfere, while those arriving at different times pass through it separately.
+        The number of stored amplitudes grows with the number of distinct arrival times, not with the total path length.
+
+        :param max_time: The last time bin to simulate. Defaults to running until all light has left the setup.
+        :type max_time: int
+
+        :param threshold: Amplitudes with a smaller magnitude are discarded.
+        :type threshold: float
+
+        :return: Returns the final time-resolved state, holding the amplitudes reaching the detectors and walls.
+        :rtype: TimeBinState
+        '''
+        circuit = self.get_circuit()
+        assert circuit.acyclic, "The graph must be acyclic"
+
+        source = circuit.get_first_source()
+        delays = circuit.get_node_delays()
+        state = TimeBinState(circuit.path_modes_count)
+
+        # amplitudes waiting to arrive, keyed by time, then by node, then by path mode, and a heap of their times
+        arrivals = defaultdict(lambda: defaultdict(lambda: defaultdict(complex)))
+        times = []
+
+        def emit(departure, edge, amplitude):
+            arrival = departure + circuit.edge_weights[edge]
+            if arrival not in arrivals:
+                heapq.heappush(times, arrival)
+            arrivals[arrival][circuit.edge_targets[edge]][circuit.edge_labels[edge]] += amplitude
+
+        for edge in circuit.get_out_edges(source):
+            emit(delays[source], edge, 1)
+
+        while times:
+            time = heapq.heappop(times)
+            if max_time is not None and time > max_time:
+                break
+
+            for node, local in arrivals.pop(time).items():
+
+                for kernel, modes in circuit.get_kernels([node]):
+                    local.update(zip(modes, np.dot(kernel, [local[mode] for mode in modes])))
+
+                # send the amplitudes of the continuing paths along the outgoing edges
+                for edge in circuit.get_out_edges(node):
+                    amplitude = local.pop(circuit.edge_labels[edge], 0)
+                    if abs(amplitude) >= threshold:
+                        emit(time + delays[node], edge, amplitude)
+                    else:
+                        state.truncated_probability += abs(amplitude) ** 2
+
+                # the remaining paths end at this node
+                for mode, amplitude in local.items():
+                    if abs(amplitude) >= threshold:
+                        key = (int(mode), int(time))
+                        state.amplitudes[key] = state.amplitudes.get(key, 0) + amplitude
+                    else:
+                        state.truncated_probability += abs(amplitude) ** 2
+
+        # the light still travelling after the last time bin
+        state.truncated_probability += sum(abs(amplitude) ** 2 for nodes in arrivals.values()
+                                           for local in nodes.values() for amplitude in local.values())
+
+        return state
+
+
+
+    def calculate_steady_state(self, wavelength: float = None, cell_pitch: float = CELL_PITCH, method: str = "lu",
+                               tolerance: float = 1e-10) -> State:
+        '''
+        Computes the steady state of a photon emitted by the first source, on any circuit including loops and ring cavities.
+
+        Every edge is a mode of its own. With S the scattering matrix of :meth:`Circuit.get_scattering_matrix`, P the diagonal of
+        the edge phases and b the amplitudes emitted by the source, the amplitudes leaving on every edge solve ``a = S P a + b``,
+        that is ``a = (I - S P)^-1 b``, which sums the light over all round trips through the loops. The sparse system is solved
+        with a sparse LU factorization or with the GMRES Krylov solver, so the matrix is never inverted or made dense.
+        Acyclic circuits give the same detector probabilities as :meth:`calculate_results`.
+
+        SciPy is only needed by this method and is imported when it is called.
+
+        :param wavelength: The wavelength in meters, giving every edge the propagation phase of :meth:`Circuit.get_edge_phases`.
+            Defaults to no propagation phase.
+        :type wavelength: float
+
+        :param cell_pitch: The size of a grid cell in meters.
+        :type cell_pitch: float
+
+        :param method: Either ``"lu"`` (sparse LU factorization) or ``"gmres"`` (iterative Krylov solver).
+        :type method: str
+
+        :param tolerance: The relative residual tolerance of the GMRES solver.
+        :type tolerance: float
+
+        :return: Returns a state holding the amplitude arriving at the end of every edge, to be read with ``edge_modes=True``.
+        :rtype: State
+        '''
+        assert method in ("lu", "gmres"), f"Unknown method {method}"
+
+        from scipy.sparse import coo_matrix, identity
+        from scipy.sparse.linalg import gmres, splu
+
+        circuit = self.get_circuit()
+        edges_count = circuit.get_edges_count()
+
+        phases = np.ones(edges_count, dtype=complex) if wavelength is None else circuit.get_edge_phases(wavelength, cell_pitch)[0]
+        rows, cols, values = circuit.get_scattering_matrix()
+        matrix = (identity(edges_count, dtype=complex, format="csc") -
+                  coo_matrix((values * phases[cols], (rows, cols)), shape=(edges_count, edges_count)).tocsc())
+
+        emitted = self.__get_emitted_amplitudes(circuit)
+        if method == "lu":
+            departing = splu(matrix).solve(emitted)
+        else:
+            departing, info = gmres(matrix, emitted, rtol=tolerance)
+            assert info == 0, f"GMRES did not converge ({info})"
+
+        return State(departing * phases)
+
+
+
+    def calculate_round_trips(self, max_time: int = None, wavelength: float = None, cell_pitch: float = CELL_PITCH,
+                              threshold: float = SPARSE_TRUNCATION_THRESHOLD) -> TimeBinState:
+        '''
+        Propagates a photon emitted by the first source at time 0 through any circuit including loops, resolved in time.
+
+        This is the bounded round-trip expansion of :meth:`calculate_steady_state`: light is scattered from edge to edge with the
+        scheduler of :meth:`calculate_time_bins`, every edge taking as many time bins as its grid length, so every round trip
+        through a loop leaves the loop in a later time bin. The expansion stops at ``max_time``, or once all amplitudes left
+        the circuit or dropped below the threshold.
+
+        :param max_time: The last time bin to simulate. Defaults to running until all light has left the setup.
+        :type max_time: int
+
+        :param wavelength: The wavelength in meters, giving every edge the propagation phase of :meth:`Circuit.get_edge_phases`.
+            Defaults to no propagation phase.
+        :type wavelength: float
+
+        :param cell_pitch: The size of a grid cell in meters.
+        :type cell_pitch: float
+
+        :param threshold: Amplitudes with a smaller magnitude are discarded.
+        :type threshold: float
+
+        :return: Returns the time-resolved state, keyed by the edges arriving at the detectors and walls, to be read with ``edge_modes=True``.
+        :rtype: TimeBinState
+        '''
+        circuit = self.get_circuit()
+        edges_count = circuit.get_edges_count()
+
+        phases = np.ones(edges_count, dtype=complex) if wavelength is None else circuit.get_edge_phases(wavelength, cell_pitch)[0]
+        delays = circuit.get_node_delays()
+
+        # outgoing edges and coefficients of every incoming edge
+        scattering = [[] for _ in range(edges_count)]
+        for row, col, value in zip(*circuit.get_scattering_matrix()):
+            scattering[col].append((row, value))
+
+        state = TimeBinState(edges_count)
+
+        # amplitudes arriving at the end of every edge, keyed by time, and a heap of their times
+        arrivals = defaultdict(lambda: defaultdict(complex))
+        times = []
+
+        def emit(departure, edge, amplitude):
+            arrival = departure + circuit.edge_weights[edge]
+            if arrival not in arrivals:
+                heapq.heappush(times, arrival)
+            arrivals[arrival][edge] += amplitude * phases[edge]
+
+        for edge, amplitude in enumerate(self.__get_emitted_amplitudes(circuit)):
+            if amplitude != 0:
+                emit(delays[circuit.edge_sources[edge]], edge, amplitude)
+
+        while times:
+            time = heapq.heappop(times)
+            if max_time is not None and time > max_time:
+                break
+
+            # all amplitudes arriving at the same time are scattered together
+            for edge, amplitude in arrivals.pop(time).items():
+                if abs(amplitude) < threshold:
+                    state.truncated_probability += abs(amplitude) ** 2
+                elif not scattering[edge]:
+                    key = (int(edge), int(time))
+                    state.amplitudes[key] = state.amplitudes.get(key, 0) + amplitude
+                else:
+                    departure = time + delays[circuit.edge_targets[edge]]
+                    for out_edge, coefficient in scattering[edge]:
+                        emit(departure, out_edge, coefficient * amplitude)
+
+        # the light still travelling after the last time bin
+        state.truncated_probability += sum(abs(amplitude) ** 2 for edges in arrivals.values() for amplitude in edges.values())
+
+        return state
+
+
+
+    def __get_emitted_amplitudes(self, circuit: Circuit) -> np.ndarray:
+        '''
+        This is an auxiliary method and is inteded for internal use only.
+
+        Returns the amplitude emitted by the first source (see :meth:`Circuit.get_first_source`) on every edge.
+
+        :param circuit: The compiled circuit of the graph.
+        :type circuit: Circuit
+
+        :return: Returns an array of amplitudes, one per edge.
+        :rtype: numpy.ndarray
+        '''
+        emitted = np.zeros(circuit.get_edges_count(), dtype=complex)
+        emitted[circuit.get_out_edges(circuit.get_first_source())] = 1
+
+        return emitted
+
+
+
+    def calculate_polarized(self, polarization: tuple = (1, 0)) -> PolarizedState:
+        '''
+        Propagates a polarized photon through the graph.
+
+        The state holds an N x 2 array of path and polarization amplitudes. Beam splitters and polarizing beam splitters act on its
+        path axis and wave plates, polarizers and rotators on its polarization axis, each touching only its own modes.
+
+        :param polarization: The normalized (horizontal, vertical) amplitudes of the photon emitted by the first source.
+        :type polarization: tuple
+
+        :return: Returns the final state.
+        :rtype: PolarizedState
+        '''
+        circuit = self.get_circuit()
+        assert circuit.acyclic, "The graph must be acyclic"
+
+        state = PolarizedState.from_path_modes(circuit.path_modes_count, polarization)
+        for kernel, modes, is_jones in circuit.get_polarization_kernels():
+            if is_jones:
+                state.apply_jones(kernel, modes)
+            else:
+                state.apply_kernel(kernel, modes)
+
+        return state
+
+
+
+    def calculate_losses(self) -> dict:
+        '''
+        Propagates a photon emitted by the first source (see :meth:`Circuit.get_first_source`) and returns a ledger of the probability
+        lost at every element.
+
+        Lossy elements (neutral density filters, beam blockers and mirrors with a reflectivity below 1) are applied as
+        non-unitary kernels on the path modes they touch, so no vacuum mode is added per loss point. The probability an element
+        loses is the decrease of the norm of its modes across its kernel. Light leaving the grid is listed under the wall it reaches.
+
+        :return: Returns a dictionary mapping the names of the elements losing light to the probability they lose.
+        :rtype: dict
+        '''
+        circuit = self.get_circuit()
+        assert circuit.acyclic, "The graph must be acyclic"
+
+        state = State.from_path_modes(circuit.path_modes_count)
+        ledger = defaultdict(float)
+
+        for node in circuit.order:
+            for kernel, modes in circuit.get_kernels([node]):
+                before = np.sum(np.abs(state.state_vector[modes]) ** 2)
+                state.apply_kernel(kernel, modes)
+                ledger[node] += before - np.sum(np.abs(state.state_vector[modes]) ** 2)
+
+        probabilities = state.get_probabilities()
+        for node in np.flatnonzero(circuit.node_types == GRID_WALL):
+            ledger[node] += np.sum(probabilities[np.unique(circuit.edge_labels[circuit.get_in_edges(node)])])
+
+        return {self.node_names[node]: float(lost) for node, lost in ledger.items() if lost > LOSS_THRESHOLD}
+
+
+
+    def calculate_density_matrix(self, polarization: tuple = (1, 0)) -> DensityMatrix:
+        '''
+        Propagates a polarized photon through the graph as a :class:`DensityMatrix`, so that dephasers and depolarizers can
+        turn it into a mixed state.
+
+        Every element acts in topological order: the kernels and Jones matrices of :meth:`calculate_polarized` are applied as
+        ``U rho U^dagger`` and the channels of the dephasers and depolarizers with their Kraus operators, each only on the rows and
+        columns of its own modes.
+
+        :param polarization: The normalized (horizontal, vertical) amplitudes of the photon emitted by the first source.
+        :type polarization: tuple
+
+        :return: Returns the final density matrix.
+        :rtype: DensityMatrix
+        '''
+        circuit = self.get_circuit()
+        assert circuit.acyclic, "The graph must be acyclic"
+
+        state = DensityMatrix.from_path_modes(circuit.path_modes_count, polarization)
+        for node in circuit.order:
+
+            for kernel, modes, is_jones in circuit.get_polarization_kernels([node]):
+                if is_jones:
+                    state.apply_jones(kernel, modes)
+                else:
+                    state.apply_kernel(kernel, modes)
+
+            for unitaries, probabilities, modes in circuit.get_channels([node]):
+                state.apply_channel(unitaries, probabilities, modes)
+
+        return state
+
+
+
+    def calculate_sparse(self, photons: list = None, threshold: float = SPARSE_TRUNCATION_THRESHOLD) -> SparseState:
+        '''
+        Propagates photons emitted by the sources of the graph as a :class:`SparseState`.
+
+        Every element kernel only rewrites the occupation patterns holding photons in its modes, so few-photon experiments on
+        layouts with many path modes are kept within the memory of the patterns actually reached.
+
+        :param photons: The number of photons emitted by every source, in the order of :meth:`Circuit.get_source_modes`.
+            Defaults to one photon per source.
+        :type photons: list
+
+        :param threshold: Amplitudes with a smaller magnitude are discarded after every kernel.
+        :type threshold: float
+
+        :return: Returns the final sparse state.
+        :rtype: SparseState
+        '''
+        circuit = self.get_circuit()
+        assert circuit.acyclic, "The graph must be acyclic"
+
+        source_modes = circuit.get_source_modes()
+        if photons is None:
+            photons = [1] * len(source_modes)
+        assert len(photons) == len(source_modes), f"Expected a number of photons for each of the {len(source_modes)} sources"
+
+        occupation = np.zeros(circuit.path_modes_count, dtype=int)
+        np.add.at(occupation, source_modes, photons)
+
+        state = SparseState.from_occupation(occupation, threshold)
+        for kernel, modes in circuit.get_kernels():
+            state.apply_kernel(kernel, modes)
+
+        return state
+
+
+
+
+
+
+#########################################################
+###############         Globals        ##################
+#########################################################
+
+# compiled transfer matrices, keyed by the fingerprints of their layouts
+transfer_matrices = LRUCache(TRANSFER_MATRIX_CACHE_SIZE)
+
+# port-to-port transfer matrices of sub-circuit blocks, keyed by the digests of their contents
+block_matrices = LRUCache(BLOCK_MATRIX_CACHE_SIZE)
@@ -0,0 +1,341 @@
+#######################################################
+##########         Notes for later        #############
+#######################################################
+
+
+
+
+
+#######################################################
+##############         Imports        #################
+#######################################################
+from model import *
+
+
+
+#########################################################
+##############         Constants        #################
+#########################################################
+
+# parameters that can be differentiated, with their default value, keyed by element type
+DIFFERENTIABLE_PARAMETERS = {BEAM_SPLITTER:   {"reflectivity": BEAM_SPLITTER_REFLECTIVITY},
+                             PHASE_DELAY:     {"phase": PHASE_DELAY_PHASE},
+                             NEUTRAL_DENSITY: {"transmission": NDF_TRANSMISSION},
+                             MIRROR:          {"reflectivity": MIRROR_REFLECTIVITY}}
+
+# range of the values of every parameter, which the optimizer never leaves
+PARAMETER_BOUNDS = {"reflectivity": (0.0, 1.0),
+                    "transmission": (0.0, 1.0),
+                    "phase":        (-np.inf, np.inf)}
+
+# margin kept from the ends of a bounded range, where the derivative of a square root amplitude diverges
+BOUNDS_MARGIN = 1e-9
+
+# default settings of the Adam optimizer
+LEARNING_RATE = 0.05
+OPTIMIZER_STEPS = 500
+ADAM_BETAS = (0.9, 0.999)
+ADAM_EPSILON = 1e-12
+
+
+
+#########################################################
+##############         Functions        #################
+#########################################################
+def kernel_derivative(node_type: int, name: str, value: float, modes_count: int = 1) -> np.ndarray:
+    '''
+    Returns the derivative of the local kernel of an element with respect to one of its parameters.
+
+    The derivatives are those of :func:`beam_splitter_kernel`, :func:`phase_kernel` and :func:`attenuation_kernel`. The value is
+    clipped to :data:`BOUNDS_MARGIN` inside the ends of its range in :data:`PARAMETER_BOUNDS`, so that the derivative stays finite
+    for a fully reflecting or fully transmitting element.
+
+    :param node_type: The type of the element.
+    :type node_type: int
+
+    :param name: The name of the parameter, as listed in :data:`DIFFERENTIABLE_PARAMETERS`.
+    :type name: str
+
+    :param value: The value of the parameter.
+    :type value: float
+
+    :param modes_count: The number of path modes passing through a lossy element.
+    :type modes_count: int
+
+    :return: Returns a complex matrix with the shape of the kernel.
+    :rtype: numpy.ndarray
+    '''
+    assert name in DIFFERENTIABLE_PARAMETERS.get(node_type, {}), f"The parameter {name} of an element of type {node_type} is not differentiable"
+
+    lower, upper = PARAMETER_BOUNDS[name]
+    value = float(np.clip(value, lower + BOUNDS_MARGIN, upper - BOUNDS_MARGIN))
+
+    if node_type == BEAM_SPLITTER:
+        return -0.5 / np.sqrt(1 - value) * np.array([[1,  0 ],
+                                                     [0,  1 ]], dtype=complex) + \
+                0.5 / np.sqrt(value)     * np.array([[0,  1j],
+                                                     [1j, 0 ]], dtype=complex)
+
+    if node_type == PHASE_DELAY:
+        return 1j * phase_kernel(value)
+
+    # the amplitude of a mirror or a neutral density filter scales with the square root of its power transmission
+    return 0.5 / np.sqrt(value) * np.eye(modes_count, dtype=complex)
+
+
+def get_parameters(graph: Graph, types: list = None) -> list:
+    '''
+    Returns the differentiable parameters of all elements of a graph.
+
+    :param graph: The graph of the optical setup.
+    :type graph: Graph
+
+    :param types: The element types whose parameters are returned. Defaults to all types of :data:`DIFFERENTIABLE_PARAMETERS`.
+    :type types: list
+
+    :return: Returns a list of (node name, parameter name) tuples, in the order the nodes were added.
+    :rtype: list
+    '''
+    types = DIFFERENTIABLE_PARAMETERS if types is None else types
+    circuit = graph.get_circuit()
+
+    return [(graph.node_names[node], name)
+            for node in range(circuit.get_nodes_count()) if circuit.node_types[node] in types
+            for name in DIFFERENTIABLE_PARAMETERS[circuit.node_types[node]]]
+
+
+def get_parameter_values(graph: Graph, parameters: list) -> np.ndarray:
+    '''
+    Returns the current values of parameters of a graph, falling back to the defaults of the element types.
+
+    :param graph: The graph of the optical setup.
+    :type graph: Graph
+
+    :param parameters: A list of (node name, parameter name) tuples.
+    :type parameters: list
+
+    :return: Returns an array of values, in the order of the parameters.
+    :rtype: numpy.ndarray
+    '''
+    values = []
+    for node_name, name in parameters:
+        node = graph.node_ids[node_name]
+        values.append(graph.node_elements[node].params.get(name, DIFFERENTIABLE_PARAMETERS[graph.node_types[node]][name]))
+
+    return np.array(values, dtype=float)
+
+
+def target_probabilities_loss(graph: Graph, target: np.ndarray):
+    '''
+    Returns a loss measuring the squared distance between the detector probabilities of a state and target probabilities.
+
+    :param graph: The graph of the optical setup.
+    :type graph: Graph
+
+    :param target: The target probability of every detector, ordered as :meth:`Graph.get_detectors`.
+    :type target: numpy.ndarray
+
+    :return: Returns a loss function, as accepted by :func:`calculate_gradient`.
+    :rtype: Callable
+    '''
+    detector_modes = graph.get_circuit().get_detector_modes()
+    target = np.asarray(target, dtype=float)
+    assert len(target) == len(detector_modes), f"Expected a target probability for each of the {len(detector_modes)} detectors"
+
+    def loss(state_vector: np.ndarray) -> tuple[float, np.ndarray]:
+        adjoint = np.zeros_like(state_vector)
+        value = 0.0
+        for detector, modes in enumerate(detector_modes):
+            error = np.sum(np.abs(state_vector[modes])**2) - target[detector]
+            value += error**2
+            adjoint[modes] += 2 * error * state_vector[modes]
+
+        return value, adjoint
+
+    return loss
+
+
+def weighted_probabilities_loss(graph: Graph, weights: np.ndarray):
+    '''
+    Returns a loss weighting the detector probabilities of a state, whose gradient is the weighted sum of the gradients of the
+    probabilities. A single weight of 1 gives the gradient of the probability of one detector.
+
+    :param graph: The graph of the optical setup.
+    :type graph: Graph
+
+    :param weights: The weight of every detector, ordered as :meth:`Graph.get_detectors`.
+    :type weights: numpy.ndarray
+
+    :return: Returns a loss function, as accepted by :func:`calculate_gradient`.
+    :rtype: Callable
+    '''
+    detector_modes = graph.get_circuit().get_detector_modes()
+    weights = np.asarray(weights, dtype=float)
+    assert len(weights) == len(detector_modes), f"Expected a weight for each of the {len(detector_modes)} detectors"
+
+    def loss(state_vector: np.ndarray) -> tuple[float, np.ndarray]:
+        adjoint = np.zeros_like(state_vector)
+        for detector, modes in enumerate(detector_modes):
+            adjoint[modes] += weights[detector] * state_vector[modes]
+
+        return float(np.real(np.vdot(state_vector, adjoint))), adjoint
+
+    return loss
+
+
+def fidelity_loss(target_state: np.ndarray):
+    '''
+    Returns the infidelity ``1 - |<target|state>|^2`` between a state and a target state of the path modes.
+
+    :param target_state: The normalized target state vector.
+    :type target_state: numpy.ndarray
+
+    :return: Returns a loss function, as accepted by :func:`calculate_gradient`.
+    :rtype: Callable
+    '''
+    target_state = np.asarray(target_state, dtype=complex)
+
+    def loss(state_vector: np.ndarray) -> tuple[float, np.ndarray]:
+        overlap = np.vdot(target_state, state_vector)
+        return 1 - abs(overlap)**2, -overlap * target_state
+
+    return loss
+
+
+def calculate_gradient(graph: Graph, loss, parameters: list = None, values: np.ndarray = None) -> tuple[float, np.ndarray, np.ndarray]:
+    '''
+    Computes a real loss over the final state of a graph and its gradient with respect to element parameters, with the adjoint method.
+
+    The forward pass applies the kernels in topological order, as the kernel backend of :meth:`Graph.calculate_results`, and keeps the
+    amplitudes entering every differentiated element. The reverse pass starts from the derivative of the loss with respect to the
+    conjugate final amplitudes and pulls it back through the conjugate transposes of the kernels. The derivative with respect to a
+    parameter of an element is then ``2 Re(adjoint^H dK/dp input)`` on the modes of the element, so the whole gradient costs about two
+    simulations, whatever the number of parameters.
+
+    :param graph: The graph of the optical setup, which must be acyclic.
+    :type graph: Graph
+
+    :param loss: A function of the final state vector returning a tuple of the loss and its derivative with respect to the conjugate
+        amplitudes, such as those returned by :func:`target_probabilities_loss`, :func:`weighted_probabilities_loss` or :func:`fidelity_loss`.
+    :type loss: Callable
+
+    :param parameters: A list of (node name, parameter name) tuples. Defaults to all parameters returned by :func:`get_parameters`.
+    :type parameters: list
+
+    :param values: The values of the parameters at which the gradient is evaluated. Defaults to the current values of the graph.
+    :type values: numpy.ndarray
+
+    :return: Returns a tuple of the loss, the final state vector and the gradient, in the order of the parameters.
+    :rtype: tuple[float, numpy.ndarray, numpy.ndarray]
+    '''
+    circuit = graph.get_circuit()
+    assert circuit.acyclic, "The graph must be acyclic"
+
+    if parameters is None:
+        parameters = get_parameters(graph)
+    if values is None:
+        values = get_parameter_values(graph, parameters)
+    assert len(values) == len(parameters), f"Expected a value for each of the {len(parameters)} parameters"
+
+    # overriding parameters of the kernels, and the parameters differentiated at every node
+    overrides = defaultdict(dict)
+    indices = defaultdict(list)
+    for index, (node_name, name) in enumerate(parameters):
+        node = graph.node_ids[node_name]
+        assert name in DIFFERENTIABLE_PARAMETERS.get(circuit.node_types[node], {}), f"The parameter {name} of {node_name} is not differentiable"
+
+        overrides[node][name] = float(values[index])
+        indices[node].append(index)
+
+    # forward pass, keeping the kernels and the amplitudes entering the differentiated elements
+    state = State.from_path_modes(circuit.path_modes_count)
+    tape = []
+    for node in circuit.order:
+        kernels = list(circuit.get_kernels([node], overrides))
+        if not kernels and node not in indices:
+            continue
+
+        modes = circuit.edge_labels[circuit.get_out_edges(node)]
+        inputs = state.state_vector[modes].copy() if node in indices else None
+        for kernel, kernel_modes in kernels:
+            state.apply_kernel(kernel, kernel_modes)
+
+        tape.append((node, kernels, modes, inputs))
+
+    value, adjoint = loss(state.state_vector.copy())
+    adjoint = np.array(adjoint, dtype=complex)
+
+    # reverse pass, the adjoint holding the derivative of the loss with respect to the conjugate amplitudes after the node
+    gradient = np.zeros(len(parameters))
+    for node, kernels, modes, inputs in reversed(tape):
+        for index in indices.get(node, ()):
+            derivative = kernel_derivative(circuit.node_types[node], parameters[index][1], float(values[index]), len(modes))
+            gradient[index] = 2 * np.real(np.vdot(adjoint[modes], derivative @ inputs))
+
+        for kernel, kernel_modes in reversed(kernels):
+            adjoint[kernel_modes] = kernel.conj().T @ adjoint[kernel_modes]
+
+    return float(value), state.state_vector, gradient
+
+
+def optimize_parameters(graph: Graph, loss, parameters: list = None, steps: int = OPTIMIZER_STEPS, learning_rate: float = LEARNING_RATE,
+                        tolerance: float = None) -> tuple[dict, np.ndarray]:
+    '''
+    Minimizes a loss over the final state of a graph with the Adam optimizer, using the gradients of :func:`calculate_gradient`.
+
+    Bounded parameters (reflectivities and transmissions) are clipped to their range after every step. The best values found are
+    written back to the elements of the graph with :meth:`Graph.set_params`, and so to the layout the graph was built from.
+
+    :param graph: The graph of the optical setup, which must be acyclic.
+    :type graph: Graph
+
+    :param loss: The loss function, as accepted by :func:`calculate_gradient`.
+    :type loss: Callable
+
+    :param parameters: A list of (node name, parameter name) tuples to optimize. Defaults to all parameters returned by :func:`get_parameters`.
+    :type parameters: list
+
+    :param steps: The maximum number of steps.
+    :type steps: int
+
+    :param learning_rate: The step size of the optimizer.
+    :type learning_rate: float
+
+    :param tolerance: The optimization stops once the loss falls below this value, if given.
+    :type tolerance: float
+
+    :return: Returns a tuple of a dictionary mapping every (node name, parameter name) tuple to its best value, and the loss at every step.
+    :rtype: tuple[dict, numpy.ndarray]
+    '''
+    if parameters is None:
+        parameters = get_parameters(graph)
+
+    values = get_parameter_values(graph, parameters)
+    lower = np.array([PARAMETER_BOUNDS[name][0] + BOUNDS_MARGIN for _, name in parameters])
+    upper = np.array([PARAMETER_BOUNDS[name][1] - BOUNDS_MARGIN for _, name in parameters])
+    values = np.clip(values, lower, upper)
+
+    first_moment = np.zeros(len(parameters))
+    second_moment = np.zeros(len(parameters))
+    best_value, best_values = np.inf, values.copy()
+
+    history = []
+    for step in range(1, steps + 1):
+        value, _, gradient = calculate_gradient(graph, loss, parameters, values)
+        history.append(value)
+
+        if value < best_value:
+            best_value, best_values = value, values.copy()
+        if tolerance is not None and value <= tolerance:
+            break
+
+        first_moment = ADAM_BETAS[0] * first_moment + (1 - ADAM_BETAS[0]) * gradient
+        second_moment = ADAM_BETAS[1] * second_moment + (1 - ADAM_BETAS[1]) * gradient**2
+        step_size = learning_rate * np.sqrt(1 - ADAM_BETAS[1]**step) / (1 - ADAM_BETAS[0]**step)
+
+        values = np.clip(values - step_size * first_moment / (np.sqrt(second_moment) + ADAM_EPSILON), lower, upper)
+
+    for (node_name, name), value in zip(parameters, best_values):
+        graph.set_params(node_name, **{name: float(value)})
+
+    return dict(zip(parameters, best_values.tolist())), np.array(history)
@@ -0,0 +1,190 @@
+#######################################################
+##########         Notes for later        #############
+#######################################################
+
+
+
+
+
+#######################################################
+##############         Imports        #################
+#######################################################
+from concurrent.futures import ProcessPoolExecutor
+from fock import *
+
+
+
+#########################################################
+##############         Constants        #################
+#########################################################
+
+# maximum number of shots drawn at once, bounding the memory of a sampler
+SHOTS_PER_CHUNK = 1 << 20
+
+
+
+#########################################################
+##############         Functions        #################
+#########################################################
+def single_photon_outcomes(graph: Graph, state: State) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns the possible detector counts of a single photon and their probabilities.
+
+    The photon arrives at one detector, or at none of them if it leaves the setup through a wall.
+
+    :param graph: The graph of the optical setup.
+    :type graph: Graph
+
+    :param state: The final single-photon state of the graph.
+    :type state: State
+
+    :return: Returns a tuple of a (D + 1) x D array of detector counts, ordered as :meth:`Graph.get_detectors`, and the probability of every row.
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    '''
+    probabilities = graph.get_detector_probabilities(state)
+    detectors_count = len(probabilities)
+
+    outcomes = np.vstack([np.eye(detectors_count, dtype=np.int64), np.zeros((1, detectors_count), dtype=np.int64)])
+    probabilities = np.append(probabilities, max(0.0, 1 - np.sum(probabilities)))
+
+    return outcomes, probabilities
+
+
+def multi_photon_outcomes(graph: Graph, amplitudes: dict) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns the possible detector counts of a multi-photon state and their probabilities.
+
+    :param graph: The graph of the optical setup.
+    :type graph: Graph
+
+    :param amplitudes: The output amplitudes returned by :func:`calculate_multi_photon`.
+    :type amplitudes: dict
+
+    :return: Returns a tuple of a K x D array of detector counts, ordered as :meth:`Graph.get_detectors`, and the probability of every row.
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    '''
+    count_probabilities = get_detector_count_probabilities(graph, amplitudes)
+    detectors_count = len(graph.get_detectors())
+
+    outcomes = np.array(list(count_probabilities.keys()), dtype=np.int64).reshape(-1, detectors_count)
+    probabilities = np.array(list(count_probabilities.values()))
+
+    return outcomes, probabilities
+
+
+def sample_detectors(outcomes: np.ndarray, probabilities: np.ndarray, shots: int, rng: np.random.Generator,
+                     efficiency=1.0, dark_count_probability=0.0, resolving: bool = False) -> np.ndarray:
+    '''
+    Draws shot-by-shot detector records from a distribution of ideal detector counts.
+
+    Every shot draws an outcome, keeps every photon with the detector efficiency and adds a dark count with the dark count
+    probability. All shots of a chunk are drawn with a few vectorized calls.
+
+    :param outcomes: A K x D array of ideal photon counts at the D detectors.
+    :type outcomes: numpy.ndarray
+
+    :param probabilities: The probability of every outcome.
+    :type probabilities: numpy.ndarray
+
+    :param shots: The number of shots.
+    :type shots: int
+
+    :param rng: The random generator.
+    :type rng: numpy.random.Generator
+
+    :param efficiency: The probability that a photon arriving at a detector is registered, for all detectors or per detector.
+    :type efficiency: float | numpy.ndarray
+
+    :param dark_count_probability: The probability of a dark count in one shot, for all detectors or per detector.
+    :type dark_count_probability: float | numpy.ndarray
+
+    :param resolving: :literal:`True` for photon-number-resolving detectors, which record counts, or :literal:`False` for threshold
+        detectors, which only record clicks.
+    :type resolving: bool
+
+    :return: Returns a shots x D array of counts, or of clicks (0 or 1) for threshold detectors.
+    :rtype: numpy.ndarray
+    '''
+    probabilities = np.asarray(probabilities, dtype=float)
+    cumulative = np.cumsum(probabilities / np.sum(probabilities))
+
+    records = np.empty((shots, outcomes.shape[1]), dtype=np.int64 if resolving else np.uint8)
+    for start in range(0, shots, SHOTS_PER_CHUNK):
+        stop = min(start + SHOTS_PER_CHUNK, shots)
+
+        # draw the ideal outcomes by inverting the cumulative distribution
+        indices = np.minimum(np.searchsorted(cumulative, rng.random(stop - start), side="right"), len(cumulative) - 1)
+        counts = outcomes[indices]
+
+        # lose photons at the detectors, then add the dark counts
+        if np.any(np.asarray(efficiency) < 1):
+            counts = rng.binomial(counts, efficiency)
+        if np.any(np.asarray(dark_count_probability) > 0):
+            counts = counts + (rng.random(counts.shape) < dark_count_probability)
+
+        records[start:stop] = counts if resolving else counts > 0
+
+    return records
+
+
+def sample_detectors_parallel(outcomes: np.ndarray, probabilities: np.ndarray, shots: int, workers: int = 1, seed: int = None,
+                              efficiency=1.0, dark_count_probability=0.0, resolving: bool = False) -> np.ndarray:
+    '''
+    Draws shot-by-shot detector records in a pool of processes, with reproducible random streams.
+
+    The shots are split evenly among the workers, and every worker draws from its own generator seeded with a child of
+    ``numpy.random.SeedSequence(seed)``. The records are concatenated in worker order, so a given seed and number of workers
+    always give the same records.
+
+    :param outcomes: A K x D array of ideal photon counts at the D detectors.
+    :type outcomes: numpy.ndarray
+
+    :param probabilities: The probability of every outcome.
+    :type probabilities: numpy.ndarray
+
+    :param shots: The total number of shots.
+    :type shots: int
+
+    :param workers: The number of worker processes.
+    :type workers: int
+
+    :param seed: The root seed. A random root seed is drawn from the operating system if none is given.
+    :type seed: int
+
+    :param efficiency: The detector efficiency, as in :func:`sample_detectors`.
+    :type efficiency: float | numpy.ndarray
+
+    :param dark_count_probability: The dark count probability per shot, as in :func:`sample_detectors`.
+    :type dark_count_probability: float | numpy.ndarray
+
+    :param resolving: :literal:`True` for photon-number-resolving detectors, as in :func:`sample_detectors`.
+    :type resolving: bool
+
+    :return: Returns a shots x D array of counts or clicks.
+    :rtype: numpy.ndarray
+    '''
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    worker_shots = [shots // workers + (worker < shots % workers) for worker in range(workers)]
+
+    arguments = [(outcomes, probabilities, worker_shots[worker], np.random.default_rng(seeds[worker]),
+                  efficiency, dark_count_probability, resolving) for worker in range(workers)]
+
+    if workers == 1:
+        return sample_detectors(*arguments[0])
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return np.concatenate(list(executor.map(sample_detectors, *zip(*arguments))))
+
+
+def count_records(records: np.ndarray) -> dict:
+    '''
+    Counts the occurrences of every detector pattern in a set of shot records.
+
+    :param records: A shots x D array of counts or clicks.
+    :type records: numpy.ndarray
+
+    :return: Returns a dictionary mapping every recorded pattern, as a tuple, to its number of shots.
+    :rtype: dict
+    '''
+    patterns, counts = np.unique(records, axis=0, return_counts=True)
+    return {tuple(pattern.tolist()): int(count) for pattern, count in zip(patterns, counts)}
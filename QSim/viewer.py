@@ -18,6 +18,7 @@ from matplotlib.backends.backend_qt5agg import (
 from matplotlib.figure import Figure
 import numpy as np
 from typing import Union, Callable
+from layout import *
 
 
 
@@ -46,6 +47,18 @@ BEAM_SPLITTER_ICON = "images/beam_splitter.png"
 MIRROR_ICON = "images/mirror.png"
 POLAR_BEAM_SPLITTER_ICON = "images/polarizing_beam_splitter.png"
 MIRROR_ICON = "images/mirror.png"
+SPDC_ICON = "images/SPDC.png"
+HALF_WAVE_PLATE_ICON = "images/HWP.png"
+QUARTER_WAVE_PLATE_ICON = "images/QWP.png"
+POLARIZER_ICON = "images/Polarizer.png"
+ROTATOR_ICON = "images/Rotator.png"
+TIME_DELAY_ICON = "images/TimeDelay.png"
+PHASE_DELAY_ICON = "images/PhaseDelay.png"
+DEPHASER_ICON = "images/Dephaser.png"
+DEPOLARIZER_ICON = "images/Depolarizer.png"
+NDF_ICON = "images/NDF.png"
+BEAM_BLOCKER_ICON = "images/BeamBlocker.png"
+PHASE_RETARDER_ICON = "images/PhaseRetarder.png"
 
 
 # display text
@@ -55,6 +68,18 @@ BEAM_SPLITTER_TEXT = "Beam Splitter"
 MIRROR_TEXT = "Mirror"
 POLAR_BEAM_SPLITTER_TEXT = "Polarizing Beam Splitter"
 MIRROR_TEXT = "Mirror"
+SPDC_TEXT = "SPDC Source"
+HALF_WAVE_PLATE_TEXT = "Half-Wave Plate"
+QUARTER_WAVE_PLATE_TEXT = "Quarter-Wave Plate"
+POLARIZER_TEXT = "Polarizer"
+ROTATOR_TEXT = "Polarization Rotator"
+TIME_DELAY_TEXT = "Time Delay"
+PHASE_DELAY_TEXT = "Phase Delay"
+DEPHASER_TEXT = "Dephaser"
+DEPOLARIZER_TEXT = "Depolarizer"
+NDF_TEXT = "Neutral Density Filter"
+BEAM_BLOCKER_TEXT = "Beam Blocker"
+PHASE_RETARDER_TEXT = "Phase Retarder"
 
 
 
@@ -500,8 +525,11 @@ class GridItem(QPushButton):
 
     Inherits from ``QPushButton`` to obtain button behavior.
 
+    The item is a view of a plain :class:`Element` record. Its row, column and orientation are read from and written to the record.
+
     Attributes:
         type (): The type of this grid item (e.g. Laser, Beamsplitter, Mirror, etc.).
+        element (Element): The record of the optical element shown by this item.
     '''
 
     def __init__(self, type, **kwargs) -> None:
@@ -516,7 +544,7 @@ class GridItem(QPushButton):
         '''
         super().__init__(**kwargs)
 
-        self.orientation = 0
+        self.element = Element(type)
         self.type = type
 
         # set icon
@@ -536,6 +564,31 @@ class GridItem(QPushButton):
         self.clicked.connect(self.rotate)
 
 
+    @property
+    def row(self) -> int:
+        return self.element.row
+
+    @row.setter
+    def row(self, row: int) -> None:
+        self.element.row = row
+
+    @property
+    def col(self) -> int:
+        return self.element.col
+
+    @col.setter
+    def col(self, col: int) -> None:
+        self.element.col = col
+
+    @property
+    def orientation(self) -> int:
+        return self.element.orientation
+
+    @orientation.setter
+    def orientation(self, orientation: int) -> None:
+        self.element.orientation = orientation
+
+
     def rotate(self) -> None:
         '''
         Rotates the item by 45 degrees on the screen.
@@ -565,7 +618,14 @@ class GridItem(QPushButton):
 
 
             # detach this item from its containing cell
-            self.setParent(None)
+            cell = self.parentWidget()
+            if isinstance(cell, GridCell):
+                cell.take_item()
+
+                # notify the grid that the cell was emptied
+                cell.cellChanged.emit(cell.row, cell.col)
+            else:
+                self.setParent(None)
 
             # register this object as being currently dragged
             global dragged_item
@@ -588,9 +648,15 @@ class GridItem(QPushButton):
 
     def get_next_orient(self, orientation: int) -> list:
         '''
-        DEPRECATED
+        Returns the directions in which light leaves the item, given the direction in which it travels when it enters.
+
+        Args:
+            orientation (int): The direction of travel of the incoming light.
+
+        Returns:
+            list: The outgoing directions, as given by :meth:`Element.get_next_orient`.
         '''
-        return []
+        return self.element.get_next_orient(orientation)
     
 
 class GridWall(GridItem):
@@ -615,8 +681,7 @@ class GridWall(GridItem):
             None: This method does not return anything.
         '''
 
-        self.row = row
-        self.col = col
+        self.element = Element(GridWall.__name__, row, col)
 
 
 class Laser(GridItem):
@@ -635,14 +700,17 @@ class Laser(GridItem):
         super().__init__(Laser.__name__, **kwargs)
 
 
-    def get_next_orient(self, orientation: int) -> list:
+class SPDC(GridItem):
+    '''
+    Represents a spontaneous parametric down-conversion source within the grid, emitting squeezed light.
+
+    Inherits from ``GridItem`` and extends functionality to achieve the appearance and behavior of an SPDC source.
+    '''
+    def __init__(self, **kwargs) -> None:
         '''
-        DEPRECATED
+        Initializes a ``SPDC`` instance.
         '''
-        if self.orientation == orientation:
-            return [orientation]
-        else:
-            return []
+        super().__init__(SPDC.__name__, **kwargs)
 
 
 class Detector(GridItem):
@@ -670,13 +738,6 @@ class BeamSplitter(GridItem):
         '''
         super().__init__(BeamSplitter.__name__, **kwargs)
 
-    def get_next_orient(self, orientation: int):
-        '''
-        DEPRECATED
-        '''
-        reflected_orientation = (orientation + pow(-1, (self.orientation&1)+(orientation&1)) + 4) % 4
-        return [orientation, reflected_orientation]
-
 
 class PolarBeamSplitter(BeamSplitter):
     '''
@@ -702,12 +763,149 @@ class Mirror(GridItem):
         '''
         Initializes a ``BeamSplitter`` instance.
         '''
-    def get_next_orient(self, orientation: int):
+
+class HWP(GridItem):
+    '''
+    Represents a half-wave plate within the grid, acting only on the polarization of the light passing through it.
+
+    Inherits from ``GridItem`` and extends functionality to achieve the appearance and behavior of a half-wave plate.
+    '''
+    def __init__(self, **kwargs) -> None:
+        '''
+        Initializes a ``HWP`` instance.
+        '''
+        super().__init__(HWP.__name__, **kwargs)
+
+
+class QWP(GridItem):
+    '''
+    Represents a quarter-wave plate within the grid, acting only on the polarization of the light passing through it.
+
+    Inherits from ``GridItem`` and extends functionality to achieve the appearance and behavior of a quarter-wave plate.
+    '''
+    def __init__(self, **kwargs) -> None:
+        '''
+        Initializes a ``QWP`` instance.
+        '''
+        super().__init__(QWP.__name__, **kwargs)
+
+
+class Polarizer(GridItem):
+    '''
+    Represents a polarizer within the grid, acting only on the polarization of the light passing through it.
+
+    Inherits from ``GridItem`` and extends functionality to achieve the appearance and behavior of a polarizer.
+    '''
+    def __init__(self, **kwargs) -> None:
+        '''
+        Initializes a ``Polarizer`` instance.
+        '''
+        super().__init__(Polarizer.__name__, **kwargs)
+
+
+class Rotator(GridItem):
+    '''
+    Represents a polarization rotator within the grid, acting only on the polarization of the light passing through it.
+
+    Inherits from ``GridItem`` and extends functionality to achieve the appearance and behavior of a polarization rotator.
+    '''
+    def __init__(self, **kwargs) -> None:
+        '''
+        Initializes a ``Rotator`` instance.
+        '''
+        super().__init__(Rotator.__name__, **kwargs)
+
+
+class TimeDelay(GridItem):
+    '''
+    Represents a time delay line within the grid, holding back the light passing through it by a number of time bins.
+
+    Inherits from ``GridItem`` and extends functionality to achieve the appearance and behavior of a time delay line.
+    '''
+    def __init__(self, **kwargs) -> None:
+        '''
+        Initializes a ``TimeDelay`` instance.
+        '''
+        super().__init__(TimeDelay.__name__, **kwargs)
+
+
+class PhaseDelay(GridItem):
+    '''
+    Represents a phase delay within the grid, shifting the phase of the light passing through it.
+
+    Inherits from ``GridItem`` and extends functionality to achieve the appearance and behavior of a phase delay.
+    '''
+    def __init__(self, **kwargs) -> None:
+        '''
+        Initializes a ``PhaseDelay`` instance.
         '''
-        DEPRECATED
+        super().__init__(PhaseDelay.__name__, **kwargs)
+
+
+class Dephaser(GridItem):
+    '''
+    Represents a dephaser within the grid, randomizing the phase of the light passing through it.
+
+    Inherits from ``GridItem`` and extends functionality to achieve the appearance and behavior of a dephaser.
+    '''
+    def __init__(self, **kwargs) -> None:
+        '''
+        Initializes a ``Dephaser`` instance.
+        '''
+        super().__init__(Dephaser.__name__, **kwargs)
+
+
+class Depolarizer(GridItem):
+    '''
+    Represents a depolarizer within the grid, randomizing the polarization of the light passing through it.
+
+    Inherits from ``GridItem`` and extends functionality to achieve the appearance and behavior of a depolarizer.
+    '''
+    def __init__(self, **kwargs) -> None:
+        '''
+        Initializes a ``Depolarizer`` instance.
+        '''
+        super().__init__(Depolarizer.__name__, **kwargs)
+
+
+class NDF(GridItem):
+    '''
+    Represents a neutral density filter within the grid, attenuating the light passing through it.
+
+    Inherits from ``GridItem`` and extends functionality to achieve the appearance and behavior of a neutral density filter.
+    '''
+    def __init__(self, **kwargs) -> None:
+        '''
+        Initializes a ``NDF`` instance.
+        '''
+        super().__init__(NDF.__name__, **kwargs)
+
+
+class BeamBlocker(GridItem):
+    '''
+    Represents a beam blocker within the grid, absorbing all light reaching it.
+
+    Inherits from ``GridItem`` and extends functionality to achieve the appearance and behavior of a beam blocker.
+    '''
+    def __init__(self, **kwargs) -> None:
+        '''
+        Initializes a ``BeamBlocker`` instance.
+        '''
+        super().__init__(BeamBlocker.__name__, **kwargs)
+
+
+class PhaseRetarder(GridItem):
+    '''
+    Represents a phase retarder within the grid, delaying one polarization of the light passing through it by its retardance.
+
+    Inherits from ``GridItem`` and extends functionality to achieve the appearance and behavior of a phase retarder.
+    '''
+    def __init__(self, **kwargs) -> None:
         '''
-        reflected_orientation = (orientation + pow(-1, (self.orientation&1)+(orientation&1)) + 4) % 4
-        return [reflected_orientation]
+        Initializes a ``PhaseRetarder`` instance.
+        '''
+        super().__init__(PhaseRetarder.__name__, **kwargs)
+
 
 class GridCell(QFrame):
     '''
@@ -718,7 +916,14 @@ class GridCell(QFrame):
     Attributes:
         row (int): stores the row of the cell within the grid.
         col (int): stores the col of the cell within the grid.
+        cellChanged (pyqtSignal): emitted with the row and col of the cell when an item is dropped on it or dragged out of it.
+        itemAdded (pyqtSignal): emitted with the item whenever an item is added to the cell.
+        itemRemoved (pyqtSignal): emitted with the item whenever an item is removed from the cell.
     '''
+    cellChanged = pyqtSignal(int, int)
+    itemAdded = pyqtSignal(object)
+    itemRemoved = pyqtSignal(object)
+
     def __init__(self, row, col, **kwargs) -> None:
         '''
         Initializes a ``GridCell`` instance.
@@ -796,6 +1001,9 @@ class GridCell(QFrame):
         # add the new element 
         self.add_item(newItem)
 
+        # notify the grid of the new item
+        self.cellChanged.emit(self.row, self.col)
+
 
         # no idea what this does, but all people use it
         event.acceptProposedAction()
@@ -824,8 +1032,24 @@ class GridCell(QFrame):
         '''
         while self.myLayout.count():
             currentItem = self.myLayout.takeAt(0)
+            self.itemRemoved.emit(currentItem.widget())
             currentItem.widget().deleteLater()
 
+    def take_item(self) -> Union[None, GridItem]:
+        '''
+        Detaches the current ``GridItem`` held by the cell without deleting it, e.g. to move it to another cell.
+
+        :return: The detached item if the cell held one, otherwise returns ``None``.
+        :rtype: GridItem | None
+        '''
+        item = self.get_item()
+        if item:
+            self.myLayout.removeWidget(item)
+            item.setParent(None)
+            self.itemRemoved.emit(item)
+
+        return item
+
     def add_item(self, item:GridItem) -> None:
         '''
         Adds a ``GridItem`` (or one of its children) to the cell.
@@ -839,6 +1063,7 @@ class GridCell(QFrame):
         item.row = self.row
         item.col = self.col
         self.myLayout.addWidget(item)
+        self.itemAdded.emit(item)
 
 
 class GridArea(QWidget):
@@ -855,7 +1080,18 @@ class GridArea(QWidget):
 
     :ivar photon: A photon that is used for visualizing simulations.
     :vartype photon: Photon
+
+    :ivar cellChanged: Emitted with the row and column of a cell when an item is dropped on it or dragged out of it.
+    :vartype cellChanged: pyqtSignal
+
+    :ivar placedItems: The items placed on the grid, keyed by their (row, column) position.
+    :vartype placedItems: dict
+
+    :ivar layout: The layout of the element records of the placed items, which indexes them by position and by type.
+    :vartype layout: Layout
     '''
+    cellChanged = pyqtSignal(int, int)
+
     def __init__(self, **kwargs) -> None:
         '''
         Initializes a :class:`GridArea` instance.
@@ -873,6 +1109,10 @@ class GridArea(QWidget):
         self.rows = GRID_ROWS
         self.cols = GRID_COLS
 
+        # placed items and the layout of their records, updated whenever an item is added to or removed from a cell
+        self.placedItems = {}
+        self.elementLayout = Layout(self.rows, self.cols)
+
         # set GridArea attributes
         self.setAutoFillBackground(True)
         palette = self.palette()
@@ -885,7 +1125,19 @@ class GridArea(QWidget):
                                 Detector,
                                 BeamSplitter,
                                 PolarBeamSplitter,
-                                Mirror)
+                                Mirror,
+                                SPDC,
+                                HWP,
+                                QWP,
+                                Polarizer,
+                                Rotator,
+                                TimeDelay,
+                                PhaseDelay,
+                                Dephaser,
+                                Depolarizer,
+                                NDF,
+                                BeamBlocker,
+                                PhaseRetarder)
 
 
         # set the grid layout
@@ -909,7 +1161,42 @@ class GridArea(QWidget):
         '''
         for row in range(rows):
             for col in range(cols):
-                self.myLayout.addWidget(GridCell(row, col), row, col)
+                cell = GridCell(row, col)
+                cell.cellChanged.connect(self.cellChanged)
+                cell.itemAdded.connect(self.register_item)
+                cell.itemRemoved.connect(self.unregister_item)
+                self.myLayout.addWidget(cell, row, col)
+
+
+    def register_item(self, item: GridItem) -> None:
+        '''
+        Records an item added to the grid, and places its element in the layout.
+
+        :param item: The added item, with its row and column already set.
+        :type item: GridItem
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        self.placedItems[(item.row, item.col)] = item
+        self.elementLayout.add_element(item.element)
+
+
+    def unregister_item(self, item: GridItem) -> None:
+        '''
+        Forgets an item taken out of the grid, and removes its element from the layout.
+
+        :param item: The removed item, with the row and column of the cell it was taken from.
+        :type item: GridItem
+
+        :return: This method does not return anything.
+        :rtype: None
+        '''
+        if self.placedItems.get((item.row, item.col)) is not item:
+            return
+
+        del self.placedItems[(item.row, item.col)]
+        self.elementLayout.remove_element(item.element)
 
 
     def get_item_at(self, row: int, col: int) -> Union[GridItem,None]: 
@@ -928,10 +1215,31 @@ class GridArea(QWidget):
         if row >= self.rows or row < 0 or col >= self.cols or col < 0:
             return None
         
-        grid_cell: GridCell = self.myLayout.itemAtPosition(row, col).widget()
-        item: GridItem = grid_cell.get_item()
+        return self.placedItems.get((row, col))
 
-        return item
+
+    def get_next_item_in_dir(self, row: int, col: int, orientation: int) -> tuple[Union[GridItem,None], tuple[int, int]]:
+        '''
+        Returns the first item met when travelling from a cell in a given direction.
+
+        The search is a binary search in the spatial index of the layout, and never touches the grid's widgets.
+
+        :param row: The row number of the starting cell.
+        :type row: int
+
+        :param col: The column number of the starting cell.
+        :type col: int
+
+        :param orientation: The direction of travel (0: right, 1: down, 2: left, 3: up).
+        :type orientation: int
+
+        :return: Returns a tuple of the item found (or None) and its position in the form (row, column). If no item is found,
+            the position is that of the first cell outside the grid.
+        :rtype: tuple[GridItem | None, tuple[int, int]]
+        '''
+        _, position = self.elementLayout.get_next_element_in_dir(row, col, orientation)
+
+        return self.placedItems.get(position), position
 
     def get_items_by_type(self, type:type) -> list:
         '''
@@ -946,17 +1254,41 @@ class GridArea(QWidget):
         # check the validity of the item type
         assert type in self.allowedItemTypes, "Not an allowed item type"
 
-        items = []
-        for r in range(self.rows):
-            for c in range(self.cols):
-            
-                grid_cell = self.myLayout.itemAtPosition(r, c).widget()
-                item = grid_cell.get_item()
+        # gather the elements of the given type and its subclasses, in the row-by-row order of a grid traversal
+        elements = self.elementLayout.get_elements_by_type(*self.__get_type_names(type))
 
-                if isinstance(item, type):
-                    items.append(item)
-        
-        return items
+        return [self.placedItems[(element.row, element.col)] for element in elements]
+
+
+    def get_items_count(self, type:type=GridItem) -> int:
+        '''
+        Returns the number of items within the grid of a given type.
+
+        :param type: The type of items to count, given in the form of class names (e.g. Laser, Mirror, etc.). Counts all items by default.
+        :type type: type
+
+        :return: Returns the number of items of the given type.
+        :rtype: int
+        '''
+        # check the validity of the item type
+        assert type in self.allowedItemTypes, "Not an allowed item type"
+
+        return self.elementLayout.get_elements_count(*self.__get_type_names(type))
+
+
+    def __get_type_names(self, type:type) -> list:
+        '''
+        This is an auxiliary method and is inteded for internal use only.
+
+        Returns the element type names of an allowed item type and its subclasses.
+
+        :param type: The item type, given in the form of class names (e.g. Laser, Mirror, etc.)
+        :type type: type
+
+        :return: Returns a list of element type names.
+        :rtype: list
+        '''
+        return [item_type.__name__ for item_type in self.allowedItemTypes if issubclass(item_type, type)]
             
 
     def get_lasers(self) -> list:
@@ -977,8 +1309,30 @@ class GridArea(QWidget):
         :rtype: tuple[int, int]
         '''
         return self.rows, self.cols
+
+
+    def get_layout(self) -> Layout:
+        '''
+        Getter method for the layout of the element records of the placed items, which can be built and simulated without the GUI.
+
+        :return: Returns the layout of the grid.
+        :rtype: Layout
+        '''
+        return self.elementLayout
     
 
+    def connect_cell_changed(self, func: Callable) -> None:
+        '''
+        Connects a function to be called with the row and column of a cell whenever an item is dropped on it or dragged out of it.
+
+        :param func: A function taking the row and column of the changed cell.
+        :type func: Callable
+
+        :return: This function does not return anything.
+        :rtype: None
+        '''
+        self.cellChanged.connect(func)
+
     def show_photon(self) -> None:
         '''
         Shows the photon on the screen.
@@ -1112,6 +1466,25 @@ class SimulationArea(QScrollArea):
         '''
         return self.gridArea.get_item_at(row, col)
 
+    def get_next_item_in_dir(self, row: int, col: int, orientation: int) -> tuple[Union[GridItem,None], tuple[int, int]]:
+        '''
+        Returns the first item met when travelling from a cell in a given direction.
+
+        :param row: The row number of the starting cell.
+        :type row: int
+
+        :param col: The column number of the starting cell.
+        :type col: int
+
+        :param orientation: The direction of travel (0: right, 1: down, 2: left, 3: up).
+        :type orientation: int
+
+        :return: Returns a tuple of the item found (or None) and its position in the form (row, column). If no item is found,
+            the position is that of the first cell outside the grid.
+        :rtype: tuple[GridItem | None, tuple[int, int]]
+        '''
+        return self.gridArea.get_next_item_in_dir(row, col, orientation)
+
     def get_grid_size(self) -> None:
         '''
         Getter method for the size of the grid.
@@ -1121,6 +1494,15 @@ class SimulationArea(QScrollArea):
         '''
         return self.gridArea.get_grid_size()
 
+    def get_layout(self) -> Layout:
+        '''
+        Getter method for the layout of the element records of the placed items, which can be built and simulated without the GUI.
+
+        :return: Returns the layout of the grid.
+        :rtype: Layout
+        '''
+        return self.gridArea.get_layout()
+
     def get_lasers(self) -> None:
         '''
         Returns a list of all instances of :class:`Laser` objects within the grid.
@@ -1128,7 +1510,31 @@ class SimulationArea(QScrollArea):
         :return: Returns a list of laser objects. In case no lasers exist, returns an empty list.
         :rtype: list
         '''
-        return self.gridArea.get_lasers()        
+        return self.gridArea.get_lasers()
+
+    def get_items_count(self, type:type=GridItem) -> int:
+        '''
+        Returns the number of items within the grid of a given type.
+
+        :param type: The type of items to count, given in the form of class names (e.g. Laser, Mirror, etc.). Counts all items by default.
+        :type type: type
+
+        :return: Returns the number of items of the given type.
+        :rtype: int
+        '''
+        return self.gridArea.get_items_count(type)
+
+    def connect_cell_changed(self, func: Callable) -> None:
+        '''
+        Connects a function to be called with the row and column of a cell whenever an item is dropped on it or dragged out of it.
+
+        :param func: A function taking the row and column of the changed cell.
+        :type func: Callable
+
+        :return: This function does not return anything.
+        :rtype: None
+        '''
+        self.gridArea.connect_cell_changed(func)
 
     def show_photon(self) -> None:
         '''
@@ -1312,6 +1718,25 @@ class CentralWidget(QWidget):
         :rtype: GridItem | None
         '''
         return self.simulationArea.get_item_at(row, col)
+
+    def get_next_item_in_dir(self, row: int, col: int, orientation: int) -> tuple[Union[GridItem,None], tuple[int, int]]:
+        '''
+        Returns the first item met when travelling from a cell in a given direction.
+
+        :param row: The row number of the starting cell.
+        :type row: int
+
+        :param col: The column number of the starting cell.
+        :type col: int
+
+        :param orientation: The direction of travel (0: right, 1: down, 2: left, 3: up).
+        :type orientation: int
+
+        :return: Returns a tuple of the item found (or None) and its position in the form (row, column). If no item is found,
+            the position is that of the first cell outside the grid.
+        :rtype: tuple[GridItem | None, tuple[int, int]]
+        '''
+        return self.simulationArea.get_next_item_in_dir(row, col, orientation)
     
     def connect_play_button(self, func: Callable) -> None:
         '''
@@ -1358,6 +1783,15 @@ class CentralWidget(QWidget):
         '''
         return self.simulationArea.get_grid_size()
 
+    def get_layout(self) -> Layout:
+        '''
+        Getter method for the layout of the element records of the placed items, which can be built and simulated without the GUI.
+
+        :return: Returns the layout of the grid.
+        :rtype: Layout
+        '''
+        return self.simulationArea.get_layout()
+
     def get_lasers(self) -> list:
         '''
         Returns a list of all instances of :class:`Laser` objects within the grid.
@@ -1366,6 +1800,30 @@ class CentralWidget(QWidget):
         :rtype: list
         '''
         return self.simulationArea.get_lasers()
+
+    def get_items_count(self, type:type=GridItem) -> int:
+        '''
+        Returns the number of items within the grid of a given type.
+
+        :param type: The type of items to count, given in the form of class names (e.g. Laser, Mirror, etc.). Counts all items by default.
+        :type type: type
+
+        :return: Returns the number of items of the given type.
+        :rtype: int
+        '''
+        return self.simulationArea.get_items_count(type)
+
+    def connect_cell_changed(self, func: Callable) -> None:
+        '''
+        Connects a function to be called with the row and column of a cell whenever an item is dropped on it or dragged out of it.
+
+        :param func: A function taking the row and column of the changed cell.
+        :type func: Callable
+
+        :return: This function does not return anything.
+        :rtype: None
+        '''
+        self.simulationArea.connect_cell_changed(func)
     
     def show_photon(self) -> None:
         '''
@@ -1427,6 +1885,18 @@ class Ui_MainWindow(object):
         icons[BeamSplitter.__name__]      = BEAM_SPLITTER_ICON
         icons[PolarBeamSplitter.__name__] = POLAR_BEAM_SPLITTER_ICON
         icons[Mirror.__name__]            = MIRROR_ICON
+        icons[SPDC.__name__]              = SPDC_ICON
+        icons[HWP.__name__]               = HALF_WAVE_PLATE_ICON
+        icons[QWP.__name__]               = QUARTER_WAVE_PLATE_ICON
+        icons[Polarizer.__name__]         = POLARIZER_ICON
+        icons[Rotator.__name__]           = ROTATOR_ICON
+        icons[TimeDelay.__name__]         = TIME_DELAY_ICON
+        icons[PhaseDelay.__name__]        = PHASE_DELAY_ICON
+        icons[Dephaser.__name__]          = DEPHASER_ICON
+        icons[Depolarizer.__name__]       = DEPOLARIZER_ICON
+        icons[NDF.__name__]               = NDF_ICON
+        icons[BeamBlocker.__name__]       = BEAM_BLOCKER_ICON
+        icons[PhaseRetarder.__name__]     = PHASE_RETARDER_ICON
 
 
         # register text
@@ -1435,6 +1905,18 @@ class Ui_MainWindow(object):
         texts[BeamSplitter.__name__]      = BEAM_SPLITTER_TEXT
         texts[PolarBeamSplitter.__name__] = POLAR_BEAM_SPLITTER_TEXT
         texts[Mirror.__name__]            = MIRROR_TEXT
+        texts[SPDC.__name__]              = SPDC_TEXT
+        texts[HWP.__name__]               = HALF_WAVE_PLATE_TEXT
+        texts[QWP.__name__]               = QUARTER_WAVE_PLATE_TEXT
+        texts[Polarizer.__name__]         = POLARIZER_TEXT
+        texts[Rotator.__name__]           = ROTATOR_TEXT
+        texts[TimeDelay.__name__]         = TIME_DELAY_TEXT
+        texts[PhaseDelay.__name__]        = PHASE_DELAY_TEXT
+        texts[Dephaser.__name__]          = DEPHASER_TEXT
+        texts[Depolarizer.__name__]       = DEPOLARIZER_TEXT
+        texts[NDF.__name__]               = NDF_TEXT
+        texts[BeamBlocker.__name__]       = BEAM_BLOCKER_TEXT
+        texts[PhaseRetarder.__name__]     = PHASE_RETARDER_TEXT
 
         # register components classes
         components[Laser.__name__]             = Laser
@@ -1442,6 +1924,18 @@ class Ui_MainWindow(object):
         components[BeamSplitter.__name__]      = BeamSplitter
         components[PolarBeamSplitter.__name__] = PolarBeamSplitter
         components[Mirror.__name__]            = Mirror
+        components[SPDC.__name__]              = SPDC
+        components[HWP.__name__]               = HWP
+        components[QWP.__name__]               = QWP
+        components[Polarizer.__name__]         = Polarizer
+        components[Rotator.__name__]           = Rotator
+        components[TimeDelay.__name__]         = TimeDelay
+        components[PhaseDelay.__name__]        = PhaseDelay
+        components[Dephaser.__name__]          = Dephaser
+        components[Depolarizer.__name__]       = Depolarizer
+        components[NDF.__name__]               = NDF
+        components[BeamBlocker.__name__]       = BeamBlocker
+        components[PhaseRetarder.__name__]     = PhaseRetarder
 
         
         # import icons
@@ -1483,6 +1977,25 @@ class Ui_MainWindow(object):
         :rtype: GridItem | None
         '''
         return self.centralWidget.get_item_at(row, col)
+
+    def get_next_item_in_dir(self, row: int, col: int, orientation: int) -> tuple[Union[GridItem,None], tuple[int, int]]:
+        '''
+        Returns the first item met when travelling from a cell in a given direction.
+
+        :param row: The row number of the starting cell.
+        :type row: int
+
+        :param col: The column number of the starting cell.
+        :type col: int
+
+        :param orientation: The direction of travel (0: right, 1: down, 2: left, 3: up).
+        :type orientation: int
+
+        :return: Returns a tuple of the item found (or None) and its position in the form (row, column). If no item is found,
+            the position is that of the first cell outside the grid.
+        :rtype: tuple[GridItem | None, tuple[int, int]]
+        '''
+        return self.centralWidget.get_next_item_in_dir(row, col, orientation)
     
     def connect_play_button(self, func: Callable) -> None:
         '''
@@ -1529,6 +2042,15 @@ class Ui_MainWindow(object):
         '''
         return self.centralWidget.get_grid_size()
 
+    def get_layout(self) -> Layout:
+        '''
+        Getter method for the layout of the element records of the placed items, which can be built and simulated without the GUI.
+
+        :return: Returns the layout of the grid.
+        :rtype: Layout
+        '''
+        return self.centralWidget.get_layout()
+
     def get_lasers(self) -> list:
         '''
         Returns a list of all instances of :class:`Laser` objects within the grid.
@@ -1536,9 +2058,32 @@ class Ui_MainWindow(object):
         :return: Returns a list of laser objects. In case no lasers exist, returns an empty list.
         :rtype: list
         '''
-        # HACK: add functionality for the grid to record each added element instead of traversal
         return self.centralWidget.get_lasers()
 
+    def get_items_count(self, type:type=GridItem) -> int:
+        '''
+        Returns the number of items within the grid of a given type.
+
+        :param type: The type of items to count, given in the form of class names (e.g. Laser, Mirror, etc.). Counts all items by default.
+        :type type: type
+
+        :return: Returns the number of items of the given type.
+        :rtype: int
+        '''
+        return self.centralWidget.get_items_count(type)
+
+    def connect_cell_changed(self, func: Callable) -> None:
+        '''
+        Connects a function to be called with the row and column of a cell whenever an item is dropped on it or dragged out of it.
+
+        :param func: A function taking the row and column of the changed cell.
+        :type func: Callable
+
+        :return: This function does not return anything.
+        :rtype: None
+        '''
+        self.centralWidget.connect_cell_changed(func)
+
     def show_photon(self) -> None:
         '''
         Shows the photon on the screen.
@@ -1595,6 +2140,8 @@ class VectorWindow(QWidget):
     '''
     A table to visualize a vector's entires within a window.
 
+    A batch of vectors (e.g. a ``StateBatch``) is shown with one column per vector.
+
     :ivar table: A table of vector's enties.
     :vartype table: QTableWidget
     '''
@@ -1602,7 +2149,8 @@ class VectorWindow(QWidget):
         '''
         Initializes a :class:`VectorWindow` instance.
 
-        :param vector: The vector whose entires are to be visualized. 
+        :param vector: The vector whose entires are to be visualized. Either a 1-D vector, a K x N array holding K vectors as rows,
+            or a state object providing ``get_state_vector``.
         :type vector: np.ndarray
 
         :return: This method does not return anything.
@@ -1610,26 +2158,38 @@ class VectorWindow(QWidget):
         '''
         super().__init__()
         self.setWindowTitle("Quantum State Vector")
-        self.setGeometry(200, 200, 200, 400)
+
+        # accept state objects as well as raw arrays
+        if hasattr(vector, "get_state_vector"):
+            vector = vector.get_state_vector()
+
+        # one column of values for each vector of a batch
+        vectors = np.atleast_2d(vector)
+        width = 100 * (vectors.shape[0] + 1)
+        self.setGeometry(200, 200, width, 400)
 
         # Create a table to display the vector
         self.table = QTableWidget(self)
 
         # row count is the same as the vector's length
-        self.table.setRowCount(len(vector))
+        self.table.setRowCount(vectors.shape[1])
 
-        # One column for label and one for amplitude
-        self.table.setColumnCount(2)
+        # One column for label and one for the amplitudes of each vector
+        self.table.setColumnCount(vectors.shape[0] + 1)
 
         # Column headers
-        self.table.setHorizontalHeaderLabels(["Label", "Value"])
+        if vectors.shape[0] == 1:
+            self.table.setHorizontalHeaderLabels(["Label", "Value"])
+        else:
+            self.table.setHorizontalHeaderLabels(["Label"] + [f"Value {k}" for k in range(vectors.shape[0])])
         self.table.verticalHeader().setVisible(False)  # Hide row numbers
 
         # Fill the table with vector values
-        for i, value in enumerate(vector):
+        for i in range(vectors.shape[1]):
             self.table.setItem(i, 0, QTableWidgetItem(f"|{i}>"))
-            self.table.setItem(i, 1, QTableWidgetItem(str(round(value, 5))))
+            for k, value in enumerate(vectors[:, i]):
+                self.table.setItem(i, k + 1, QTableWidgetItem(str(np.round(value, 5))))
 
         # Set table dimensions
-        self.table.resize(200, 400)
-        self.table.setFixedSize(200, 400)
\ No newline at end of file
+        self.table.resize(width, 400)
+        self.table.setFixedSize(width, 400)
\ No newline at end of file